@@ -1,5 +1,7 @@
 from flask import Flask, render_template, request, jsonify, session, Response, stream_template
 from simulation.simulation import Simulation
+from simulation.engine import SimulationEngine, SimulationEvent, iterate_events
+from simulation.event_sinks import QueueSink
 from scene_master.scene_master import SceneMaster
 from relationship_agent.relationship_agent import RelationshipAgent
 import os
@@ -175,11 +177,6 @@ def run_simulation():
         
         simulation_running = False
         
-        # Debug: Print results to console
-        print(f"DEBUG: Captured {len(results)} results")
-        for result in results:
-            print(f"DEBUG: {result}")
-        
         return jsonify({
             'success': True,
             'results': results
@@ -231,411 +228,76 @@ def run_simulation_stream():
     
     return Response(generate(), mimetype='text/plain')
 
-def run_simulation_auto(interactions_per_scene):
-    """Run simulation in auto mode and capture output"""
-    results = []
-    
+def event_results(event):
+    """Render a simulation event as the result dicts the web UI displays"""
+    timestamp = datetime.fromtimestamp(event.timestamp).isoformat()
+    if event.kind == 'scene_start':
+        rendered = [(f"Scene Conflict: {event.data['conflict']}", 'scene-master'), (event.content, 'scene-master')]
+    elif event.kind == 'narrative':
+        rendered = [(event.content, 'scene-master')]
+        if 'next_agent' in event.data:
+            rendered.append((f"{event.data['next_agent']} is appraising the scene...", 'output'))
+    elif event.kind == 'appraisal':
+        rendered = [(f"Internal monologue: {event.content}", f"agent-{event.agent_index}")]
+    elif event.kind == 'action':
+        rendered = [(f"[{event.agent}] {event.content}", f"agent-{event.agent_index}")]
+    elif event.kind == 'error':
+        rendered = [(event.content, 'error')]
+    else:
+        rendered = [(event.content, 'output')] if event.content else []
+    return [{'type': result_type, 'content': content, 'timestamp': timestamp} for content, result_type in rendered]
+
+def simulation_events(interactions_per_scene):
+    """Run the current scene of the current simulation and yield its events as they happen"""
     # Ensure sm_action is initialized
     if not hasattr(current_simulation, 'sm_action') or current_simulation.sm_action is None:
         current_simulation.sm_action = current_simulation.scene_master.initialize()
-    
-    def add_result(content, result_type='output'):
-        results.append({
-            'type': result_type,
-            'content': content,
-            'timestamp': datetime.now().isoformat()
-        })
-    
+    return iterate_events(SimulationEngine(current_simulation).run_scene(interactions_per_scene))
+
+def simulation_results(interactions_per_scene):
+    """Run the current scene of the current simulation and yield its output as it happens"""
     try:
-        # Get simulation components
-        sim = current_simulation
-        agent_1 = sim.agent_1
-        agent_2 = sim.agent_2
-        scene_master = sim.scene_master
-        
-        # Add the scene conflict to both agents' working memory
-        add_result(f"Central Conflict of Scene: {scene_master.scene_state.scene_conflict}")
-        agent_1.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
-        agent_2.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
-        
-        # Add the current scene to the scene history and agents' memory
-        scene_master.append_to_history(0, sim.sm_action.current_scene)
-        agent_1.add_to_working_memory(text=sim.sm_action.current_scene, memory_type="Narrative")
-        agent_2.add_to_working_memory(text=sim.sm_action.current_scene, memory_type="Narrative")
-        add_result(sim.sm_action.current_scene, "scene-master")
-        
-        # Loop for each interaction in the scene
-        for action_index in range(interactions_per_scene):
-            
-            # Progress the scene and get the next narrative/action
-            sim.sm_action = scene_master.progress()
-            scene_master.append_to_history(0, sim.sm_action.narrative)
-            
-            add_result("[Scene Master:]", "scene-master")
-            add_result(sim.sm_action.narrative, "scene-master")
-            
-            # Determine which agent acts next based on character_uuid
-            if sim.sm_action.character_uuid == agent_1.agent_id:
-                curr_agent = agent_1
-                other_agent = agent_2
-                agent_ind = 1
-                agent_name = agent_1.name
-            elif sim.sm_action.character_uuid == agent_2.agent_id:
-                curr_agent = agent_2
-                other_agent = agent_1
-                agent_ind = 2
-                agent_name = agent_2.name
-            else:
-                add_result(f"Unknown character_uuid: {sim.sm_action.character_uuid}", "error")
-                continue
-            
-            # Agent appraises the current scene history
-            add_result(f"{agent_name} is appraising the scene...")
-            agent_appraisal = curr_agent.appraise(scene_master.scene_history)
-            
-            # Agent makes a choice/action
-            add_result(f"{agent_name} is making a choice...")
-            agent_action = curr_agent.make_choices(sim.sm_action.narrative, appraisal=agent_appraisal)
-            
-            # Add the agent's action to both agents' working memory
-            from simulation.simulation_utils import combine_narrative_action
-            narrative_with_action = combine_narrative_action(
-                sim.sm_action.narrative, 
-                agent_name=curr_agent.name, 
-                action=agent_action['action']
-            )
-            
-            curr_agent.add_to_working_memory(
-                text=narrative_with_action, 
-                memory_type="Memory", 
-                emotion_embedding=agent_appraisal["emotion_scores"], 
-                inner_thoughts=agent_appraisal["inner_thoughts"]
-            )
-            other_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory")
-            
-            # Append the agent's action to the scene history
-            scene_master.append_to_history(curr_agent, agent_action["action"])
-            
-            add_result(f"[{agent_name}] {agent_action['action']}", f"agent-{agent_ind}")
-            
+        for event in simulation_events(interactions_per_scene):
+            yield from event_results(event)
     except Exception as e:
         # Add error message to results
-        add_result(f'Error during simulation: {str(e)}', 'error')
+        yield {
+            'type': 'error',
+            'content': f'Error during simulation: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }
         raise e
-    
-    return results
+
+def run_simulation_auto(interactions_per_scene):
+    """Run simulation in auto mode and capture output"""
+    return list(simulation_results(interactions_per_scene))
 
 def run_simulation_auto_stream(interactions_per_scene):
     """Run simulation in auto mode and stream output in real-time"""
-    
-    # Ensure sm_action is initialized
-    if not hasattr(current_simulation, 'sm_action') or current_simulation.sm_action is None:
-        current_simulation.sm_action = current_simulation.scene_master.initialize()
-    
-    def yield_result(content, result_type='output'):
-        result = {
-            'type': result_type,
-            'content': content,
-            'timestamp': datetime.now().isoformat()
-        }
-        return f"data: {json.dumps(result)}\n\n"
-    
-    try:
-        # Get simulation components
-        sim = current_simulation
-        agent_1 = sim.agent_1
-        agent_2 = sim.agent_2
-        scene_master = sim.scene_master
-        
-        # Add the scene conflict to both agents' working memory
-        yield yield_result(f"Scene Conflict: {scene_master.scene_state.scene_conflict}", "scene-master")
-        agent_1.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
-        agent_2.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
-        
-        # Add the current scene to the scene history and agents' memory
-        scene_master.append_to_history(0, sim.sm_action.current_scene)
-        agent_1.add_to_working_memory(text=sim.sm_action.current_scene, memory_type="Narrative")
-        agent_2.add_to_working_memory(text=sim.sm_action.current_scene, memory_type="Narrative")
-
-        yield yield_result(sim.sm_action.current_scene, "scene-master")
-        
-        # Loop for each interaction in the scene
-        for action_index in range(interactions_per_scene):
-            
-            # Progress the scene and get the next narrative/action
-            sim.sm_action = scene_master.progress()
-            print(sim.sm_action)
-            scene_master.append_to_history(0, sim.sm_action.narrative)
-            yield yield_result(sim.sm_action.narrative, "scene-master")
-            
-            # Determine which agent acts next based on character_uuid
-            if sim.sm_action.character_uuid == agent_1.agent_id:
-                curr_agent = agent_1
-                other_agent = agent_2
-                agent_ind = 1
-                agent_name = agent_1.name
-            elif sim.sm_action.character_uuid == agent_2.agent_id:
-                curr_agent = agent_2
-                other_agent = agent_1
-                agent_ind = 2
-                agent_name = agent_2.name
-            else:
-                yield yield_result(f"Unknown character_uuid: {sim.sm_action.character_uuid}", "error")
-                continue
-            
-            # Agent appraises the current scene history
-            try:
-                agent_appraisal = curr_agent.appraise(scene_master.scene_history)
-                yield yield_result(f"Internal monologue: {agent_appraisal['inner_thoughts']}", f"agent-{agent_ind}")
-            except TimeoutError as e:
-                yield yield_result(f"Timeout error during {agent_name}'s appraisal: {str(e)}", "error")
-                raise e
-            except Exception as e:
-                yield yield_result(f"Error during {agent_name}'s appraisal: {str(e)}", "error")
-                raise e
+    global simulation_thread
+    # The simulation runs in a background thread and hands its events to the response through a queue,
+    # so a slow client never holds up the turn loop
+    sink = QueueSink()
+    simulation = current_simulation
 
-            # Agent makes a choice/action
-            try:
-                agent_action = curr_agent.make_choices(sim.sm_action.narrative, appraisal=agent_appraisal)
-            except TimeoutError as e:
-                yield yield_result(f"Timeout error during {agent_name}'s choice making: {str(e)}", "error")
-                raise e
-            except Exception as e:
-                yield yield_result(f"Error during {agent_name}'s choice making: {str(e)}", "error")
-                raise e
-            
-            
-            # Add the agent's action to both agents' working memory
-            from simulation.simulation_utils import combine_narrative_action
-            narrative_with_action = combine_narrative_action(
-                sim.sm_action.narrative, 
-                agent_name=curr_agent.name, 
-                action=agent_action['action']
-            )
-            
-            curr_agent.add_to_working_memory(
-                text=narrative_with_action, 
-                memory_type="Memory", 
-                emotion_embedding=agent_appraisal["emotion_scores"], 
-                inner_thoughts=agent_appraisal["inner_thoughts"]
-            )
-            other_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory")
-            
-            # Append the agent's action to the scene history
-            scene_master.append_to_history(curr_agent, agent_action["action"])
-            
-            yield yield_result(f"Action: {agent_action['action']}", f"agent-{agent_ind}")
-            
-    except Exception as e:
-        # Add error message to results
-        yield yield_result(f'Error during simulation: {str(e)}', 'error')
-        raise e
+    def run():
+        try:
+            for event in simulation_events(interactions_per_scene):
+                sink.emit(event)
+        except Exception as e:
+            sink.emit(SimulationEvent('error', f'Error during simulation: {str(e)}', simulation_id=simulation.simulation_id))
+        finally:
+            sink.close()
 
-def run_simulation_scene_by_scene_stream(interactions_per_scene):
-    """Run simulation scene by scene and stream output in real-time"""
-    
-    # Ensure sm_action is initialized
-    if not hasattr(current_simulation, 'sm_action') or current_simulation.sm_action is None:
-        current_simulation.sm_action = current_simulation.scene_master.initialize()
-    
-    def yield_result(content, result_type='output'):
-        result = {
-            'type': result_type,
-            'content': content,
-            'timestamp': datetime.now().isoformat()
-        }
-        return f"data: {json.dumps(result)}\n\n"
-    
-    try:
-        # Get simulation components
-        sim = current_simulation
-        agent_1 = sim.agent_1
-        agent_2 = sim.agent_2
-        scene_master = sim.scene_master
-        
-        # Add the scene conflict to both agents' working memory
-        yield yield_result(f"Adding scene conflict to agents: {scene_master.scene_state.scene_conflict}")
-        agent_1.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
-        agent_2.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
-        
-        # Add the current scene to the scene history and agents' memory
-        scene_master.append_to_history(0, sim.sm_action.current_scene)
-        agent_1.add_to_working_memory(text=sim.sm_action.current_scene, memory_type="Narrative")
-        agent_2.add_to_working_memory(text=sim.sm_action.current_scene, memory_type="Narrative")
-        
-        yield yield_result("[Scene Master]", "scene-master")
-        yield yield_result(sim.sm_action.current_scene, "scene-master")
-        
-        # Loop for each interaction in the scene
-        for action_index in range(interactions_per_scene):
-            
-            # Progress the scene and get the next narrative/action
-            sim.sm_action = scene_master.progress()
-            scene_master.append_to_history(0, sim.sm_action.narrative)
-            
-            yield yield_result("[Scene Master:]", "scene-master")
-            yield yield_result(sim.sm_action.narrative, "scene-master")
-            
-            # Determine which agent acts next based on character_uuid
-            if sim.sm_action.character_uuid == agent_1.agent_id:
-                curr_agent = agent_1
-                other_agent = agent_2
-                agent_ind = 1
-                agent_name = agent_1.name
-            elif sim.sm_action.character_uuid == agent_2.agent_id:
-                curr_agent = agent_2
-                other_agent = agent_1
-                agent_ind = 2
-                agent_name = agent_2.name
-            else:
-                yield yield_result(f"Unknown character_uuid: {sim.sm_action.character_uuid}", "error")
-                continue
-            
-            # Agent appraises the current scene history
-            yield yield_result(f"{agent_name} is appraising the scene...")
-            try:
-                agent_appraisal = curr_agent.appraise(scene_master.scene_history)
-            except TimeoutError as e:
-                yield yield_result(f"Timeout error during {agent_name}'s appraisal: {str(e)}", "error")
-                raise e
-            except Exception as e:
-                yield yield_result(f"Error during {agent_name}'s appraisal: {str(e)}", "error")
-                raise e
-            
-            # Agent makes a choice/action
-            yield yield_result(f"{agent_name} is making a choice...")
-            try:
-                agent_action = curr_agent.make_choices(sim.sm_action.narrative, appraisal=agent_appraisal)
-            except TimeoutError as e:
-                yield yield_result(f"Timeout error during {agent_name}'s choice making: {str(e)}", "error")
-                raise e
-            except Exception as e:
-                yield yield_result(f"Error during {agent_name}'s choice making: {str(e)}", "error")
-                raise e
-            
-            # Add the agent's action to both agents' working memory
-            from simulation.simulation_utils import combine_narrative_action
-            narrative_with_action = combine_narrative_action(
-                sim.sm_action.narrative, 
-                agent_name=curr_agent.name, 
-                action=agent_action['action']
-            )
-            
-            curr_agent.add_to_working_memory(
-                text=narrative_with_action, 
-                memory_type="Memory", 
-                emotion_embedding=agent_appraisal["emotion_scores"], 
-                inner_thoughts=agent_appraisal["inner_thoughts"]
-            )
-            other_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory")
-            
-            # Append the agent's action to the scene history
-            scene_master.append_to_history(curr_agent, agent_action["action"])
-            
-            yield yield_result(f"[{agent_name}] {agent_action['action']}", f"agent-{agent_ind}")
-            
-    except Exception as e:
-        # Add error message to results
-        yield yield_result(f'Error during simulation: {str(e)}', 'error')
-        raise e
+    simulation_thread = threading.Thread(target=run, daemon=True)
+    simulation_thread.start()
+    for event in sink:
+        for result in event_results(event):
+            yield f"data: {json.dumps(result)}\n\n"
 
-def run_simulation_scene_by_scene(interactions_per_scene):
-    """Run simulation scene by scene and capture output"""
-    results = []
-    
-    # Ensure sm_action is initialized
-    if not hasattr(current_simulation, 'sm_action') or current_simulation.sm_action is None:
-        current_simulation.sm_action = current_simulation.scene_master.initialize()
-    
-    def add_result(content, result_type='output'):
-        results.append({
-            'type': result_type,
-            'content': content,
-            'timestamp': datetime.now().isoformat()
-        })
-    
-    try:
-        # Get simulation components
-        sim = current_simulation
-        agent_1 = sim.agent_1
-        agent_2 = sim.agent_2
-        scene_master = sim.scene_master
-        
-        # Add the scene conflict to both agents' working memory
-        add_result(f"Adding scene conflict to agents: {scene_master.scene_state.scene_conflict}")
-        agent_1.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
-        agent_2.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
-        
-        # Add the current scene to the scene history and agents' memory
-        scene_master.append_to_history(0, sim.sm_action.current_scene)
-        agent_1.add_to_working_memory(text=sim.sm_action.current_scene, memory_type="Narrative")
-        agent_2.add_to_working_memory(text=sim.sm_action.current_scene, memory_type="Narrative")
-        
-        add_result("[Scene Master]", "scene-master")
-        add_result(sim.sm_action.current_scene, "scene-master")
-        
-        # Loop for each interaction in the scene
-        for action_index in range(interactions_per_scene):
-            
-            # Progress the scene and get the next narrative/action
-            sim.sm_action = scene_master.progress()
-            scene_master.append_to_history(0, sim.sm_action.narrative)
-            
-            add_result("[Scene Master:]", "scene-master")
-            add_result(sim.sm_action.narrative, "scene-master")
-            
-            # Determine which agent acts next based on character_uuid
-            if sim.sm_action.character_uuid == agent_1.agent_id:
-                curr_agent = agent_1
-                other_agent = agent_2
-                agent_ind = 1
-                agent_name = agent_1.name
-            elif sim.sm_action.character_uuid == agent_2.agent_id:
-                curr_agent = agent_2
-                other_agent = agent_1
-                agent_ind = 2
-                agent_name = agent_2.name
-            else:
-                add_result(f"Unknown character_uuid: {sim.sm_action.character_uuid}", "error")
-                continue
-            
-            # Agent appraises the current scene history
-            add_result(f"{agent_name} is appraising the scene...")
-            print("running make appraisal")
-            agent_appraisal = curr_agent.appraise(scene_master.scene_history)
-            
-            # Agent makes a choice/action
-            add_result(f"{agent_name} is making a choice...")
-            print("running make choices")
-            agent_action = curr_agent.make_choices(sim.sm_action.narrative, appraisal=agent_appraisal)
-            
-            # Add the agent's action to both agents' working memory
-            from simulation.simulation_utils import combine_narrative_action
-            narrative_with_action = combine_narrative_action(
-                sim.sm_action.narrative, 
-                agent_name=curr_agent.name, 
-                action=agent_action['action']
-            )
-            
-            curr_agent.add_to_working_memory(
-                text=narrative_with_action, 
-                memory_type="Memory", 
-                emotion_embedding=agent_appraisal["emotion_scores"], 
-                inner_thoughts=agent_appraisal["inner_thoughts"]
-            )
-            other_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory")
-            
-            # Append the agent's action to the scene history
-            scene_master.append_to_history(curr_agent, agent_action["action"])
-            
-            add_result(f"[{agent_name}] {agent_action['action']}", f"agent-{agent_ind}")
-            
-    except Exception as e:
-        # Add error message to results
-        add_result(f'Error during simulation: {str(e)}', 'error')
-        raise e
-    
-    return results
+# Both modes run the current scene; the web UI steps through the scenes one request at a time
+run_simulation_scene_by_scene = run_simulation_auto
+run_simulation_scene_by_scene_stream = run_simulation_auto_stream
 
 @app.route('/api/save_simulation', methods=['POST'])
 def save_simulation():
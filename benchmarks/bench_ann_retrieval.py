@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Recall/latency benchmark for the IVF approximate memory index against exact search.
+
+Builds a large synthetic memory store (clustered 1536-dim semantic embeddings, like
+text-embedding-3-small vectors of related memories, plus 8-dim emotion vectors), then
+reports recall@k and per-query latency of IVFIndex for several nprobe values, the cost of
+incremental inserts, and a save/load round-trip of the trained index. No API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_ann_retrieval
+"""
+
+import os
+import tempfile
+import time
+import numpy as np
+from relationship_agent.memory import Memory
+from relationship_agent.memory_index import MemoryIndex
+from relationship_agent.ivf_index import IVFIndex
+
+SEMANTIC_DIM = 1536
+EMOTION_DIM = 8
+NUM_TOPICS = 2000
+TOP_K = 10
+ALPHA = 0.7
+
+def clustered_vectors(num_vectors, rng):
+    topics = rng.standard_normal((NUM_TOPICS, SEMANTIC_DIM)).astype(np.float32)
+    vectors = topics[rng.integers(0, NUM_TOPICS, num_vectors)]
+    vectors += 1.5 * rng.standard_normal((num_vectors, SEMANTIC_DIM)).astype(np.float32)
+    return vectors
+
+def build_memory_store(semantic, emotion):
+    # Rows are kept as array views rather than lists so 100k memories fit in RAM
+    return {
+        f"memory {i}": {"semantic_embedding": semantic[i], "emotion_embedding": emotion[i], "inner_thoughts": None, "type": None, "agent": None}
+        for i in range(len(semantic))
+    }
+
+def recall(exact_results, approximate_results):
+    hits = 0
+    for exact, approximate in zip(exact_results, approximate_results):
+        hits += len({memory_id for _, memory_id in exact} & {memory_id for _, memory_id in approximate})
+    return hits / sum(len(exact) for exact in exact_results)
+
+def timed_search(index, queries, emotion_queries):
+    start_time = time.perf_counter()
+    results = [index.search(queries[i], emotion_queries[i], top_k=TOP_K, alpha=ALPHA) for i in range(len(queries))]
+    return results, (time.perf_counter() - start_time) / len(queries)
+
+def benchmark(num_memories=100000, num_queries=100):
+    rng = np.random.default_rng(0)
+    semantic = clustered_vectors(num_memories + num_queries, rng)
+    emotion = rng.random((num_memories, EMOTION_DIM)).astype(np.float32)
+    queries, semantic = semantic[num_memories:], semantic[:num_memories]
+    emotion_queries = rng.random((num_queries, EMOTION_DIM)).astype(np.float32)
+    memory_store = build_memory_store(semantic, emotion)
+
+    exact_index = MemoryIndex.from_memory_store(memory_store)
+    exact_results, exact_time = timed_search(exact_index, queries, emotion_queries)
+    print(f"Memories: {num_memories}, queries: {num_queries}, top_k: {TOP_K}")
+    print(f"Exact search: {exact_time * 1000:.2f} ms/query\n")
+
+    ivf = IVFIndex()
+    ann_index = MemoryIndex.from_memory_store(memory_store, ann=ivf)
+    start_time = time.perf_counter()
+    ivf.sync(ann_index._semantic[:len(ann_index)])
+    print(f"IVF training ({len(ivf.centroids)} lists): {time.perf_counter() - start_time:.1f} s\n")
+
+    print(f"{'nprobe':<8} {'Recall@' + str(TOP_K):<12} {'Latency (ms)':<14} {'Speedup'}")
+    print("-" * 45)
+    for nprobe in [4, 8, 16, 32, 64]:
+        ivf.nprobe = nprobe
+        approximate_results, approximate_time = timed_search(ann_index, queries, emotion_queries)
+        print(f"{nprobe:<8} {recall(exact_results, approximate_results):<12.3f} {approximate_time * 1000:<14.3f} {exact_time / approximate_time:.1f}x")
+
+    # Incremental inserts: one add_memory() per turn followed by a retrieval
+    ivf.nprobe = 16
+    memory = Memory(ann_index=ivf)
+    memory.memory_store = memory_store
+    memory.get_top_memories(queries[0], emotion_queries[0], TOP_K, ALPHA)
+    new_vectors = clustered_vectors(100, rng)
+    start_time = time.perf_counter()
+    for i, vector in enumerate(new_vectors):
+        memory.memory_store[f"new memory {i}"] = {"semantic_embedding": vector, "emotion_embedding": emotion[i], "inner_thoughts": None, "type": None, "agent": None}
+        found = memory.get_top_memories(vector, emotion[i], TOP_K, alpha=1.0)
+        assert found[0][0] == f"new memory {i}"
+    print(f"\nInsert + search: {(time.perf_counter() - start_time) / len(new_vectors) * 1000:.2f} ms per turn (inserted memory ranked first every time)")
+
+    # Persistence: the trained index is saved and reused without retraining
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "memory_ivf.npz")
+        ivf.save(path)
+        start_time = time.perf_counter()
+        loaded = IVFIndex.load(path)
+        reloaded_index = MemoryIndex.from_memory_store(memory.memory_store, ann=loaded)
+        reloaded_results, _ = timed_search(reloaded_index, queries, emotion_queries)
+        print(f"Save/load round-trip: {os.path.getsize(path) / 1e6:.1f} MB, reload + first searches {time.perf_counter() - start_time:.1f} s, "
+              f"recall vs. exact {recall(exact_results, reloaded_results):.3f}")
+
+if __name__ == "__main__":
+    benchmark()
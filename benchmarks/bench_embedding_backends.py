@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the offline hashed n-gram embedding backend.
+
+Embeds the memories of ryan_memories_grouped.json and blake_memories_grouped.json (repeated
+to larger corpus sizes) with HashedNgramEmbeddingBackend, stores them in a Memory and
+retrieves each original memory from a partial paraphrase of it: every other word dropped.
+Reports embedding throughput, add_memories() and query latency, and recall@1/@5 of the
+partial queries. No API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_embedding_backends
+"""
+
+import json
+import time
+from relationship_agent.memory import Memory
+from utils.llm_utils import HashedNgramEmbeddingBackend
+
+CORPORA = ["ryan_memories_grouped.json", "blake_memories_grouped.json"]
+EMOTION = [0.5] * 8
+TOP_K = 5
+
+def load_texts():
+    texts = []
+    for path in CORPORA:
+        with open(path, "r", encoding="utf-8") as f:
+            texts += json.load(f)
+    return texts
+
+def partial_query(text):
+    words = text.split()
+    return " ".join(words[::2])
+
+if __name__ == "__main__":
+    texts = load_texts()
+    print(f"{'Dim':<6} {'Memories':<10} {'Embed (texts/s)':<17} {'Add (ms)':<10} {'Query (ms)':<12} {'Recall@1':<10} {'Recall@5'}")
+    print("-" * 76)
+    for dimension in [256, 512, 1024]:
+        for copies in [1, 40]:
+            # Copies are numbered so every memory is a distinct text
+            corpus = texts if copies == 1 else [f"{text} ({copy})" for copy in range(copies) for text in texts]
+            backend = HashedNgramEmbeddingBackend(dimension=dimension)
+
+            start_time = time.perf_counter()
+            backend.embed(corpus)
+            embed_rate = len(corpus) / (time.perf_counter() - start_time)
+
+            memory = Memory(embedding_backend=backend)
+            start_time = time.perf_counter()
+            memory.add_memories([{"text": text, "emotion_embedding": EMOTION} for text in corpus])
+            add_ms = (time.perf_counter() - start_time) * 1000
+
+            hits_1 = hits_5 = 0
+            start_time = time.perf_counter()
+            for text in texts:
+                retrieved = [memory_text for memory_text, _ in memory.get_top_memories_from_text(partial_query(text), EMOTION, top_k=TOP_K)]
+                # Any copy of the original memory counts as a hit
+                hits_1 += retrieved[0].startswith(text)
+                hits_5 += any(memory_text.startswith(text) for memory_text in retrieved)
+            query_ms = (time.perf_counter() - start_time) * 1000 / len(texts)
+            print(f"{dimension:<6} {len(corpus):<10} {embed_rate:<17.0f} {add_ms:<10.1f} {query_ms:<12.3f} {hits_1 / len(texts):<10.0%} {hits_5 / len(texts):.0%}")
+    print("\nQueries keep every other word of a memory; a hit is any copy of that memory.")
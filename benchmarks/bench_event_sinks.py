@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the simulation event sinks.
+
+Emits the events of many concurrent simulations (a scene start, then a narrative, two appraisals
+and an action per turn, with realistic text lengths) from several threads into each sink, the way
+a batch run of simulations sharing one sink would. Reports the output cost per event: the
+terminal pretty-printer (to a null device, so the terminal's own rendering is not counted), the
+buffered JSONL file, a sampled JSONL file and the null sink. No API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_event_sinks
+"""
+
+import os
+import tempfile
+import threading
+import time
+from simulation.engine import SimulationEvent
+from simulation.event_sinks import NullSink, TerminalSink, JsonlSink
+
+SIMULATIONS = 100
+TURNS = 200
+THREADS = 4
+NARRATIVE = "The rain picks up as they reach the cafe, and the only free table is the one by the window. " * 4
+THOUGHTS = "I wonder if they noticed that I was late again; I should say something before it gets awkward. " * 2
+ACTION = "Pulls out a chair and laughs about the rain, then asks about the new job. " * 2
+
+def simulation_events(simulation_id):
+    events = [SimulationEvent("scene_start", NARRATIVE, scene=1, data={"conflict": THOUGHTS}, simulation_id=simulation_id)]
+    for turn in range(1, TURNS + 1):
+        events.append(SimulationEvent("narrative", NARRATIVE, scene=1, turn=turn, data={"next_agent": "Alex", "next_agent_index": 1}, simulation_id=simulation_id))
+        for agent_index, agent in ((1, "Alex"), (2, "Sam")):
+            events.append(SimulationEvent("appraisal", THOUGHTS, scene=1, turn=turn, agent=agent, agent_index=agent_index,
+                                          data={"emotion_scores": [0.1] * 8, "partner": agent_index == 2}, simulation_id=simulation_id))
+        events.append(SimulationEvent("action", ACTION, scene=1, turn=turn, agent="Alex", agent_index=1, simulation_id=simulation_id))
+    return events
+
+def emit_all(sink, simulations):
+    # Each thread emits the events of its share of the simulations
+    def emit(events_lists):
+        for events in events_lists:
+            for event in events:
+                sink.emit(event)
+    threads = [threading.Thread(target=emit, args=(simulations[i::THREADS],)) for i in range(THREADS)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sink.close()
+    return time.perf_counter() - start_time
+
+if __name__ == "__main__":
+    simulations = [simulation_events(f"sim-{i}") for i in range(SIMULATIONS)]
+    total_events = SIMULATIONS * len(simulations[0])
+    directory = tempfile.mkdtemp()
+
+    with open(os.devnull, "w") as null_device:
+        sinks = [
+            ("Terminal (info)", TerminalSink(null_device)),
+            ("Terminal (debug)", TerminalSink(null_device, level="debug")),
+            ("JSONL (debug)", JsonlSink(os.path.join(directory, "all.jsonl"), level="debug")),
+            ("JSONL (info, 10% of turns)", JsonlSink(os.path.join(directory, "sampled.jsonl"), sample_rate=0.1)),
+            ("Null", NullSink()),
+        ]
+        print(f"{SIMULATIONS} simulations x {TURNS} turns, {total_events} events from {THREADS} threads")
+        print(f"{'Sink':<30} {'Total (ms)':<12} {'Per event (us)':<16} {'Output (MB)'}")
+        print("-" * 72)
+        for name, sink in sinks:
+            elapsed = emit_all(sink, simulations)
+            output_mb = f"{os.path.getsize(sink.path) / 1e6:.1f}" if isinstance(sink, JsonlSink) else "-"
+            print(f"{name:<30} {elapsed * 1000:<12.0f} {elapsed * 1e6 / total_events:<16.2f} {output_mb}")
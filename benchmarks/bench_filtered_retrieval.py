@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark for metadata-filtered retrieval.
+
+Compares filtering on type and agent by scoring every memory and discarding non-matching
+results afterwards (over-fetching until top_k matches remain), against filter pushdown
+through the secondary indexes, which scores only the matching rows. Reports per-query
+latency for filters of different selectivity. No API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_filtered_retrieval
+"""
+
+import time
+import numpy as np
+from relationship_agent.memory import Memory
+
+SEMANTIC_DIM = 1536
+EMOTION_DIM = 8
+NUM_QUERIES = 50
+TOP_K = 5
+AGENTS = ["Blake", "Ryan"]
+TYPES = ["Narrative", "Action", "Memory", "Scene Conflict", "Reflection"]
+
+def build_memory(num_memories, rng):
+    memory = Memory()
+    semantic = rng.standard_normal((num_memories, SEMANTIC_DIM)).astype(np.float32)
+    emotion = rng.random((num_memories, EMOTION_DIM)).astype(np.float32)
+    # Scene conflicts are rare, as in a simulation log
+    types = rng.choice(TYPES, num_memories, p=[0.4, 0.4, 0.1, 0.02, 0.08])
+    memory.index.add_many([
+        {"text": f"memory {i}", "semantic_embedding": semantic[i], "emotion_embedding": emotion[i],
+         "type": types[i], "agent": AGENTS[i % len(AGENTS)], "scene": f"scene {i // 100}"}
+        for i in range(num_memories)
+    ])
+    return memory
+
+def post_filter(memory, query, emotion_query, filters):
+    # Score everything, then widen the search until enough results match
+    top_k = TOP_K
+    while True:
+        results = memory.index.search(query, emotion_query, top_k=top_k)
+        matching = [(score, memory_id) for score, memory_id in results
+                    if all(memory.index.get(memory_id)[column] == value for column, value in filters.items())]
+        if len(matching) >= TOP_K or top_k >= len(memory.index):
+            return matching[:TOP_K]
+        top_k *= 4
+
+def timed(func, queries, emotion_queries):
+    start_time = time.perf_counter()
+    results = [func(query, emotion_query) for query, emotion_query in zip(queries, emotion_queries)]
+    return (time.perf_counter() - start_time) / len(queries), results
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((NUM_QUERIES, SEMANTIC_DIM)).astype(np.float32)
+    emotion_queries = rng.random((NUM_QUERIES, EMOTION_DIM)).astype(np.float32)
+    print(f"{'Memories':<10} {'Filter':<42} {'Rows':<8} {'Post-filter (ms)':<18} {'Pushdown (ms)':<15} {'Speedup'}")
+    print("-" * 104)
+    for num_memories in [20000, 100000]:
+        memory = build_memory(num_memories, rng)
+        for filters in [{"agent": "Blake"}, {"type": "Memory", "agent": "Ryan"}, {"type": "Scene Conflict"}, {"scene": "scene 7"}]:
+            rows = len(memory.index.filter_rows(filters))
+            post_time, expected = timed(lambda q, e: post_filter(memory, q, e, filters), queries, emotion_queries)
+            push_time, found = timed(lambda q, e: memory.index.search(q, e, top_k=TOP_K, filters=filters), queries, emotion_queries)
+            assert [[memory_id for _, memory_id in r] for r in found] == [[memory_id for _, memory_id in r] for r in expected]
+            label = ", ".join(f"{column}={value}" for column, value in filters.items())
+            print(f"{num_memories:<10} {label:<42} {rows:<8} {post_time * 1000:<18.2f} {push_time * 1000:<15.2f} {post_time / push_time:.1f}x")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark for two-level retrieval over grouped memories (GroupIndex) against exact retrieval.
+
+Builds a synthetic store of memories drawn around one topic per group (like the childhood /
+career / love blocks of the *_memories_grouped.json files), then compares per-query latency,
+recall@10 against exact search, and coherence: the share of retrieved memories that come from
+the query's own group. No API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_group_retrieval
+"""
+
+import time
+import numpy as np
+from relationship_agent.memory import Memory
+from relationship_agent.group_index import GroupIndex
+
+SEMANTIC_DIM = 1536
+EMOTION_DIM = 8
+NUM_QUERIES = 200
+TOP_K = 10
+
+def build_memory(num_memories, num_groups, ann_index, rng):
+    topics = rng.standard_normal((num_groups, SEMANTIC_DIM)).astype(np.float32)
+    groups = rng.integers(0, num_groups, num_memories)
+    semantic = topics[groups] + 4.0 * rng.standard_normal((num_memories, SEMANTIC_DIM)).astype(np.float32)
+    emotion = rng.random((num_memories, EMOTION_DIM)).astype(np.float32)
+    memory = Memory(ann_index=ann_index)
+    memory.index.add_many([
+        {"text": f"memory {i}", "semantic_embedding": semantic[i], "emotion_embedding": emotion[i], "group": f"group {groups[i]}"}
+        for i in range(num_memories)
+    ])
+    return memory, topics, groups
+
+def run(memory, queries, query_groups):
+    # First search builds the index
+    memory.get_top_memory_ids(queries[0], top_k=TOP_K)
+    start_time = time.perf_counter()
+    results = [memory.get_top_memory_ids(query, top_k=TOP_K) for query in queries]
+    latency = (time.perf_counter() - start_time) / len(queries)
+    coherent = np.mean([
+        np.mean([memory.get_memory(memory_id)["group"] == f"group {group}" for memory_id, _ in result])
+        for result, group in zip(results, query_groups)
+    ])
+    return results, latency, coherent
+
+def benchmark(num_memories, num_groups):
+    rng = np.random.default_rng(0)
+    exact, topics, _ = build_memory(num_memories, num_groups, None, rng)
+    rng = np.random.default_rng(0)
+    grouped, _, _ = build_memory(num_memories, num_groups, GroupIndex(top_groups=3), rng)
+
+    query_groups = rng.integers(0, num_groups, NUM_QUERIES)
+    queries = topics[query_groups] + 4.0 * rng.standard_normal((NUM_QUERIES, SEMANTIC_DIM)).astype(np.float32)
+    exact_results, exact_latency, exact_coherent = run(exact, queries, query_groups)
+    grouped_results, grouped_latency, grouped_coherent = run(grouped, queries, query_groups)
+    recall = np.mean([
+        len({memory_id for memory_id, _ in a} & {memory_id for memory_id, _ in b}) / TOP_K
+        for a, b in zip(exact_results, grouped_results)
+    ])
+    return exact_latency, exact_coherent, grouped_latency, grouped_coherent, recall
+
+if __name__ == "__main__":
+    print(f"{'Memories':<10} {'Groups':<8} {'Exact (ms)':<12} {'Grouped (ms)':<14} {'Speedup':<9} {'Recall@10':<11} {'Coherence exact/grouped'}")
+    print("-" * 92)
+    for num_memories, num_groups in [(10000, 100), (50000, 250)]:
+        exact_latency, exact_coherent, grouped_latency, grouped_coherent, recall = benchmark(num_memories, num_groups)
+        print(f"{num_memories:<10} {num_groups:<8} {exact_latency * 1000:<12.2f} {grouped_latency * 1000:<14.2f} "
+              f"{exact_latency / grouped_latency:<9.1f} {recall:<11.2f} {exact_coherent:.2f} / {grouped_coherent:.2f}")
+    print(f"\nGroupIndex searches the top 3 groups per query; coherence is the share of the top {TOP_K} from the query's group.")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark for bounding long-term memory with a MemoryPolicy.
+
+Adds memories to an unbounded Memory and to one with an eviction policy (merge=False, so
+no summaries are written and no API calls are made), retrieving after every few adds so
+retrieval counts feed the policy. Reports the final store size, the bytes of the index
+columns, the mean retrieval latency over the last 1000 retrievals, and the share of the
+most intense memories still kept.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory_capacity
+"""
+
+import time
+import numpy as np
+from relationship_agent.memory import Memory
+from relationship_agent.memory_policy import MemoryPolicy
+
+SEMANTIC_DIM = 1536
+EMOTION_DIM = 8
+CAPACITY = 2000
+
+def index_bytes(memory):
+    columns = memory.index.columns()
+    arrays = [columns["ids"], columns["semantic"], columns["emotion"], columns["has_semantic"], columns["has_emotion"]]
+    arrays += list(columns["codes"].values()) + list(columns["stats"].values())
+    return sum(array.nbytes for array in arrays if array is not None)
+
+def run(num_memories, policy):
+    rng = np.random.default_rng(0)
+    memory = Memory(policy=policy)
+    semantic = rng.standard_normal((num_memories, SEMANTIC_DIM)).astype(np.float32)
+    # One memory in ten is emotionally intense
+    emotion = rng.random((num_memories, EMOTION_DIM)).astype(np.float32) * np.where(np.arange(num_memories) % 10 == 0, 1.0, 0.2)[:, None]
+    latencies = []
+    for i in range(num_memories):
+        memory._add_record(f"memory {i}", semantic[i], emotion[i], None, "memory", "Blake")
+        if i % 5 == 0:
+            start_time = time.perf_counter()
+            memory.get_top_memories(rng.standard_normal(SEMANTIC_DIM), rng.random(EMOTION_DIM), top_k=5)
+            latencies.append(time.perf_counter() - start_time)
+    kept = [int(memory.index.texts[row].split()[1]) for row in range(len(memory.index))]
+    intense_kept = sum(1 for i in kept if i % 10 == 0) / len(kept)
+    return len(memory.index), index_bytes(memory), np.mean(latencies[-1000:]), intense_kept
+
+if __name__ == "__main__":
+    print(f"{'Memories added':<16} {'Policy':<12} {'Stored':<10} {'Index (MB)':<12} {'Retrieval (ms)':<16} {'Intense share'}")
+    print("-" * 84)
+    for num_memories in [5000, 20000]:
+        for label, policy in [("none", None), ("evict", MemoryPolicy(CAPACITY, merge=False))]:
+            stored, size, latency, intense_kept = run(num_memories, policy)
+            print(f"{num_memories:<16} {label:<12} {stored:<10} {size / 1e6:<12.1f} {latency * 1000:<16.3f} {intense_kept:.0%}")
+    print(f"\nCapacity {CAPACITY}; one memory in ten is emotionally intense.")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Memory-footprint benchmark for the memory store.
+
+Measures the bytes per memory of the previous text-keyed dict of nested dicts holding Python
+float lists, against the columnar MemoryIndex records (integer ids, float32 embedding
+matrices, interned type/agent/scene codes). Allocations are measured with tracemalloc.
+No API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory_footprint
+"""
+
+import gc
+import tracemalloc
+import numpy as np
+from relationship_agent.memory_index import MemoryIndex
+
+SEMANTIC_DIM = 1536
+EMOTION_DIM = 8
+AGENTS = ["Blake", "Ryan"]
+TYPES = ["Narrative", "Action", "Scene Conflict"]
+
+def sample_memories(num_memories, rng):
+    for i in range(num_memories):
+        yield (
+            f"Memory {i}: Blake and Ryan talk through the argument about the move to Chicago.",
+            rng.standard_normal(SEMANTIC_DIM).tolist(),
+            rng.random(EMOTION_DIM).tolist(),
+            f"Inner thoughts about memory {i}.",
+            TYPES[i % len(TYPES)],
+            AGENTS[i % len(AGENTS)]
+        )
+
+def build_dict_store(memories):
+    # The previous memory_store layout
+    memory_store = {}
+    for text, semantic, emotion, inner_thoughts, memory_type, agent in memories:
+        memory_store[text] = {
+            "semantic_embedding": semantic,
+            "emotion_embedding": emotion,
+            "inner_thoughts": inner_thoughts,
+            "type": memory_type,
+            "agent": agent
+        }
+    return memory_store
+
+def build_index(memories):
+    index = MemoryIndex()
+    for text, semantic, emotion, inner_thoughts, memory_type, agent in memories:
+        index.add(text, semantic, emotion, inner_thoughts=inner_thoughts, memory_type=memory_type, agent=agent)
+    return index
+
+def measure(build, num_memories):
+    # Inputs are generated inside the measurement, but only what the store keeps alive is counted
+    rng = np.random.default_rng(0)
+    gc.collect()
+    tracemalloc.start()
+    store = build(sample_memories(num_memories, rng))
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return current / num_memories
+
+if __name__ == "__main__":
+    print(f"{'Memories':<10} {'dict store (bytes/memory)':<28} {'MemoryIndex (bytes/memory)':<28} {'Reduction'}")
+    print("-" * 78)
+    for num_memories in [1000, 5000]:
+        dict_bytes = measure(build_dict_store, num_memories)
+        index_bytes = measure(build_index, num_memories)
+        print(f"{num_memories:<10} {dict_bytes:<28,.0f} {index_bytes:<28,.0f} {dict_bytes / index_bytes:.1f}x")
+    print(f"\nEmbeddings: {SEMANTIC_DIM}-dim semantic + {EMOTION_DIM}-dim emotion. MemoryIndex includes growth headroom.")
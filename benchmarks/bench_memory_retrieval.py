@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for Memory.get_top_memories().
+
+Compares the previous per-memory Python loop (fresh np.array conversions, two cosine
+similarities per memory, full sort) against the vectorized MemoryIndex, and checks that
+both return the same memories. Embeddings are random, with the dimension of
+text-embedding-3-small, so no API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory_retrieval
+"""
+
+import time
+import numpy as np
+from relationship_agent.memory import Memory, cosine_similarity
+
+SEMANTIC_DIM = 1536
+EMOTION_DIM = 8
+TOP_K = 5
+ALPHA = 0.7
+
+def legacy_get_top_memories(memory_store, query_embedding, query_emotion_embedding=None, top_k=5, alpha=0.7):
+    # The previous implementation of Memory.get_top_memories()
+    similarities = []
+    for text, data in memory_store.items():
+        semantic_embedding = data.get("semantic_embedding", None)
+        emotion_embedding = data.get("emotion_embedding", None)
+        inner_thoughts = data.get("inner_thoughts", None)
+        if semantic_embedding is not None and emotion_embedding is not None and query_emotion_embedding is not None:
+            semantic_sim = cosine_similarity(query_embedding, semantic_embedding)
+            emotion_sim = 1 - cosine_similarity(query_emotion_embedding, emotion_embedding)
+            final_score = alpha * semantic_sim + (1 - alpha) * emotion_sim
+            similarities.append((final_score, text, inner_thoughts))
+        elif semantic_embedding is not None:
+            semantic_sim = cosine_similarity(query_embedding, semantic_embedding)
+            similarities.append((semantic_sim, text, inner_thoughts))
+    similarities.sort(reverse=True)
+    return [(text, inner_thoughts) for _, text, inner_thoughts in similarities[:top_k]]
+
+def build_memory_store(num_memories, rng):
+    memory_store = {}
+    semantic = rng.standard_normal((num_memories, SEMANTIC_DIM)).astype(np.float32)
+    emotion = rng.random((num_memories, EMOTION_DIM)).astype(np.float32)
+    # Rows are kept as array views rather than lists so 100k memories fit in RAM
+    for i in range(num_memories):
+        memory_store[f"memory {i}"] = {
+            "semantic_embedding": semantic[i],
+            "emotion_embedding": emotion[i],
+            "inner_thoughts": None,
+            "type": None,
+            "agent": None
+        }
+    return memory_store
+
+def time_call(func, repeats):
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        result = func()
+    return (time.perf_counter() - start_time) / repeats, result
+
+def benchmark(num_memories, num_queries=32, legacy=True):
+    rng = np.random.default_rng(0)
+    memory_store = build_memory_store(num_memories, rng)
+    memory = Memory()
+    queries = rng.standard_normal((num_queries, SEMANTIC_DIM)).astype(np.float32)
+    emotion_queries = rng.random((num_queries, EMOTION_DIM)).astype(np.float32)
+
+    def build_index():
+        memory.memory_store = memory_store
+    build_time, _ = time_call(build_index, 1)
+    query, emotion_query = queries[0].tolist(), emotion_queries[0].tolist()
+
+    vectorized_time, vectorized = time_call(lambda: memory.get_top_memories(query, emotion_query, TOP_K, ALPHA), 20)
+    batch_time, batch = time_call(lambda: memory.get_top_memories_batch(queries, emotion_queries, TOP_K, ALPHA), 5)
+    assert batch[0] == vectorized
+
+    legacy_time = None
+    if legacy:
+        legacy_time, expected = time_call(lambda: legacy_get_top_memories(memory_store, query, emotion_query, TOP_K, ALPHA), 1)
+        assert [text for text, _ in vectorized] == [text for text, _ in expected]
+    return build_time, legacy_time, vectorized_time, batch_time / num_queries
+
+if __name__ == "__main__":
+    print(f"{'Memories':<10} {'Index build (ms)':<18} {'Loop (ms)':<12} {'Vectorized (ms)':<17} {'Batched, per query (ms)':<25} {'Speedup'}")
+    print("-" * 95)
+    for num_memories in [1000, 10000, 100000]:
+        build_time, legacy_time, vectorized_time, batch_time = benchmark(num_memories, legacy=num_memories <= 10000)
+        legacy_str = f"{legacy_time * 1000:.2f}" if legacy_time is not None else "-"
+        speedup = f"{legacy_time / vectorized_time:.0f}x" if legacy_time is not None else "-"
+        print(f"{num_memories:<10} {build_time * 1000:<18.1f} {legacy_str:<12} {vectorized_time * 1000:<17.3f} {batch_time * 1000:<25.3f} {speedup}")
+    print(f"\nEmbeddings are {SEMANTIC_DIM}-dim semantic + {EMOTION_DIM}-dim emotion; the loop is skipped above 10k memories.")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark for saving and loading a memory store as JSON versus the columnar store format.
+
+Saves the same synthetic store (1536-dim semantic and 8-dim emotion embeddings) with
+Memory.save_memory_store() to a .json file and to a columnar store directory, then reports
+file sizes, save and load times, and checks that retrieval returns the same memories.
+No API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory_store_io
+"""
+
+import os
+import tempfile
+import time
+import numpy as np
+from relationship_agent.memory import Memory
+
+SEMANTIC_DIM = 1536
+EMOTION_DIM = 8
+
+def build_memory(num_memories, rng):
+    memory = Memory()
+    semantic = rng.standard_normal((num_memories, SEMANTIC_DIM)).astype(np.float32)
+    emotion = rng.random((num_memories, EMOTION_DIM)).astype(np.float32)
+    for i in range(num_memories):
+        memory.memory_store[f"memory {i}"] = {
+            "semantic_embedding": semantic[i].tolist(),
+            "emotion_embedding": emotion[i].tolist(),
+            "inner_thoughts": f"thoughts about memory {i}",
+            "type": "Narrative",
+            "agent": "Blake"
+        }
+    return memory
+
+def disk_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def timed(func):
+    start_time = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start_time, result
+
+def benchmark(num_memories):
+    rng = np.random.default_rng(0)
+    memory = build_memory(num_memories, rng)
+    query, emotion_query = rng.standard_normal(SEMANTIC_DIM), rng.random(EMOTION_DIM)
+    expected = memory.get_top_memories(query, emotion_query, top_k=10)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for label, path, dtype in [
+            ("JSON", os.path.join(directory, "memories.json"), None),
+            ("columnar float32", os.path.join(directory, "memories_f32"), "float32"),
+            ("columnar float16", os.path.join(directory, "memories_f16"), "float16")
+        ]:
+            save_time, _ = timed(lambda: memory.save_memory_store(path, dtype=dtype or "float32"))
+            load_time, loaded = timed(lambda: Memory(memory_path=path))
+            found = loaded.get_top_memories(query, emotion_query, top_k=10)
+            assert [text for text, _ in found] == [text for text, _ in expected], label
+            results.append((label, disk_size(path), save_time, load_time))
+    return results
+
+if __name__ == "__main__":
+    for num_memories in [1000, 10000]:
+        print(f"\n{num_memories} memories")
+        print(f"{'Format':<20} {'Size (MB)':<12} {'Save (s)':<10} {'Load (s)':<10}")
+        print("-" * 52)
+        for label, size, save_time, load_time in benchmark(num_memories):
+            print(f"{label:<20} {size / 1e6:<12.1f} {save_time:<10.3f} {load_time:<10.3f}")
+    print("\nLoad times include building the retrieval index; columnar float32 stores are memory-mapped.")
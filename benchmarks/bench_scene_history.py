@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for rendering the scene history inside the turn loop.
+
+Every turn appends rows to the scene history and renders it for progress() and appraise().
+This compares re-rendering a plain list with history_to_str() on every call against a
+SceneHistory that keeps its rendering up to date as rows are appended.
+
+Run from the repository root:
+    python -m benchmarks.bench_scene_history
+"""
+
+import time
+import utils.general_utils as general_utils
+from utils.scene_history import SceneHistory
+
+ROW_TEXT = "Blake hesitates by the door, phone in hand, weighing whether to bring up the missed dinner again or let it go for tonight."
+RENDERS_PER_ROW = 2  # progress() and appraise() each render the history
+
+def legacy_history_to_str(history):
+    # The previous implementation: rebuilds the whole string with += on every call
+    hist_str = ""
+    for row in history:
+        hist_str += f"[{row[0]}]: {row[1]}\n"
+    return hist_str
+
+def run_turn_loop(history, render, num_rows):
+    start_time = time.perf_counter()
+    for i in range(num_rows):
+        history.append(["Narrative" if i % 2 == 0 else "Blake", ROW_TEXT])
+        for _ in range(RENDERS_PER_ROW):
+            render(history)
+    return time.perf_counter() - start_time
+
+def benchmark(num_rows):
+    legacy_time = run_turn_loop([], legacy_history_to_str, num_rows)
+    scene_history = SceneHistory()
+    incremental_time = run_turn_loop(scene_history, general_utils.history_to_str, num_rows)
+    assert scene_history.render() == legacy_history_to_str(list(scene_history))
+    return legacy_time, incremental_time
+
+if __name__ == "__main__":
+    print(f"{'Rows':<8} {'history_to_str (ms)':<22} {'SceneHistory (ms)':<20} {'Speedup'}")
+    print("-" * 60)
+    for num_rows in [50, 200, 500, 1000]:
+        legacy_time, incremental_time = benchmark(num_rows)
+        print(f"{num_rows:<8} {legacy_time * 1000:<22.2f} {incremental_time * 1000:<20.2f} {legacy_time / incremental_time:.1f}x")
+    print("\nSceneHistory times include counting the tokens of every appended row.")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the shared cross-agent memory store.
+
+Gives each of 1000 agents 100 memories of random 256-dim embeddings, once as 1000 separate
+Memory stores and once as namespaces of one SharedMemoryStore, then has every agent retrieve
+its top 5 memories in the same tick: one get_top_memories() call per agent store, one
+get_top_memories_batch() pass over the shared store, and the same pass reached through
+concurrent get_top_memories_async() calls. Reports build time and query latency per tick, and
+checks that every agent retrieves the same memories either way. Also reports the memory
+allocated for the embedding matrices, which each separate store over-allocates. No API calls are made.
+
+Run from the repository root:
+    python -m benchmarks.bench_shared_memory_store
+"""
+
+import asyncio
+import time
+import numpy as np
+from relationship_agent.memory import Memory
+from relationship_agent.shared_memory_store import SharedMemoryStore
+
+SEMANTIC_DIM = 256
+EMOTION_DIM = 8
+TOP_K = 5
+AGENTS = 1000
+MEMORIES_PER_AGENT = 100
+REPEATS = 3
+
+def build_records(rng):
+    records = {}
+    for agent in range(AGENTS):
+        semantic = rng.standard_normal((MEMORIES_PER_AGENT, SEMANTIC_DIM)).astype(np.float32)
+        emotion = rng.random((MEMORIES_PER_AGENT, EMOTION_DIM)).astype(np.float32)
+        records[f"agent-{agent}"] = [{"text": f"agent {agent} memory {i}", "semantic_embedding": semantic[i], "emotion_embedding": emotion[i]}
+                                     for i in range(MEMORIES_PER_AGENT)]
+    return records
+
+def embedding_bytes(index):
+    return index._semantic.nbytes + index._emotion.nbytes
+
+def timed(function):
+    # Best of REPEATS, in ms
+    best = None
+    for _ in range(REPEATS):
+        start_time = time.perf_counter()
+        result = function()
+        elapsed = (time.perf_counter() - start_time) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    records = build_records(rng)
+    namespaces = list(records)
+    queries = rng.standard_normal((AGENTS, SEMANTIC_DIM)).astype(np.float32)
+    emotion_queries = rng.random((AGENTS, EMOTION_DIM)).astype(np.float32)
+
+    start_time = time.perf_counter()
+    memories = {}
+    for namespace, agent_records in records.items():
+        memories[namespace] = Memory(embedding_backend="hashed-ngram")
+        memories[namespace].index.add_many(agent_records)
+    separate_build_ms = (time.perf_counter() - start_time) * 1000
+
+    start_time = time.perf_counter()
+    store = SharedMemoryStore(embedding_backend="hashed-ngram", capacity=AGENTS * MEMORIES_PER_AGENT)
+    for namespace, agent_records in records.items():
+        store.index.add_many(agent_records, namespace=namespace)
+    shared_build_ms = (time.perf_counter() - start_time) * 1000
+
+    separate_ms, separate = timed(lambda: [memories[namespace].get_top_memories(query, emotion_query, top_k=TOP_K)
+                                           for namespace, query, emotion_query in zip(namespaces, queries, emotion_queries)])
+    batched_ms, batched = timed(lambda: store.get_top_memories_batch(namespaces, queries, emotion_queries, top_k=TOP_K))
+
+    async def retrieve_concurrently():
+        return await asyncio.gather(*[store.memory(namespace).get_top_memories_async(query, emotion_query, top_k=TOP_K)
+                                      for namespace, query, emotion_query in zip(namespaces, queries, emotion_queries)])
+    async_ms, concurrent = timed(lambda: asyncio.run(retrieve_concurrently()))
+
+    print(f"{AGENTS} agents x {MEMORIES_PER_AGENT} memories, {SEMANTIC_DIM}-dim embeddings, one retrieval per agent per tick")
+    separate_mb = sum(embedding_bytes(memory.index) for memory in memories.values()) / 1e6
+    shared_mb = embedding_bytes(store.index) / 1e6
+    print(f"{'Store':<34} {'Build (ms)':<12} {'Matrices (MB)':<15} {'Tick (ms)':<11} {'Per agent (us)'}")
+    print("-" * 88)
+    print(f"{f'{AGENTS} separate Memory stores':<34} {separate_build_ms:<12.0f} {separate_mb:<15.0f} {separate_ms:<11.1f} {separate_ms * 1000 / AGENTS:.1f}")
+    print(f"{'Shared store, batched':<34} {shared_build_ms:<12.0f} {shared_mb:<15.0f} {batched_ms:<11.1f} {batched_ms * 1000 / AGENTS:.1f}")
+    print(f"{'Shared store, concurrent async':<34} {'':<12} {'':<15} {async_ms:<11.1f} {async_ms * 1000 / AGENTS:.1f}")
+    print(f"\nSame memories retrieved: {separate == batched == concurrent}")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Builds a prebuilt memory bundle for a persona from a raw memory corpus, so agents can start with seeded
+memories without appraising and embedding them through the API on every run.
+
+The corpus is streamed in chunks; each chunk is appraised with concurrent batched LLM calls and embedded with
+batched embedding requests (see RelationshipAgent.batch_appraise_memory_async). Finished appraisals are
+checkpointed next to the bundle, so an interrupted build resumes where it stopped.
+
+Usage:
+    python build_memory_bundle.py ryan_memories_grouped.json --agent Ryan --out memory_bundles/ryan \
+        --group-size 5 --group-names childhood,embarrassing,career,love,regrets
+    python build_memory_bundle.py blake_memories_grouped.json --agent Blake --out memory_bundles/blake \
+        --group-size 5 --group-names childhood,embarrassing,career,love,regrets
+
+Load the bundle with RelationshipAgent("Ryan", persona, memory_bundle="memory_bundles/ryan"). Bundles built with
+--embedding-backend (e.g. hashed-ngram, which embeds offline) are loaded by agents using the same backend:
+RelationshipAgent("Ryan", persona, memory_bundle="memory_bundles/ryan", embedding_backend="hashed-ngram").
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import time
+from relationship_agent.relationship_agent import RelationshipAgent
+from relationship_agent.memory_bundle import read_corpus, save_memory_bundle
+
+APPRAISAL_MODEL = "qwen3-32b-fp8"
+
+async def build_memory_bundle(corpus_path, bundle_path, agent_name=None, batch_size=8, max_concurrency=8, chunk_size=1024, dtype="float32", group_size=None, group_names=None, embedding_backend=None):
+    """
+    Appraises, embeds and saves a memory corpus as a memory bundle.
+
+    Args:
+        corpus_path (str): Memory corpus (.json list, .jsonl or plain text, see read_corpus).
+        bundle_path (str): Bundle directory to write.
+        agent_name (str): Persona the memories belong to.
+        batch_size (int): Memories per appraisal call.
+        max_concurrency (int): Appraisal calls in flight at once.
+        chunk_size (int): Memories read from the corpus at a time.
+        dtype (str): "float32", "float16" or "int8" embedding storage.
+        group_size (int): Label ungrouped memories in consecutive blocks of this size (see read_corpus).
+        group_names (list): Names of those blocks.
+        embedding_backend (str): Embedding backend spec (see utils/llm_utils.py); the default backend if None.
+
+    Returns:
+        int: Number of memories in the bundle.
+    """
+    agent = RelationshipAgent(agent_name or "Bundle", "", embedding_backend=embedding_backend)
+    checkpoint_path = f"{os.path.normpath(bundle_path)}.checkpoint.jsonl"
+
+    memories = read_corpus(corpus_path, group_size=group_size, group_names=group_names)
+    chunk_start = 0
+    while True:
+        chunk = list(itertools.islice(memories, chunk_size))
+        if not chunk:
+            break
+        print(f"Appraising memories {chunk_start + 1}-{chunk_start + len(chunk)}")
+        await agent.batch_appraise_memory_async(
+            [text for text, _ in chunk],
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            checkpoint_path=checkpoint_path,
+            groups=[group for _, group in chunk]
+        )
+        chunk_start += len(chunk)
+
+    save_memory_bundle(
+        agent.memory,
+        bundle_path,
+        agent_name=agent_name,
+        source=corpus_path,
+        embedding_model=agent.memory.embedding_backend.name,
+        appraisal_model=APPRAISAL_MODEL,
+        dtype=dtype
+    )
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return agent.memory.count()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a memory bundle from a memory corpus.")
+    parser.add_argument("corpus", help="Memory corpus: .json list of strings, .jsonl, or one memory per line")
+    parser.add_argument("--out", required=True, help="Bundle directory to write")
+    parser.add_argument("--agent", help="Name of the persona the memories belong to")
+    parser.add_argument("--batch-size", type=int, default=8, help="Memories per appraisal call")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Appraisal calls in flight at once")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="Memories read from the corpus at a time")
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], default="float32", help="Embedding storage type")
+    parser.add_argument("--group-size", type=int, help="Label ungrouped memories in consecutive blocks of this size")
+    parser.add_argument("--group-names", help="Comma-separated names of those blocks")
+    parser.add_argument("--embedding-backend", help="Embedding backend spec, e.g. openai:text-embedding-3-small or hashed-ngram")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    count = asyncio.run(build_memory_bundle(
+        args.corpus,
+        args.out,
+        agent_name=args.agent,
+        batch_size=args.batch_size,
+        max_concurrency=args.max_concurrency,
+        chunk_size=args.chunk_size,
+        dtype=args.dtype,
+        group_size=args.group_size,
+        group_names=args.group_names.split(",") if args.group_names else None,
+        embedding_backend=args.embedding_backend
+    ))
+    print(f"Wrote {count} memories to {args.out} in {time.time() - start_time:.2f} seconds.")
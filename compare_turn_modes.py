@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+A/B harness comparing the two-call turn mode (appraise + make_choices) against the
+fused single-call turn mode (appraise_and_choose).
+
+Both modes are run repeatedly from the same scene context, and the script reports the
+distribution of emotion scores, inner thought and action lengths, prompt sizes and latency
+for each mode.
+"""
+
+import asyncio
+import json
+import os
+import time
+import numpy as np
+from relationship_agent.relationship_agent import RelationshipAgent
+from scene_master.scene_master import SceneMaster
+import utils.general_utils as general_utils
+from relationship_agent.agent_utils import render_j2_template
+
+EMOTIONS = ["joy", "acceptance", "fear", "surprise", "sadness", "disgust", "anger", "anticipation"]
+
+async def setup_scene(agent1, agent2):
+    """
+    Initializes a scene and progresses it once, returning the scene master and the acting agent.
+    """
+    scene_master = SceneMaster(agent1, agent2)
+    sm_action = await scene_master.initialize_async()
+    for agent in (agent1, agent2):
+        agent.add_to_working_memory(text=scene_master.scene_state.scene_conflict, memory_type="Scene Conflict")
+        agent.add_to_working_memory(text=sm_action.current_scene, memory_type="Narrative")
+    scene_master.append_to_history(0, sm_action.current_scene)
+
+    sm_action = await scene_master.progress_async()
+    scene_master.append_to_history(0, sm_action.narrative)
+    curr_agent = agent1 if sm_action.character_uuid == agent1.agent_id else agent2
+    return scene_master, sm_action.narrative, curr_agent
+
+def two_call_prompt_chars(agent, scene_history, narrative, retrievals=""):
+    """
+    Approximates the input size of a two-call turn by rendering both prompts.
+    """
+    appraisal_prompt = render_j2_template(agent.prompts['emotion_appraisal.j2'], {
+        "agent_information": agent.agent_state,
+        "context": "",
+        "conversation_history": general_utils.history_to_str(scene_history)
+    })
+    choice_prompt = render_j2_template(agent.prompts['make_choice.j2'], {
+        "agent_name": agent.name,
+        "internal_thought": "",
+        "agent_persona": agent.agent_state,
+        "retrieved_memories": retrievals,
+        "previous_narrative": agent.memory.format_working_memory(),
+        "current_narrative": narrative
+    })
+    return len(appraisal_prompt) + len(choice_prompt)
+
+async def run_two_call_turn(agent, scene_history, narrative):
+    start_time = time.time()
+    appraisal = await agent.appraise_async(scene_history)
+    action = await agent.make_choices_async(narrative, appraisal=appraisal)
+    return appraisal, action, time.time() - start_time
+
+async def run_fused_turn(agent, narrative):
+    start_time = time.time()
+    appraisal, action = await agent.appraise_and_choose_async(narrative)
+    return appraisal, action, time.time() - start_time
+
+def ks_statistic(a, b):
+    """
+    Two-sample Kolmogorov-Smirnov statistic: the largest gap between the empirical CDFs of a and b.
+    """
+    a = np.sort(np.asarray(a, dtype=float))
+    b = np.sort(np.asarray(b, dtype=float))
+    if len(a) == 0 or len(b) == 0:
+        return None
+    values = np.concatenate([a, b])
+    cdf_a = np.searchsorted(a, values, side="right") / len(a)
+    cdf_b = np.searchsorted(b, values, side="right") / len(b)
+    return float(np.max(np.abs(cdf_a - cdf_b)))
+
+def summarize_samples(samples):
+    """
+    Collapses the per-trial samples of one mode into summary statistics.
+    """
+    scores = np.array([s["emotion_scores"] for s in samples if s["emotion_scores"] is not None], dtype=float)
+    summary = {
+        "trials": len(samples),
+        "mean_latency": float(np.mean([s["latency"] for s in samples])),
+        "mean_inner_thoughts_length": float(np.mean([len(s["inner_thoughts"]) for s in samples])),
+        "mean_action_length": float(np.mean([len(s["action"]) for s in samples])),
+        "prompt_chars": samples[0]["prompt_chars"] if samples else 0,
+        "emotion_mean": {},
+        "emotion_std": {}
+    }
+    if len(scores):
+        for idx, emotion in enumerate(EMOTIONS):
+            summary["emotion_mean"][emotion] = float(np.mean(scores[:, idx]))
+            summary["emotion_std"][emotion] = float(np.std(scores[:, idx]))
+    return summary
+
+def compare_modes(two_call_samples, fused_samples):
+    """
+    Compares the two modes per emotion dimension and for the free-text lengths.
+    """
+    comparison = {}
+    for idx, emotion in enumerate(EMOTIONS):
+        a = [s["emotion_scores"][idx] for s in two_call_samples if s["emotion_scores"] is not None]
+        b = [s["emotion_scores"][idx] for s in fused_samples if s["emotion_scores"] is not None]
+        comparison[emotion] = {
+            "mean_difference": float(np.mean(b) - np.mean(a)) if a and b else None,
+            "ks_statistic": ks_statistic(a, b)
+        }
+    comparison["action_length_ks"] = ks_statistic([len(s["action"]) for s in two_call_samples], [len(s["action"]) for s in fused_samples])
+    comparison["inner_thoughts_length_ks"] = ks_statistic([len(s["inner_thoughts"]) for s in two_call_samples], [len(s["inner_thoughts"]) for s in fused_samples])
+    return comparison
+
+async def run_ab_comparison(agent1_name, agent1_persona, agent2_name, agent2_persona, trials=10):
+    """
+    Runs both turn modes `trials` times on the same scene context and compares the results.
+    """
+    agent1 = RelationshipAgent(agent1_name, agent1_persona)
+    agent2 = RelationshipAgent(agent2_name, agent2_persona)
+    scene_master, narrative, agent = await setup_scene(agent1, agent2)
+    scene_history = scene_master.scene_history
+
+    # Both modes see the same long-term memories
+    retrievals = agent._retrieve_memories(narrative)
+    two_call_chars = two_call_prompt_chars(agent, scene_history, narrative, retrievals)
+    fused_chars = len(agent._render_turn_prompt(narrative, retrievals))
+
+    def to_sample(result, prompt_chars):
+        appraisal, action, latency = result
+        appraisal = appraisal or {}
+        return {
+            "emotion_scores": appraisal.get("emotion_scores"),
+            "inner_thoughts": appraisal.get("inner_thoughts", ""),
+            "action": action.get("action", ""),
+            "latency": latency,
+            "prompt_chars": prompt_chars
+        }
+
+    two_call_results = await asyncio.gather(*[run_two_call_turn(agent, scene_history, narrative) for _ in range(trials)])
+    fused_results = await asyncio.gather(*[run_fused_turn(agent, narrative) for _ in range(trials)])
+
+    two_call_samples = [to_sample(r, two_call_chars) for r in two_call_results]
+    fused_samples = [to_sample(r, fused_chars) for r in fused_results]
+
+    return {
+        "agent": agent.name,
+        "narrative": narrative,
+        "two_call": summarize_samples(two_call_samples),
+        "fused": summarize_samples(fused_samples),
+        "comparison": compare_modes(two_call_samples, fused_samples),
+        "samples": {"two_call": two_call_samples, "fused": fused_samples}
+    }
+
+if __name__ == "__main__":
+    results = asyncio.run(run_ab_comparison(
+        "Alex", "A thoughtful introvert who values deep conversations and personal space. Alex is analytical and prefers to think before speaking.",
+        "Jordan", "An outgoing extrovert who loves socializing and spontaneous adventures. Jordan is expressive and acts on intuition.",
+        trials=10
+    ))
+
+    for mode in ("two_call", "fused"):
+        summary = results[mode]
+        print(f"\n[{mode}] trials={summary['trials']} latency={summary['mean_latency']:.2f}s prompt_chars={summary['prompt_chars']}")
+        for emotion in EMOTIONS:
+            if emotion in summary["emotion_mean"]:
+                print(f"  {emotion:<13} mean={summary['emotion_mean'][emotion]:.2f} std={summary['emotion_std'][emotion]:.2f}")
+
+    print("\nPer-emotion comparison (fused - two_call):")
+    for emotion in EMOTIONS:
+        entry = results["comparison"][emotion]
+        if entry["mean_difference"] is not None:
+            print(f"  {emotion:<13} mean_diff={entry['mean_difference']:+.2f} ks={entry['ks_statistic']:.2f}")
+
+    os.makedirs("simulation_results", exist_ok=True)
+    with open("simulation_results/turn_mode_ab_results.json", "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print("\nResults saved to simulation_results/turn_mode_ab_results.json")
@@ -22,3 +22,44 @@ def render_j2_template(template_content, context_dict):
     template = Template(template_content)
     return template.render(**context_dict)
 
+def format_retrieved_memories(memories):
+    """
+    Formats retrieved long-term memories, [(memory, inner_thoughts), ...], for a prompt.
+    """
+    lines = []
+    for text, inner_thoughts in memories:
+        lines.append(f"- {text}")
+        if inner_thoughts:
+            lines.append(f"  Inner Thoughts: {inner_thoughts}")
+    return "\n".join(lines)
+
+
+def read_appraisal_checkpoint(checkpoint_path):
+    """
+    Reads the memory appraisals saved by append_appraisal_checkpoint().
+
+    Args:
+        checkpoint_path (str): Path to the JSONL checkpoint file.
+
+    Returns:
+        dict: key: memory text, value: its 8 emotion scores. Empty if the file does not exist.
+    """
+    appraisals = {}
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return appraisals
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            # A torn last line (from a crash mid-write) is re-appraised
+            if not line.endswith("\n"):
+                break
+            entry = json.loads(line)
+            appraisals[entry["text"]] = entry["emotion_embedding"]
+    return appraisals
+
+def append_appraisal_checkpoint(checkpoint_path, memories, emotion_embeddings):
+    """
+    Appends the appraisals of a finished batch to a JSONL checkpoint file, one memory per line.
+    """
+    with open(checkpoint_path, 'a', encoding='utf-8') as f:
+        f.write("".join(json.dumps({"text": memory, "emotion_embedding": emotion_embedding}, ensure_ascii=False) + "\n"
+                        for memory, emotion_embedding in zip(memories, emotion_embeddings)))
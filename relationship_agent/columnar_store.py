@@ -0,0 +1,159 @@
+import json
+import os
+import shutil
+import numpy as np
+from relationship_agent.memory_index import MemoryIndex
+from relationship_agent.quantization import QuantizedMatrix, quantize_matrix
+
+FORMAT_VERSION = 2
+METADATA_FILE = "metadata.json"
+
+
+def is_columnar_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, METADATA_FILE))
+
+
+def save_columnar_store(path, index, dtype="float32", extra=None):
+    """
+    Saves a memory index as a directory of columns:
+
+        semantic.npy, emotion.npy          unit-length embedding matrices (float32 or float16), one row per memory;
+        semantic_scale.npy                 int8 stores keep int8 semantic rows and their per-row scales
+        has_semantic.npy, has_emotion.npy  which rows have each embedding
+        ids.npy                            memory ids
+        intensity.npy, last_used.npy,      usage stats for capacity policies
+        retrievals.npy
+        type.npy, agent.npy, scene.npy,    interned string codes (-1 for None)
+        group.npy, namespace.npy
+        metadata.json                      text and inner_thoughts columns in row order, the string table and
+                                           the embedding backend of the semantic embeddings
+
+    The directory is written next to path and swapped in at the end, so readers never see a partial store.
+
+    Args:
+        path (str): Store directory.
+        index (MemoryIndex): The memory records to save.
+        dtype (str): "float32", "float16" or "int8" for the semantic matrix, "float32" or "float16" for the emotion
+            matrix (float32 in int8 stores).
+        extra (dict): Additional metadata fields, e.g. the last write-ahead log segment the store includes.
+    """
+    path = os.path.normpath(path)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    columns = index.columns()
+    if columns["semantic"] is not None:
+        if dtype == "int8":
+            semantic = quantize_matrix(columns["semantic"], "int8")
+            np.save(os.path.join(tmp_path, "semantic.npy"), semantic.codes)
+            np.save(os.path.join(tmp_path, "semantic_scale.npy"), semantic.scales)
+        else:
+            np.save(os.path.join(tmp_path, "semantic.npy"), np.ascontiguousarray(columns["semantic"], dtype=dtype))
+    if columns["emotion"] is not None:
+        np.save(os.path.join(tmp_path, "emotion.npy"), np.ascontiguousarray(columns["emotion"], dtype="float32" if dtype == "int8" else dtype))
+    for name in ("has_semantic", "has_emotion", "ids"):
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(columns[name]))
+    for name, codes in columns["codes"].items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(codes))
+    for name, values in columns["stats"].items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(values))
+
+    metadata = {
+        "version": FORMAT_VERSION,
+        "dtype": dtype,
+        "count": len(index),
+        "next_id": index.next_id,
+        "embedding_backend": index.embedding_backend,
+        "strings": index.strings.strings,
+        "text": index.texts,
+        "inner_thoughts": index.inner_thoughts
+    }
+    metadata.update(extra or {})
+    with open(os.path.join(tmp_path, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False)
+
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+
+
+def read_store_metadata(path):
+    with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_columnar_store(path, mmap=True, ann=None, semantic_dtype="float32"):
+    """
+    Loads a store saved by save_columnar_store() as a MemoryIndex whose semantic embeddings are stored as
+    semantic_dtype ("float32", "float16" or "int8", see MemoryIndex).
+
+    With mmap=True, embedding matrices already stored as semantic_dtype (and float32 emotion matrices) are
+    memory-mapped read-only, so loading does not read them and several processes can share one store; they are
+    copied into memory only if this Memory writes to them. Other matrices are converted on load. A float32
+    store loaded with a reduced-precision semantic_dtype and mmap=True stays mapped for reranking.
+    """
+    metadata = read_store_metadata(path)
+    version = metadata.get("version")
+    if version not in (1, FORMAT_VERSION):
+        raise ValueError(f"Unsupported memory store version {version} in {path}")
+
+    mmap_mode = "r" if mmap else None
+
+    def load_column(name, mmap_mode=mmap_mode, convert=True):
+        column_path = os.path.join(path, f"{name}.npy")
+        if not os.path.exists(column_path):
+            return None
+        column = np.load(column_path, mmap_mode=mmap_mode)
+        if convert and column.dtype != np.float32 and column.ndim == 2:
+            column = column.astype(np.float32)
+        return column
+
+    semantic = load_column("semantic", convert=False)
+    if semantic is not None and semantic.dtype == np.int8:
+        semantic = QuantizedMatrix(semantic, load_column("semantic_scale"))
+    elif semantic is not None and semantic.dtype == np.float16:
+        semantic = QuantizedMatrix(semantic)
+    # Full-precision rows to rerank reduced-precision scores with, if they cost no memory
+    semantic_full = semantic if mmap and semantic_dtype != "float32" and isinstance(semantic, np.memmap) else None
+
+    count = len(metadata["text"])
+    if version == 1:
+        # Version 1 stores had no ids and kept type and agent as plain string columns
+        strings = sorted({s for column in ("type", "agent") for s in metadata[column] if s is not None})
+        codes_of = {s: code for code, s in enumerate(strings)}
+        ids = np.arange(count, dtype=np.int64)
+        codes = {column: np.array([codes_of.get(s, -1) for s in metadata.get(column, [None] * count)], dtype=np.int32)
+                 for column in MemoryIndex.STRING_COLUMNS}
+    else:
+        strings = metadata["strings"]
+        ids = load_column("ids")
+        codes = {column: load_column(column) for column in MemoryIndex.STRING_COLUMNS}
+        for column, column_codes in codes.items():
+            if column_codes is None:
+                # Stores saved before the column existed
+                codes[column] = np.full(count, -1, dtype=np.int32)
+
+    index = MemoryIndex.from_columns(
+        ids,
+        metadata["text"],
+        metadata["inner_thoughts"],
+        strings,
+        codes,
+        semantic,
+        load_column("emotion"),
+        load_column("has_semantic"),
+        load_column("has_emotion"),
+        # Stats change on every retrieval, so they are read into memory; stores saved before them get defaults
+        stats={column: load_column(column, mmap_mode=None) for column in MemoryIndex.STAT_COLUMNS},
+        ann=ann,
+        semantic_dtype=semantic_dtype,
+        semantic_full=semantic_full
+    )
+    index.next_id = max(index.next_id, metadata.get("next_id", 0))
+    index.embedding_backend = metadata.get("embedding_backend")
+    return index
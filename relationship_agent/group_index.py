@@ -0,0 +1,153 @@
+import numpy as np
+from relationship_agent.memory_index import normalize_rows
+
+
+class GroupIndex():
+    def __init__(self, top_groups=3, min_size=0) -> None:
+        """
+        Two-level index over groups of related memories (the group column of a MemoryIndex, e.g. "childhood",
+        "career"). It keeps one centroid per group, the normalized mean of its members' semantic embeddings. A
+        query scores the centroids first and then only the members of its top_groups groups, so retrieval cost
+        grows with the number of groups plus the size of the groups searched, and the memories recalled
+        together come from the same few episodes of the agent's life. Memories without a group form one group
+        of their own.
+
+        Plugs into MemoryIndex like IVFIndex (Memory(ann_index=GroupIndex())). Group membership is updated
+        incrementally: only the centroids of groups that changed since the last search are recomputed, from
+        their members.
+
+        Args:
+            top_groups (int): Number of groups searched per query.
+            min_size (int): Below this many rows, searches fall back to exact scoring.
+        """
+        self.top_groups = top_groups
+        self.min_size = min_size
+
+        self.centroids = None
+        self.group_codes = []  # slot -> group code
+        self.assignments = np.full(0, -1, dtype=np.int32)  # row -> slot, -1 if unassigned
+        self._slots = {}  # group code -> slot
+        self._lists = []
+        self._list_arrays = []
+        self._pending = set()
+        self._dirty = set()
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None and len(self.group_codes) > 0
+
+    def mark(self, row):
+        """
+        Queues a new or overwritten row for (re)assignment.
+        """
+        self._pending.add(row)
+
+    def swap_remove(self, row, last):
+        """
+        Mirrors MemoryIndex.remove(): row is deleted and the last row is renumbered to row.
+        """
+        was_pending = last in self._pending
+        self._pending.discard(row)
+        self._pending.discard(last)
+        moved_slot = self.assignments[last] if last < len(self.assignments) else -1
+        for r in (row, last):
+            if r < len(self.assignments) and self.assignments[r] >= 0:
+                slot = self.assignments[r]
+                self._lists[slot].remove(r)
+                self._list_arrays[slot] = None
+                self._dirty.add(slot)
+        if row != last:
+            if row < len(self.assignments):
+                self.assignments[row] = moved_slot
+            if moved_slot >= 0:
+                self._lists[moved_slot].append(row)
+            if moved_slot < 0 or was_pending:
+                self._pending.add(row)
+        self.assignments = self.assignments[:min(last, len(self.assignments))]
+
+    def reset(self):
+        """
+        Forgets every group and row assignment, e.g. when the store is rebuilt.
+        """
+        self.centroids = None
+        self.group_codes = []
+        self.assignments = np.full(0, -1, dtype=np.int32)
+        self._slots = {}
+        self._lists = []
+        self._list_arrays = []
+        self._pending = set()
+        self._dirty = set()
+
+    def sync(self, vectors, groups=None):
+        """
+        Brings the index up to date with vectors (the first len(vectors) rows of the semantic matrix) and
+        groups (their group codes, -1 for none).
+        """
+        size = len(vectors)
+        if size < self.min_size:
+            return
+        if groups is None:
+            groups = np.full(size, -1, dtype=np.int32)
+        if len(self.assignments) < size:
+            self.assignments = np.concatenate([self.assignments, np.full(size - len(self.assignments), -1, dtype=np.int32)])
+            self._pending.update(np.flatnonzero(self.assignments == -1).tolist())
+        if self._pending:
+            rows = sorted(self._pending)
+            self._pending = set()
+            for row in rows:
+                self._assign(row, self._slot(int(groups[row])))
+        if self._dirty:
+            self._update_centroids(vectors)
+
+    def candidates(self, query_vectors, top_groups=None):
+        """
+        Returns, for each (unit-length) query, the array of rows in its top_groups closest groups.
+        """
+        top_groups = min(top_groups or self.top_groups, len(self.group_codes))
+        sizes = np.array([len(rows) for rows in self._lists])
+        group_scores = np.where(sizes > 0, query_vectors @ self.centroids.T, -np.inf)
+        if top_groups < len(self.group_codes):
+            probes = np.argpartition(-group_scores, top_groups - 1, axis=1)[:, :top_groups]
+        else:
+            probes = np.tile(np.arange(len(self.group_codes)), (len(query_vectors), 1))
+        return [np.concatenate([self._list_array(slot) for slot in query_probes]) for query_probes in probes]
+
+    def _slot(self, group_code):
+        slot = self._slots.get(group_code)
+        if slot is None:
+            slot = len(self.group_codes)
+            self._slots[group_code] = slot
+            self.group_codes.append(group_code)
+            self._lists.append([])
+            self._list_arrays.append(None)
+        return slot
+
+    def _assign(self, row, slot):
+        old_slot = self.assignments[row]
+        if old_slot != slot:
+            if old_slot >= 0:
+                self._lists[old_slot].remove(row)
+                self._list_arrays[old_slot] = None
+                self._dirty.add(old_slot)
+            self._lists[slot].append(row)
+            self._list_arrays[slot] = None
+            self.assignments[row] = slot
+        # The row's embedding may have changed even if its group did not
+        self._dirty.add(slot)
+
+    def _update_centroids(self, vectors):
+        num_groups = len(self.group_codes)
+        if self.centroids is None or len(self.centroids) < num_groups:
+            centroids = np.zeros((num_groups, vectors.shape[1]), dtype=np.float32)
+            if self.centroids is not None:
+                centroids[:len(self.centroids)] = self.centroids
+            self.centroids = centroids
+        for slot in self._dirty:
+            rows = self._list_array(slot)
+            self.centroids[slot] = normalize_rows(vectors[rows].sum(axis=0)) if len(rows) else 0
+        self._dirty = set()
+
+    def _list_array(self, slot):
+        if self._list_arrays[slot] is None:
+            self._list_arrays[slot] = np.array(self._lists[slot], dtype=np.int64)
+        return self._list_arrays[slot]
@@ -0,0 +1,214 @@
+import os
+import json
+import numpy as np
+
+
+def spherical_kmeans(vectors, num_clusters, iterations=10, seed=0):
+    """
+    Clusters unit-length vectors by cosine similarity. Returns (num_clusters, dim) unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=num_clusters)
+        # Re-seed empty clusters with random vectors so every list stays useful
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-8)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex():
+    def __init__(self, nlist=None, nprobe=8, min_train_size=1000, retrain_factor=4, max_train_samples=20000, seed=0) -> None:
+        """
+        Inverted-file approximate nearest neighbor index over the rows of a MemoryIndex's semantic matrix.
+
+        Vectors are clustered with spherical k-means; a query only scores the rows in the nprobe lists
+        whose centroids are closest to it. The index stores row ids only, the vectors stay in the MemoryIndex.
+
+        Inserts are incremental: new or overwritten rows are queued and assigned to their nearest centroid
+        in one batch before the next search. The index trains itself once min_train_size rows exist and
+        retrains when the store has grown by retrain_factor since the last training.
+
+        Args:
+            nlist (int): Number of clusters. Defaults to 4 * sqrt(rows) at training time.
+            nprobe (int): Number of clusters scanned per query.
+            min_train_size (int): Below this many rows, searches fall back to exact scoring.
+            retrain_factor (float): Retrain once the number of rows has grown by this factor.
+            max_train_samples (int): Number of rows k-means is run on.
+            seed (int): Seed for training.
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.retrain_factor = retrain_factor
+        self.max_train_samples = max_train_samples
+        self.seed = seed
+
+        self.centroids = None
+        self.trained_size = 0
+        self.assignments = np.full(0, -1, dtype=np.int32)  # row -> list, -1 if unassigned
+        self._lists = []
+        self._list_arrays = []
+        self._pending = set()
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def mark(self, row):
+        """
+        Queues a new or overwritten row for (re)assignment.
+        """
+        self._pending.add(row)
+
+    def swap_remove(self, row, last):
+        """
+        Mirrors MemoryIndex.remove(): row is deleted and the last row is renumbered to row.
+        """
+        was_pending = last in self._pending
+        self._pending.discard(row)
+        self._pending.discard(last)
+        moved_list = self.assignments[last] if last < len(self.assignments) else -1
+        for r in (row, last):
+            if r < len(self.assignments) and self.assignments[r] >= 0:
+                self._lists[self.assignments[r]].remove(r)
+                self._list_arrays[self.assignments[r]] = None
+        if row != last:
+            if row < len(self.assignments):
+                self.assignments[row] = moved_list
+            if moved_list >= 0:
+                self._lists[moved_list].append(row)
+                self._list_arrays[moved_list] = None
+            if moved_list < 0 or was_pending:
+                self._pending.add(row)
+        self.assignments = self.assignments[:min(last, len(self.assignments))]
+
+    def reset(self):
+        """
+        Forgets every row assignment but keeps the trained centroids, e.g. when the store is rebuilt.
+        """
+        self.assignments = np.full(0, -1, dtype=np.int32)
+        self._pending = set()
+        if self.is_trained:
+            self._lists = [[] for _ in range(len(self.centroids))]
+            self._list_arrays = [None] * len(self.centroids)
+
+    def sync(self, vectors, groups=None):
+        """
+        Brings the index up to date with vectors (the first len(vectors) rows of the semantic matrix).
+        groups (the rows' group codes) is not used; clusters are learned from the vectors.
+        """
+        size = len(vectors)
+        if size < self.min_train_size and not self.is_trained:
+            return
+        if not self.is_trained or size > self.trained_size * self.retrain_factor:
+            self.train(vectors)
+            return
+        if len(self.assignments) < size:
+            self.assignments = np.concatenate([self.assignments, np.full(size - len(self.assignments), -1, dtype=np.int32)])
+            self._pending.update(np.flatnonzero(self.assignments == -1).tolist())
+        if self._pending:
+            rows = np.array(sorted(self._pending), dtype=np.int64)
+            self._pending = set()
+            self._assign(rows, np.argmax(vectors[rows] @ self.centroids.T, axis=1))
+
+    def train(self, vectors):
+        """
+        Runs k-means on (a sample of) vectors and assigns every row.
+        """
+        size = len(vectors)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(size)))
+        nlist = min(nlist, size)
+        rng = np.random.default_rng(self.seed)
+        sample = vectors if size <= self.max_train_samples else vectors[np.sort(rng.choice(size, self.max_train_samples, replace=False))]
+        self.centroids = spherical_kmeans(np.ascontiguousarray(sample), nlist, seed=self.seed)
+        self.trained_size = size
+        self.assignments = self._nearest_centroids(vectors)
+        self._pending = set()
+        self._rebuild_lists()
+
+    def candidates(self, query_vectors, nprobe=None):
+        """
+        Returns, for each (unit-length) query, the array of rows in its nprobe closest lists.
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = query_vectors @ self.centroids.T
+        if nprobe < len(self.centroids):
+            probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.tile(np.arange(len(self.centroids)), (len(query_vectors), 1))
+        return [np.concatenate([self._list_array(list_id) for list_id in query_probes]) for query_probes in probes]
+
+    def save(self, path):
+        """
+        Saves the centroids and row assignments to path (.npz).
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        config = {
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "min_train_size": self.min_train_size,
+            "retrain_factor": self.retrain_factor,
+            "max_train_samples": self.max_train_samples,
+            "seed": self.seed,
+            "trained_size": self.trained_size
+        }
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids if self.is_trained else np.zeros((0, 0), dtype=np.float32),
+                assignments=self.assignments,
+                config=np.array(json.dumps(config))
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            config = json.loads(str(data["config"]))
+            trained_size = config.pop("trained_size")
+            index = cls(**config)
+            if data["centroids"].size:
+                index.centroids = data["centroids"]
+                index.trained_size = trained_size
+                index.assignments = data["assignments"]
+                index._rebuild_lists()
+        return index
+
+    def _nearest_centroids(self, vectors, batch_size=8192):
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            assignments[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ self.centroids.T, axis=1)
+        return assignments
+
+    def _assign(self, rows, list_ids):
+        for row, list_id in zip(rows.tolist(), list_ids.tolist()):
+            old_list = self.assignments[row]
+            if old_list == list_id:
+                continue
+            if old_list >= 0:
+                self._lists[old_list].remove(row)
+                self._list_arrays[old_list] = None
+            self._lists[list_id].append(row)
+            self._list_arrays[list_id] = None
+            self.assignments[row] = list_id
+
+    def _rebuild_lists(self):
+        nlist = len(self.centroids)
+        order = np.argsort(self.assignments, kind="stable")
+        valid = order[self.assignments[order] >= 0]
+        counts = np.bincount(self.assignments[valid], minlength=nlist)
+        splits = np.split(valid, np.cumsum(counts)[:-1])
+        self._lists = [split.tolist() for split in splits]
+        self._list_arrays = [split.astype(np.int64) for split in splits]
+
+    def _list_array(self, list_id):
+        if self._list_arrays[list_id] is None:
+            self._list_arrays[list_id] = np.array(self._lists[list_id], dtype=np.int64)
+        return self._list_arrays[list_id]
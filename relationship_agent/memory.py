@@ -1,20 +1,136 @@
 import json
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import utils.llm_utils as llm_utils
+import utils.general_utils as general_utils
+from relationship_agent.memory_index import MemoryIndex
+from relationship_agent.columnar_store import is_columnar_store, save_columnar_store, load_columnar_store
+from relationship_agent.memory_log import MemoryLog
+
+# Summaries of consolidated memories are written in the background, off the critical path of the turn loop
+_consolidation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-consolidation")
 
 def cosine_similarity(a, b):
         a = np.array(a)
         b = np.array(b)
         return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-8)
 
+def _to_json(value):
+    # Embeddings are stored as float32 array rows
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class MemoryStoreView(MutableMapping):
+    def __init__(self, memory) -> None:
+        """
+        Text-keyed dict view of a Memory's records, in the format memory_store had before memories had ids:
+        memory_store[text] -> {"semantic_embedding", "emotion_embedding", "inner_thoughts", "type", "agent", "scene", "group"}.
+
+        A text maps to its most recently added record. Values are built on access, so changing a returned
+        dict does not change the memory; assign or use Memory.update_memory() instead. Deleting a text deletes
+        every record with that text.
+        """
+        self.memory = memory
+
+    def __getitem__(self, text):
+        memory_id = self.memory.index.latest_id(text, self.memory.namespace)
+        if memory_id is None:
+            raise KeyError(text)
+        record = self.memory.index.get(memory_id)
+        del record["id"], record["text"]
+        return record
+
+    def __setitem__(self, text, data):
+        self.memory._add_record(
+            text,
+            data.get("semantic_embedding"),
+            data.get("emotion_embedding"),
+            data.get("inner_thoughts"),
+            data.get("type"),
+            data.get("agent"),
+            data.get("scene"),
+            data.get("group")
+        )
+
+    def __delitem__(self, text):
+        if text not in self:
+            raise KeyError(text)
+        self.memory.delete_memory(text)
+
+    def __iter__(self):
+        return iter(list(self._texts()))
+
+    def __len__(self):
+        return len(self._texts())
+
+    def __contains__(self, text):
+        if self.memory.namespace is None:
+            return text in self.memory.index.text_ids
+        return bool(self.memory.index.text_ids_in(text, self.memory.namespace))
+
+    def _texts(self):
+        index = self.memory.index
+        if self.memory.namespace is None:
+            return index.text_ids
+        # The texts of this Memory's namespace of a shared store, in row order
+        return dict.fromkeys(index.texts[row] for row in index.filter_rows({"namespace": self.memory.namespace}))
+
+
 class Memory():
-    def __init__(self, memory_path = None) -> None:
-        self.memory_store = {}  # key: memory, value: embedding (list of floats)
+    def __init__(self, memory_path = None, ann_index = None, policy = None, embedding_backend = None, semantic_dtype = "float32", shared_store = None, namespace = None) -> None:
         self.working_memory = []
-        
+        # Append-only rendering of working_memory: one pre-rendered string and token count per entry,
+        # plus the full rendering, so formatting never re-renders old entries
+        self._working_memory_rendered = []
+        self._working_memory_tokens = []
+        self._working_memory_text = ""
+        # The rendering above is of this list, synced at this version; add_to_working_memory() bumps the version
+        self._working_memory_version = 0
+        self._rendered_working_memory = self.working_memory
+        self._rendered_working_memory_version = 0
+        # The working memory list and how many of its entries were already stored in the long-term store,
+        # see store_working_memory_to_memory_store()
+        self._stored_working_memory = self.working_memory
+        self._stored_working_memory_count = 0
+
+        # Long-term memories: columnar records with integer ids, also used for retrieval,
+        # optionally with an approximate index (IVFIndex)
+        self.ann_index = ann_index
+        # Optional process-wide store (SharedMemoryStore) holding this Memory's records in its namespace,
+        # next to other agents' records; see shared_memory_store.py
+        self.shared_store = shared_store
+        self.namespace = namespace
+        if shared_store is not None:
+            if namespace is None:
+                raise ValueError("A Memory in a shared memory store needs a namespace")
+            if ann_index is not None or policy is not None:
+                raise ValueError("Approximate indexes and capacity policies are not supported in a shared memory store")
+            embedding_backend = embedding_backend or shared_store.embedding_backend
+            semantic_dtype = shared_store.semantic_dtype
+        # Embedding backend of the semantic embeddings (an EmbeddingBackend or a spec string, see utils/llm_utils.py);
+        # the default one if None. The index records it, and stores embedded with another backend are not loaded.
+        self.embedding_backend = llm_utils.resolve_embedding_backend(embedding_backend)
+        # Storage of the semantic embeddings: "float32", or "float16" / "int8" for 2x / 4x less memory at the cost
+        # of slower retrieval, several times slower for float16 (see MemoryIndex)
+        self.semantic_dtype = semantic_dtype
+        if shared_store is not None:
+            if self.embedding_backend.name != shared_store.embedding_backend.name:
+                raise ValueError(f"Shared memory store uses {shared_store.embedding_backend.name}, but this Memory uses {self.embedding_backend.name}")
+            self.index = shared_store.index
+        else:
+            self.index = MemoryIndex(ann=self.ann_index, semantic_dtype=semantic_dtype)
+            self.index.embedding_backend = self.embedding_backend.name
+        self._memory_store_view = MemoryStoreView(self)
+        # Optional write-ahead log, see open_log()
+        self.log = None
+        # Optional capacity policy (MemoryPolicy) and its in-flight consolidation and member ids, see consolidate()
+        self.policy = policy
+        self._consolidation = None
+        self._consolidating = set()
         if memory_path is not None:
-            with open(memory_path, "r", encoding="utf-8") as f:
-                self.memory_store = json.load(f)
+            self.load_memory_store(memory_path)
 
     def add_to_working_memory(self, text: str, emotion_embedding: list = None, inner_thoughts: str = None, memory_type: str = None, agent: str = None):
         """
@@ -27,111 +143,520 @@ class Memory():
             "type": memory_type,
             "agent": agent
         })
+        self._working_memory_version += 1
 
-    def format_working_memory(self):
+    def format_working_memory(self, last_n=None, token_budget=None):
         """
         Returns the working memory as a single structured string for LLM input,
         omitting the emotion_embedding.
         Includes type and agent if they are not None.
+        If last_n and/or token_budget are given, only the most recent events that fit are included,
+        which costs O(k) in the number of included events.
+        """
+        self._sync_working_memory()
+        if last_n is None and token_budget is None:
+            return self._working_memory_text
+
+        start = len(self._working_memory_rendered)
+        stop_at = 0 if last_n is None else max(start - last_n, 0)
+        used_tokens = 0
+        while start > stop_at:
+            entry_tokens = self._working_memory_tokens[start - 1]
+            if token_budget is not None and used_tokens + entry_tokens > token_budget:
+                break
+            used_tokens += entry_tokens
+            start -= 1
+        return "\n\n".join(self._working_memory_rendered[start:])
+
+    def working_memory_entries(self):
+        """
+        Returns the rendered working memory entries, oldest first.
+        """
+        self._sync_working_memory()
+        return self._working_memory_rendered
+
+    def working_memory_token_counts(self):
+        """
+        Returns the token count of each rendered working memory entry.
+        """
+        self._sync_working_memory()
+        return self._working_memory_tokens
+
+    def _sync_working_memory(self):
+        """
+        Renders working memory entries appended since the last call.
+        Working memory is append-only through add_to_working_memory(); if the list was replaced, or changed
+        other than by those appends (its length is not the rendered length plus one per append), the
+        rendering is rebuilt.
         """
-        formatted = []
-        for i, mem in enumerate(self.working_memory, 1):
-            entry = f"Event {i}:\n"
-            entry += f"  Event: {mem.get('text', '')}\n"
-            if mem.get('inner_thoughts'):
-                entry += f"  Inner Thoughts: {mem['inner_thoughts']}\n"
-            if mem.get('type') is not None:
-                entry += f"  Type: {mem['type']}\n"
-            if mem.get('agent') is not None:
-                entry += f"  Agent: {mem['agent']}\n"
-            formatted.append(entry.strip())
-        return "\n\n".join(formatted)
+        appended = self._working_memory_version - self._rendered_working_memory_version
+        if self._rendered_working_memory is not self.working_memory or len(self.working_memory) != len(self._working_memory_rendered) + appended:
+            self._rendered_working_memory = self.working_memory
+            self._working_memory_rendered = []
+            self._working_memory_tokens = []
+            self._working_memory_text = ""
+        self._rendered_working_memory_version = self._working_memory_version
+        for i in range(len(self._working_memory_rendered), len(self.working_memory)):
+            entry = self._render_working_memory_entry(i + 1, self.working_memory[i])
+            self._working_memory_rendered.append(entry)
+            self._working_memory_tokens.append(general_utils.count_tokens(entry))
+            if self._working_memory_text:
+                self._working_memory_text += "\n\n" + entry
+            else:
+                self._working_memory_text = entry
+
+    def _render_working_memory_entry(self, i, mem):
+        entry = f"Event {i}:\n"
+        entry += f"  Event: {mem.get('text', '')}\n"
+        if mem.get('inner_thoughts'):
+            entry += f"  Inner Thoughts: {mem['inner_thoughts']}\n"
+        if mem.get('type') is not None:
+            entry += f"  Type: {mem['type']}\n"
+        if mem.get('agent') is not None:
+            entry += f"  Agent: {mem['agent']}\n"
+        return entry.strip()
 
     
     def store_working_memory_to_memory_store(self):
         """
-        Store all entries in working_memory that have an emotion_embedding into the memory_store.
-        Uses the text as the key and stores semantic_embedding, emotion_embedding, inner_thoughts, type, and agent.
-        """
-        for mem in self.working_memory:
-            text = mem.get("text")
-            emotion_embedding = mem.get("emotion_embedding")
-            if text is not None and emotion_embedding is not None:
-                semantic_embedding = llm_utils.get_text_embedding(text)
-                self.memory_store[text] = {
-                    "semantic_embedding": semantic_embedding,
-                    "emotion_embedding": emotion_embedding,
-                    "inner_thoughts": mem.get("inner_thoughts"),
-                    "type": mem.get("type"),
-                    "agent": mem.get("agent")
-                }
+        Store the entries in working_memory that have an emotion_embedding into the memory_store.
+        Each entry becomes a record with semantic_embedding, emotion_embedding, inner_thoughts, type, and agent.
+        Only entries added since the last call are stored, so memories a capacity policy evicted or merged
+        since then do not come back. Texts already in the store reuse their embedding; the rest are embedded
+        in one batched request and inserted as one block. Returns the memory ids.
+        """
+        entries, previous_count = self._take_unstored_working_memory()
+        try:
+            return self.add_memories(entries)
+        except Exception:
+            self._stored_working_memory_count = previous_count
+            raise
+
+    async def store_working_memory_to_memory_store_async(self):
+        """
+        Async version of store_working_memory_to_memory_store().
+        """
+        entries, previous_count = self._take_unstored_working_memory()
+        try:
+            return await self.add_memories_async(entries)
+        except Exception:
+            self._stored_working_memory_count = previous_count
+            raise
+
+    def _take_unstored_working_memory(self):
+        """
+        Returns the working memory entries not stored yet and marks them stored (concurrent calls then never
+        store them twice), with the previous count to restore if storing fails.
+        """
+        if self._stored_working_memory is not self.working_memory or self._stored_working_memory_count > len(self.working_memory):
+            # working_memory was replaced or shrunk: none of its entries were stored from this list
+            self._stored_working_memory = self.working_memory
+            self._stored_working_memory_count = 0
+        previous_count = self._stored_working_memory_count
+        self._stored_working_memory_count = len(self.working_memory)
+        return self.working_memory[previous_count:], previous_count
+
+    def add_memories(self, entries):
+        """
+        Adds many memories at once: entries are dicts with text, emotion_embedding and optional inner_thoughts,
+        type, agent and group, as in working_memory. Entries without a text or emotion_embedding are skipped. The texts
+        are embedded in batched requests and inserted as one block. Returns the memory ids.
+        """
+        entries, missing = self._pending_entries(entries)
+        embeddings = llm_utils.get_text_embeddings(missing, backend=self.embedding_backend) if missing else []
+        return self._store_entries(entries, dict(zip(missing, embeddings)))
+
+    async def add_memories_async(self, entries):
+        """
+        Async version of add_memories().
+        """
+        entries, missing = self._pending_entries(entries)
+        embeddings = await llm_utils.get_text_embeddings_async(missing, backend=self.embedding_backend) if missing else []
+        return self._store_entries(entries, dict(zip(missing, embeddings)))
+
+    def _pending_entries(self, entries):
+        """
+        Returns the entries to store and the texts that still need a semantic embedding.
+        """
+        entries = [mem for mem in entries if mem.get("text") is not None and mem.get("emotion_embedding") is not None]
+        missing = {}
+        for mem in entries:
+            text = mem["text"]
+            if text not in missing and self.index.semantic_embedding_for_text(text) is None:
+                missing[text] = None
+        return entries, list(missing)
+
+    def _store_entries(self, entries, embeddings):
+        records = []
+        for mem in entries:
+            text = mem["text"]
+            semantic_embedding = embeddings.get(text)
+            if semantic_embedding is None:
+                semantic_embedding = self.index.semantic_embedding_for_text(text)
+            records.append({
+                "op": "add",
+                "text": text,
+                "semantic_embedding": semantic_embedding,
+                "emotion_embedding": mem["emotion_embedding"],
+                "inner_thoughts": mem.get("inner_thoughts"),
+                "type": mem.get("type"),
+                "agent": mem.get("agent"),
+                "scene": None,
+                "group": mem.get("group")
+            })
+        return self._commit_many(records)
 
     # joy, acceptance, fear, surprise, sadness, disgust, anger, and anticipation
 
-    def load_memory_store(self, memory_path):
+    @property
+    def memory_store(self):
         """
-        Load the memory store from a JSON file.
+        Text-keyed dict view of the memory records (see MemoryStoreView).
         """
+        return self._memory_store_view
+
+    @memory_store.setter
+    def memory_store(self, memory_store):
+        # Replacing the whole store (e.g. with a dict loaded from JSON) rebuilds the records without logging them
+        self._replace_index(MemoryIndex.from_memory_store(memory_store, semantic_dtype=self.semantic_dtype))
+
+    def load_memory_store(self, memory_path, mmap=True):
+        """
+        Load the memory store from a JSON file, or from a columnar store directory (see save_memory_store).
+        Columnar stores are memory-mapped read-only unless mmap is False.
+        """
+        if is_columnar_store(memory_path):
+            self._replace_index(load_columnar_store(memory_path, mmap=mmap, semantic_dtype=self.semantic_dtype))
+            return
         with open(memory_path, "r", encoding="utf-8") as f:
             self.memory_store = json.load(f)
 
-    def save_memory_store(self, memory_path):
+    def save_memory_store(self, memory_path, dtype="float32"):
+        """
+        Save the current memory store. Paths ending in .json are written as a text-keyed JSON file; any other
+        path is written as a columnar store directory (embedding matrices in .npy files plus a metadata table),
+        which keeps memory ids and loads without parsing the embeddings. dtype ("float32", "float16" or "int8")
+        applies to columnar stores. A Memory in a shared store saves its own namespace only.
+        """
+        if memory_path.endswith(".json"):
+            with open(memory_path, "w", encoding="utf-8") as f:
+                json.dump(dict(self.memory_store.items()), f, ensure_ascii=False, indent=2, default=_to_json)
+            return
+        save_columnar_store(memory_path, self.own_index(), dtype=dtype)
+
+    def own_index(self):
         """
-        Save the current memory store to a JSON file.
+        Returns the MemoryIndex of this Memory's records: its index, or a copy of its namespace of a shared store.
         """
-        with open(memory_path, "w", encoding="utf-8") as f:
-            json.dump(self.memory_store, f, ensure_ascii=False, indent=2)
+        if self.shared_store is None:
+            return self.index
+        return self.index.subset(self.index.filter_rows({"namespace": self.namespace}))
 
-    def add_memory(self, text: str, emotion_embedding: list, inner_thoughts: str = None, memory_type: str = None, agent: str = None):
-        semantic_embedding = llm_utils.get_text_embedding(text)
-        self.memory_store[text] = {
+    def count(self):
+        """
+        Returns the number of long-term memories.
+        """
+        return self.index.count(self.namespace) if self.shared_store is not None else len(self.index)
+
+    def find(self, text, agent=None, scene=None):
+        """
+        Returns the id of the memory with this text, agent and scene, or None.
+        """
+        return self.index.find(text, agent, scene, self.namespace)
+
+    def add_memory(self, text: str, emotion_embedding: list, inner_thoughts: str = None, memory_type: str = None, agent: str = None, scene: str = None, group: str = None):
+        """
+        Adds a memory and returns its id. Adding the same text again for the same agent and scene overwrites it.
+        group: optional label of a group of related memories (e.g. "childhood"), used by GroupIndex.
+        """
+        semantic_embedding = llm_utils.get_text_embedding(text, backend=self.embedding_backend)
+        return self._add_record(text, semantic_embedding, emotion_embedding, inner_thoughts, memory_type, agent, scene, group)
+
+    def get_memory(self, memory_id: int):
+        """
+        Returns the record of a memory (id, text, embeddings, inner_thoughts, type, agent, scene, group).
+        """
+        return self.index.get(memory_id)
+
+    def update_memory(self, memory, emotion_embedding: list = None, inner_thoughts: str = None, memory_type: str = None):
+        """
+        Updates the given fields of a stored memory; fields left as None are unchanged.
+        memory: a memory id, or a text (its most recently added record).
+        """
+        memory_id = self._resolve_id(memory)
+        fields = {"emotion_embedding": emotion_embedding, "inner_thoughts": inner_thoughts, "type": memory_type}
+        record = {"op": "update", "id": memory_id}
+        record.update({key: value for key, value in fields.items() if value is not None})
+        self._commit(record)
+
+    def delete_memory(self, memory):
+        """
+        Removes a memory by id, or every record with a given text.
+        """
+        if isinstance(memory, str):
+            memory_ids = self.index.text_ids_in(memory, self.namespace)
+            if not memory_ids:
+                raise KeyError(f"No memory with text: {memory}")
+        else:
+            memory_ids = [self._resolve_id(memory)]
+        for memory_id in memory_ids:
+            self._commit({"op": "delete", "id": memory_id})
+
+    def open_log(self, store_path, compact_every=1000, fsync=False):
+        """
+        Persists this memory store through an append-only write-ahead log in store_path (see MemoryLog):
+        recovers the latest snapshot plus the log, then logs every add, update and delete before applying it.
+        Returns the number of log records replayed.
+        """
+        if self.shared_store is not None:
+            raise ValueError("Write-ahead logs are not supported in a shared memory store, save the store instead")
+        self.log = MemoryLog(store_path, compact_every=compact_every, fsync=fsync)
+        return self.log.recover(self)
+
+    def close_log(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def consolidate(self, wait=False):
+        """
+        Brings the store back within the policy's capacity: the lowest-valued memories are evicted, or merged
+        into summary memories by a background thread. The summaries replace their memories at the next write
+        after they are ready (or before returning, with wait=True). Called automatically whenever an add takes
+        the store over the policy's high water mark.
+        """
+        self._collect_consolidation(wait)
+        if self.policy is None or self._consolidation is not None:
+            return
+        if not self.policy.merge:
+            self._evict(self.policy.select(self.index))
+            return
+        groups = self.policy.plan(self.index)
+        if groups:
+            self._consolidating = {memory_id for group in groups for memory_id in group[0]}
+            self._consolidation = _consolidation_executor.submit(self.policy.consolidate, groups, self.embedding_backend)
+            if wait:
+                self._collect_consolidation(wait)
+
+    def _enforce_capacity(self):
+        self._collect_consolidation()
+        if self.policy is None or not self.policy.over_capacity(self.index):
+            return
+        if self._consolidation is None:
+            self.consolidate()
+        else:
+            # The summarizer is behind: evict down to the high water mark, sparing the memories being merged
+            target = int(self.policy.capacity * self.policy.high_water)
+            self._evict(self.policy.select(self.index, target=target, merge=False, exclude=self._consolidating))
+
+    def _evict(self, rows):
+        # Ids are read before deleting, since deletes move rows
+        ids = self.index.columns()["ids"]
+        for memory_id in [int(ids[row]) for row in rows]:
+            self._commit({"op": "delete", "id": memory_id})
+
+    def _collect_consolidation(self, wait=False):
+        if self._consolidation is None or not (wait or self._consolidation.done()):
+            return
+        future = self._consolidation
+        self._consolidation = None
+        self._consolidating = set()
+        try:
+            summaries = future.result()
+        except Exception as e:
+            print(f"Memory consolidation failed, retrying later... Error: {e}")
+            return
+        for member_ids, record in summaries:
+            # Memories deleted since the plan was made are already gone
+            member_ids = [memory_id for memory_id in member_ids if memory_id in self.index]
+            if not member_ids:
+                continue
+            for memory_id in member_ids:
+                self._commit({"op": "delete", "id": memory_id})
+            if record is not None:
+                summary_id = self._add_record(
+                    record["text"],
+                    record["semantic_embedding"],
+                    record["emotion_embedding"],
+                    record["inner_thoughts"],
+                    record["type"],
+                    record["agent"],
+                    group=record["group"],
+                    check_capacity=False
+                )
+                self.index.set_stats(summary_id, **record["stats"])
+
+    def _add_record(self, text, semantic_embedding, emotion_embedding, inner_thoughts=None, memory_type=None, agent=None, scene=None, group=None, check_capacity=True):
+        memory_id = self.find(text, agent, scene)
+        if memory_id is None:
+            memory_id = self.index.next_id
+        self._commit({
+            "op": "add",
+            "id": memory_id,
+            "text": text,
             "semantic_embedding": semantic_embedding,
             "emotion_embedding": emotion_embedding,
             "inner_thoughts": inner_thoughts,
             "type": memory_type,
-            "agent": agent
-        }
+            "agent": agent,
+            "scene": scene,
+            "group": group
+        })
+        if check_capacity:
+            self._enforce_capacity()
+        return memory_id
 
-    def get_top_memories(self, query_embedding, query_emotion_embedding=None, top_k=5, alpha=0.7):
+    def _commit_many(self, records):
+        """
+        Logs and inserts a block of add records, assigning ids up front so the log matches the store.
+        """
+        next_id = self.index.next_id
+        assigned = {}
+        for record in records:
+            key = (record["text"], record["agent"], record["scene"])
+            memory_id = self.find(*key)
+            if memory_id is None:
+                memory_id = assigned.get(key)
+            if memory_id is None:
+                memory_id = next_id
+                next_id += 1
+            assigned[key] = memory_id
+            record["id"] = memory_id
+        if self.log is not None:
+            self.log.append_many(records)
+        ids = self.index.add_many(records, namespace=self.namespace)
+        self._enforce_capacity()
+        return ids
+
+    def _resolve_id(self, memory):
+        memory_id = self.index.latest_id(memory, self.namespace) if isinstance(memory, str) else memory
+        if memory_id is None or memory_id not in self.index or self.index.namespace_of(memory_id) != self.namespace:
+            raise KeyError(f"No memory: {memory}")
+        return memory_id
+
+    def _commit(self, record):
+        # Write-ahead: the record is on disk before the change is visible
+        if self.log is not None:
+            self.log.append(record)
+        self._apply_record(record)
+
+    def _apply_record(self, record):
+        memory_id = record.get("id")
+        if memory_id is None:
+            # Records written before memories had ids are keyed by text
+            memory_id = self.index.latest_id(record["text"], self.namespace)
+        if record["op"] == "add":
+            self.index.add(
+                record["text"],
+                record["semantic_embedding"],
+                record["emotion_embedding"],
+                inner_thoughts=record["inner_thoughts"],
+                memory_type=record["type"],
+                agent=record["agent"],
+                scene=record.get("scene"),
+                memory_id=memory_id,
+                group=record.get("group"),
+                namespace=self.namespace
+            )
+        elif memory_id in self.index:
+            if record["op"] == "update":
+                self.index.update(memory_id, **{key: value for key, value in record.items() if key in ("emotion_embedding", "inner_thoughts", "type", "group")})
+            elif record["op"] == "delete":
+                self.index.remove(memory_id)
+
+    def _replace_index(self, index):
+        if index.embedding_backend is None:
+            # Stores saved before backends were recorded
+            index.embedding_backend = self.embedding_backend.name
+        elif index.embedding_backend != self.embedding_backend.name:
+            raise ValueError(f"Memory store was embedded with {index.embedding_backend}, but this Memory uses {self.embedding_backend.name}")
+        if self.shared_store is not None:
+            self._replace_namespace(index)
+            return
+        if self.ann_index is not None and len(self.index) > 0:
+            # Rows may now hold different memories, so the approximate index reassigns all of them
+            self.ann_index.reset()
+        index.attach_ann(self.ann_index)
+        self.index = index
+
+    def _replace_namespace(self, index):
+        """
+        Replaces the records of this Memory's namespace of the shared store with copies of index's records.
+        """
+        for memory_id in self.index.ids_in(self.namespace):
+            self.index.remove(memory_id)
+        records = [index.record(row) for row in range(len(index))]
+        for record in records:
+            del record["id"]
+        stats = index.stats()
+        ids = self.index.add_many(records, namespace=self.namespace)
+        for row, memory_id in enumerate(ids):
+            self.index.set_stats(memory_id, intensity=stats["intensity"][row], retrievals=stats["retrievals"][row])
+
+    def get_top_memories(self, query_embedding, query_emotion_embedding=None, top_k=5, alpha=0.7, memory_type=None, agent=None, scene=None, group=None):
         """
         Retrieve top_k memories based on a weighted combination of semantic and emotion similarity.
         alpha: weight for semantic similarity (0 <= alpha <= 1)
         query_emotion_embedding: 8-dim Plutchik vector for the query (required for emotion similarity)
+        memory_type, agent, scene, group: optional filters (a value or a list of values); only the matching
+        memories are scored, using the index's secondary indexes.
         """
-        similarities = []
-        for text, data in self.memory_store.items():
-            semantic_embedding = data.get("semantic_embedding", None)
-            emotion_embedding = data.get("emotion_embedding", None)
-            inner_thoughts = data.get("inner_thoughts", None)
-            if semantic_embedding is not None and emotion_embedding is not None and query_emotion_embedding is not None:
-                # Semantic similarity (cosine)
-                semantic_sim = cosine_similarity(query_embedding, semantic_embedding)
-                # Emotion similarity (1 - cosine distance)
-                emotion_sim = 1 - cosine_similarity(query_emotion_embedding, emotion_embedding)
-                # Combine
-                final_score = alpha * semantic_sim + (1 - alpha) * emotion_sim
-                similarities.append((final_score, text, inner_thoughts))
-            elif semantic_embedding is not None:
-                # Fallback: only semantic similarity
-                semantic_sim = cosine_similarity(query_embedding, semantic_embedding)
-                similarities.append((semantic_sim, text, inner_thoughts))
-        # Sort by score descending
-        similarities.sort(reverse=True)
+        similarities = self.index.search(query_embedding, query_emotion_embedding, top_k=top_k, alpha=alpha, filters=self._filters(memory_type, agent, scene, group))
+        self.index.touch([memory_id for _, memory_id in similarities])
 
         # returns tuple of (memory, inner_thoughts)
-        return [(text, inner_thoughts) for _, text, inner_thoughts in similarities[:top_k]]
+        return [self._text_and_thoughts(memory_id) for _, memory_id in similarities]
+
+    async def get_top_memories_async(self, query_embedding, query_emotion_embedding=None, top_k=5, alpha=0.7, memory_type=None, agent=None, scene=None, group=None):
+        """
+        Async version of get_top_memories(). In a shared store, concurrent queries of all its namespaces are
+        gathered and served by one batched search (see SharedMemoryStore.get_top_memories_async).
+        """
+        if self.shared_store is None:
+            return self.get_top_memories(query_embedding, query_emotion_embedding, top_k=top_k, alpha=alpha, memory_type=memory_type, agent=agent, scene=scene, group=group)
+        return await self.shared_store.get_top_memories_async(self.namespace, query_embedding, query_emotion_embedding, top_k=top_k, alpha=alpha, memory_type=memory_type, agent=agent, scene=scene, group=group)
+
+    def get_top_memories_batch(self, query_embeddings, query_emotion_embeddings=None, top_k=5, alpha=0.7, memory_type=None, agent=None, scene=None, group=None):
+        """
+        Batched get_top_memories(): scores all queries with one matrix product per modality.
+        query_emotion_embeddings: one 8-dim Plutchik vector per query, or None for semantic-only retrieval
+        Returns one list of (memory, inner_thoughts) per query.
+        """
+        results = self.index.search_batch(query_embeddings, query_emotion_embeddings, top_k=top_k, alpha=alpha, filters=self._filters(memory_type, agent, scene, group))
+        self.index.touch([memory_id for similarities in results for _, memory_id in similarities])
+        return [[self._text_and_thoughts(memory_id) for _, memory_id in similarities] for similarities in results]
+
+    def get_top_memory_ids(self, query_embedding, query_emotion_embedding=None, top_k=5, alpha=0.7, memory_type=None, agent=None, scene=None, group=None):
+        """
+        Like get_top_memories(), but returns [(memory_id, score), ...].
+        """
+        similarities = self.index.search(query_embedding, query_emotion_embedding, top_k=top_k, alpha=alpha, filters=self._filters(memory_type, agent, scene, group))
+        self.index.touch([memory_id for _, memory_id in similarities])
+        return [(memory_id, score) for score, memory_id in similarities]
+
+    def _filters(self, memory_type, agent, scene, group):
+        filters = {"type": memory_type, "agent": agent, "scene": scene, "group": group, "namespace": self.namespace}
+        return {column: value for column, value in filters.items() if value is not None}
+
+    def _text_and_thoughts(self, memory_id):
+        row = self.index.id_rows[memory_id]
+        return self.index.texts[row], self.index.inner_thoughts[row]
 
-    def get_top_memories_from_text(self, query_text, query_emotion_embedding=None, top_k=5, alpha=0.7):
+    def get_top_memories_from_text(self, query_text, query_emotion_embedding=None, top_k=5, alpha=0.7, memory_type=None, agent=None, scene=None, group=None):
         """
         Given a query string, compute its embedding and return the top_k most similar memories,
         using the new get_top_memories method which supports emotion similarity.
         """
-        query_embedding = llm_utils.get_text_embedding(query_text)
+        query_embedding = llm_utils.get_text_embedding(query_text, backend=self.embedding_backend)
         return self.get_top_memories(
             query_embedding,
             query_emotion_embedding=query_emotion_embedding,
             top_k=top_k,
-            alpha=alpha
+            alpha=alpha,
+            memory_type=memory_type,
+            agent=agent,
+            scene=scene,
+            group=group
         )
 
     
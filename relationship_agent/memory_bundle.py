@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+from relationship_agent.columnar_store import is_columnar_store, read_store_metadata, save_columnar_store
+
+BUNDLE_VERSION = 1
+
+
+def read_corpus(corpus_path, group_size=None, group_names=None):
+    """
+    Yields (text, group) for the memories of a corpus file without loading more than it has to:
+        .json   a list of strings (like ryan_memories_grouped.json), or an object mapping group names to lists
+        .jsonl  one string, or one object with a "text" and optional "group" field, per line
+        other   one memory per non-empty line
+
+    Memories without a group are labeled by position when group_size is given: corpora like
+    ryan_memories_grouped.json list their groups as consecutive blocks of group_size memories. Block i is named
+    group_names[i] if given, else "group-<i>".
+    """
+    def entries():
+        if corpus_path.endswith(".json"):
+            with open(corpus_path, "r", encoding="utf-8") as f:
+                corpus = json.load(f)
+            if isinstance(corpus, dict):
+                for group, texts in corpus.items():
+                    for text in texts:
+                        yield text, group
+            else:
+                for text in corpus:
+                    yield text, None
+            return
+        with open(corpus_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if corpus_path.endswith(".jsonl"):
+                    entry = json.loads(line)
+                    if isinstance(entry, dict):
+                        yield entry["text"], entry.get("group")
+                    else:
+                        yield entry, None
+                else:
+                    yield line, None
+
+    for position, (text, group) in enumerate(entries()):
+        if group is None and group_size:
+            block = position // group_size
+            group = group_names[block] if group_names and block < len(group_names) else f"group-{block}"
+        yield text, group
+
+
+def corpus_digest(corpus_path):
+    sha256 = hashlib.sha256()
+    with open(corpus_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def save_memory_bundle(memory, bundle_path, agent_name=None, source=None, embedding_model=None, appraisal_model=None, dtype="float32"):
+    """
+    Saves an appraised and embedded Memory as a memory bundle: a columnar store (see columnar_store.py) whose
+    metadata also records the bundle version, the persona it belongs to and the corpus it was built from.
+
+    Args:
+        memory (Memory): The memories to save.
+        bundle_path (str): Bundle directory.
+        agent_name (str): Persona the memories belong to.
+        source (str): Corpus file the bundle was built from; its SHA-256 is recorded to detect stale bundles.
+        embedding_model (str): Model of the semantic embeddings; defaults to the embedding backend the memory
+            store records (which the columnar store metadata also keeps, and which load_memory_bundle() checks).
+        appraisal_model (str): Model that scored the emotions.
+        dtype (str): "float32" (memory-mapped on load), "float16" or "int8" (memory-mapped by agents storing
+            their embeddings as int8).
+    """
+    bundle = {
+        "version": BUNDLE_VERSION,
+        "agent": agent_name,
+        "source": None if source is None else os.path.basename(source),
+        "source_sha256": None if source is None else corpus_digest(source),
+        "embedding_model": embedding_model or memory.index.embedding_backend,
+        "appraisal_model": appraisal_model
+    }
+    save_columnar_store(bundle_path, memory.own_index(), dtype=dtype, extra={"bundle": bundle})
+
+
+def read_bundle_manifest(bundle_path):
+    """
+    Returns the bundle fields of a memory bundle's metadata. Raises ValueError if the path is not a memory
+    bundle of a supported version.
+    """
+    if not is_columnar_store(bundle_path):
+        raise ValueError(f"Not a memory bundle: {bundle_path}")
+    bundle = read_store_metadata(bundle_path).get("bundle")
+    if bundle is None:
+        raise ValueError(f"Memory store has no bundle metadata: {bundle_path}")
+    if bundle.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"Unsupported memory bundle version {bundle.get('version')} in {bundle_path}")
+    return bundle
+
+
+def load_memory_bundle(memory, bundle_path, mmap=True):
+    """
+    Loads a memory bundle into a Memory. float32 bundles are memory-mapped, so loading costs milliseconds
+    regardless of the number of memories (a Memory in a shared store copies them into its namespace instead).
+    Returns the bundle manifest. Raises ValueError if the bundle was
+    embedded with another embedding backend than the Memory's.
+    """
+    bundle = read_bundle_manifest(bundle_path)
+    memory.load_memory_store(bundle_path, mmap=mmap)
+    return bundle
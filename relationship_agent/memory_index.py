@@ -0,0 +1,838 @@
+import numpy as np
+from relationship_agent.quantization import QuantizedMatrix, quantize_matrix, matrix_scores
+
+
+def normalize_rows(matrix):
+    """
+    Scales each row to unit length. Zero rows stay zero, matching cosine_similarity() returning 0 for them.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / (norms + 1e-8)
+
+
+def top_k_indices(scores, top_k):
+    """
+    Returns the indices of the top_k highest scores in each row of scores, best first.
+    Uses argpartition so only the top_k candidates are sorted.
+    """
+    num_rows = scores.shape[1]
+    if top_k >= num_rows:
+        candidates = np.tile(np.arange(num_rows), (scores.shape[0], 1))
+    else:
+        candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class StringTable():
+    def __init__(self, strings=()) -> None:
+        """
+        Interns repeated strings (memory types, agent names, scenes, groups) as small integer codes. Code -1 is None.
+        """
+        self.strings = []
+        self.codes = {}
+        for string in strings:
+            self.intern(string)
+
+    def intern(self, string):
+        if string is None:
+            return -1
+        code = self.codes.get(string)
+        if code is None:
+            code = len(self.strings)
+            self.codes[string] = code
+            self.strings.append(string)
+        return code
+
+    def lookup(self, code):
+        return None if code < 0 else self.strings[code]
+
+
+class MemoryIndex():
+    # Interned string columns, stored as int32 codes. namespace partitions a store shared by several agents
+    # (see shared_memory_store.py); it is None in an agent's own store.
+    STRING_COLUMNS = ("type", "agent", "scene", "group", "namespace")
+    # Usage statistics kept for capacity policies (see memory_policy.py), always held in memory:
+    # intensity is the norm of the emotion embedding before normalization, last_used the next_id at the
+    # time the memory was added or last retrieved, retrievals the number of times it was retrieved
+    STAT_COLUMNS = {"intensity": np.float32, "last_used": np.int64, "retrievals": np.int32}
+    # Filters matching more than this share of the rows scan all rows and mask the rest
+    FILTER_SCAN_FRACTION = 0.25
+    # Rows gathered at a time when scoring queries of several namespaces, see search_namespaces()
+    NAMESPACE_BLOCK_ROWS = 2048
+
+    def __init__(self, capacity=1024, ann=None, semantic_dtype="float32", rerank_factor=4) -> None:
+        """
+        Columnar memory records plus a top-k index over them.
+
+        Each memory is a row with a stable integer id. Columns are struct-of-arrays: text and inner thoughts
+        as lists, type/agent/scene/group as interned int32 codes, and the semantic and emotion embeddings as
+        pre-normalized, contiguous float32 matrices, so scoring every memory is one matrix-vector product per
+        modality instead of a Python loop. Rows are appended in place; the columns grow by doubling.
+
+        A memory is identified by (text, agent, scene, namespace): adding the same text for another agent or
+        scene creates a separate record, adding it again for the same ones overwrites the record.
+
+        The string columns have secondary indexes (rows per code), so searches filtered on type, agent, scene,
+        group or namespace only score the matching rows.
+
+        With an approximate index (e.g. IVFIndex) attached, only the candidate rows it returns are scored.
+
+        The semantic embeddings can be stored in reduced precision (semantic_dtype "float16" or "int8", see
+        QuantizedMatrix), at 2x or 4x less memory than float32. If the full-precision rows are retained (the
+        float32 store this index was loaded from stays memory-mapped), the top_k * rerank_factor best candidates
+        are rescored against them before the top_k are picked.
+        The memory savings cost query latency, since every scored row is dequantized: int8 scoring is slightly
+        slower than float32, float16 scoring several times slower.
+
+        Args:
+            capacity (int): Initial number of rows allocated.
+            ann (IVFIndex): Optional approximate nearest neighbor index over the semantic embeddings.
+            semantic_dtype (str): "float32", "float16" or "int8" storage of the semantic embeddings.
+            rerank_factor (int): Candidates rescored at full precision per result, when retained.
+        """
+        self.capacity = capacity
+        self.ann = ann
+        self.semantic_dtype = semantic_dtype
+        self.rerank_factor = rerank_factor
+        self.next_id = 0
+        # Name of the embedding backend (utils.llm_utils.EmbeddingBackend) of the semantic embeddings, None if unknown
+        self.embedding_backend = None
+        self.texts = []
+        self.inner_thoughts = []
+        self.strings = StringTable()
+        self.id_rows = {}  # key: memory id, value: row
+        self.key_rows = {}  # key: (text, agent, scene, namespace), value: row
+        self.text_ids = {}  # key: text, value: ids of the records with that text, oldest first
+        # Secondary indexes: key: column, value: {code: set of rows}, plus sorted row arrays built on demand
+        self._postings = {column: {} for column in self.STRING_COLUMNS}
+        self._posting_arrays = {column: {} for column in self.STRING_COLUMNS}
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._codes = {column: np.full(capacity, -1, dtype=np.int32) for column in self.STRING_COLUMNS}
+        self._semantic = None
+        self._emotion = None
+        # Full-precision semantic rows retained for reranking a quantized _semantic, and the row of each memory
+        # in them (-1 for memories added or re-embedded since)
+        self._semantic_full = None
+        self._full_rows = None
+        self._has_semantic = np.zeros(capacity, dtype=bool)
+        self._has_emotion = np.zeros(capacity, dtype=bool)
+        self._stats = {column: np.zeros(capacity, dtype=dtype) for column, dtype in self.STAT_COLUMNS.items()}
+
+    @classmethod
+    def from_memory_store(cls, memory_store, ann=None, semantic_dtype="float32"):
+        """
+        Builds an index from a text-keyed memory store dict (the JSON format), see attach_ann() for how ann is reused.
+        """
+        # Headroom so the first inserts after loading do not immediately double the matrices
+        index = cls(capacity=max(len(memory_store) + len(memory_store) // 4, 1024), semantic_dtype=semantic_dtype)
+        for text, data in memory_store.items():
+            index.add(
+                text,
+                data.get("semantic_embedding"),
+                data.get("emotion_embedding"),
+                inner_thoughts=data.get("inner_thoughts"),
+                memory_type=data.get("type"),
+                agent=data.get("agent"),
+                scene=data.get("scene"),
+                group=data.get("group")
+            )
+        index.attach_ann(ann)
+        return index
+
+    @classmethod
+    def from_columns(cls, ids, texts, inner_thoughts, strings, codes, semantic, emotion, has_semantic, has_emotion, stats=None, ann=None, semantic_dtype="float32", semantic_full=None):
+        """
+        Wraps existing columns (e.g. read-only memmaps of a saved store) without copying them.
+        The matrices must already be unit-length rows. They are copied into memory on the first write.
+        Missing stats columns start at zero retrievals, intensity 0 and last_used as if just added.
+        semantic (a float32 matrix or a QuantizedMatrix) is converted to semantic_dtype if stored otherwise;
+        semantic_full optionally retains its full-precision rows for reranking.
+        """
+        index = cls(capacity=len(texts), ann=ann, semantic_dtype=semantic_dtype)
+        index.texts = list(texts)
+        index.inner_thoughts = list(inner_thoughts)
+        index.strings = StringTable(strings)
+        index._ids = ids
+        index._codes = codes
+        index._semantic = None if semantic is None else quantize_matrix(semantic, semantic_dtype)
+        if semantic_full is not None and isinstance(index._semantic, QuantizedMatrix):
+            index._semantic_full = semantic_full
+            index._full_rows = np.arange(len(texts), dtype=np.int64)
+        index._emotion = emotion
+        index._has_semantic = has_semantic
+        index._has_emotion = has_emotion
+        stats = stats or {}
+        for column, dtype in cls.STAT_COLUMNS.items():
+            if stats.get(column) is not None:
+                index._stats[column] = np.array(stats[column], dtype=dtype)
+            elif column == "last_used":
+                index._stats[column] = np.array(ids, dtype=dtype) + 1
+        for row, memory_id in enumerate(ids.tolist()):
+            index._link(row, memory_id, index_codes=False)
+        index._build_postings()
+        for text_ids in index.text_ids.values():
+            text_ids.sort()
+        index.next_id = int(ids.max()) + 1 if len(ids) else 0
+        index.attach_ann(ann)
+        return index
+
+    def attach_ann(self, ann):
+        """
+        Attaches an approximate index. One whose assignments cover exactly these rows (e.g. one saved alongside
+        this store) is reused as is; rows it has not seen are assigned before the next search.
+        """
+        if ann is not None and len(ann.assignments) > len(self):
+            ann.reset()
+        self.ann = ann
+
+    def columns(self):
+        """
+        Returns the columns of the stored rows: ids, string codes per column, semantic and emotion matrices
+        (None until the first embedding) and their row masks.
+        """
+        size = len(self.texts)
+        return {
+            "ids": self._ids[:size],
+            "codes": {column: codes[:size] for column, codes in self._codes.items()},
+            "semantic": None if self._semantic is None else self._semantic[:size],
+            "emotion": None if self._emotion is None else self._emotion[:size],
+            "has_semantic": self._has_semantic[:size],
+            "has_emotion": self._has_emotion[:size],
+            "stats": {column: values[:size] for column, values in self._stats.items()}
+        }
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __contains__(self, memory_id):
+        return memory_id in self.id_rows
+
+    def ids(self):
+        return self._ids[:len(self.texts)].tolist()
+
+    def latest_id(self, text, namespace=None):
+        """
+        Returns the id of the most recently added memory with this text in namespace, or None.
+        """
+        ids = self.text_ids_in(text, namespace)
+        return ids[-1] if ids else None
+
+    def text_ids_in(self, text, namespace=None):
+        """
+        Returns the ids of the memories with this text in namespace, oldest first.
+        """
+        code = -1 if namespace is None else self.strings.codes.get(namespace, -2)
+        return [memory_id for memory_id in self.text_ids.get(text, []) if self._codes["namespace"][self.id_rows[memory_id]] == code]
+
+    def count(self, namespace=None):
+        """
+        Returns the number of memories in namespace.
+        """
+        code = -1 if namespace is None else self.strings.codes.get(namespace)
+        return 0 if code is None else len(self._postings["namespace"].get(code, ()))
+
+    def ids_in(self, namespace=None):
+        """
+        Returns the ids of the memories in namespace.
+        """
+        code = -1 if namespace is None else self.strings.codes.get(namespace)
+        return [] if code is None else self._ids[self._posting_array("namespace", code)].tolist()
+
+    def find(self, text, agent=None, scene=None, namespace=None):
+        """
+        Returns the id of the memory with this (text, agent, scene, namespace), or None.
+        """
+        row = self.key_rows.get((text, agent, scene, namespace))
+        return None if row is None else int(self._ids[row])
+
+    def add(self, text, semantic_embedding, emotion_embedding=None, inner_thoughts=None, memory_type=None, agent=None, scene=None, memory_id=None, group=None, namespace=None):
+        """
+        Adds a memory and returns its id. A memory with the same (text, agent, scene, namespace) is overwritten
+        in place and keeps its id. memory_id is only given when replaying a log.
+        """
+        self._ensure_writable()
+        key = (text, agent, scene, namespace)
+        row = self.key_rows.get(key)
+        if row is None:
+            row = len(self.texts)
+            self._ensure_capacity(row + 1)
+            if memory_id is None:
+                memory_id = self.next_id
+            self.next_id = max(self.next_id, memory_id + 1)
+            self.texts.append(text)
+            self.inner_thoughts.append(inner_thoughts)
+            self._ids[row] = memory_id
+            self._codes["type"][row] = self.strings.intern(memory_type)
+            self._codes["agent"][row] = self.strings.intern(agent)
+            self._codes["scene"][row] = self.strings.intern(scene)
+            self._codes["group"][row] = self.strings.intern(group)
+            self._codes["namespace"][row] = self.strings.intern(namespace)
+            self._link(row, memory_id)
+            self._stats["retrievals"][row] = 0
+        else:
+            self.inner_thoughts[row] = inner_thoughts
+            self._set_code(row, "type", memory_type)
+            self._set_code(row, "group", group)
+        self._stats["intensity"][row] = 0 if emotion_embedding is None else np.linalg.norm(emotion_embedding)
+        self._stats["last_used"][row] = self.next_id
+
+        self._semantic = self._set_row(self._semantic, self._has_semantic, row, semantic_embedding, dtype=self.semantic_dtype)
+        self._emotion = self._set_row(self._emotion, self._has_emotion, row, emotion_embedding)
+        if self._full_rows is not None:
+            self._full_rows[row] = -1
+        if self.ann is not None:
+            self.ann.mark(row)
+        return int(self._ids[row])
+
+    def add_many(self, records, namespace=None):
+        """
+        Adds a block of memories at once. records are dicts with text, semantic_embedding, emotion_embedding,
+        inner_thoughts, type, agent, scene and optionally group, namespace and id; namespace applies to records
+        without one. New memories are written as one contiguous block of rows with one normalization per modality;
+        memories that already exist are overwritten one by one. Returns the ids in order.
+        """
+        self._ensure_writable()
+        ids = [None] * len(records)
+        new_positions = []
+        batch_keys = set()
+        for position, record in enumerate(records):
+            key = (record["text"], record.get("agent"), record.get("scene"), record.get("namespace", namespace))
+            if key in self.key_rows or key in batch_keys:
+                continue
+            batch_keys.add(key)
+            new_positions.append(position)
+
+        start = len(self.texts)
+        self._ensure_capacity(start + len(new_positions))
+        for offset, position in enumerate(new_positions):
+            record = records[position]
+            row = start + offset
+            memory_id = record.get("id")
+            if memory_id is None:
+                memory_id = self.next_id
+            self.next_id = max(self.next_id, memory_id + 1)
+            self.texts.append(record["text"])
+            self.inner_thoughts.append(record.get("inner_thoughts"))
+            self._ids[row] = memory_id
+            self._codes["type"][row] = self.strings.intern(record.get("type"))
+            self._codes["agent"][row] = self.strings.intern(record.get("agent"))
+            self._codes["scene"][row] = self.strings.intern(record.get("scene"))
+            self._codes["group"][row] = self.strings.intern(record.get("group"))
+            self._codes["namespace"][row] = self.strings.intern(record.get("namespace", namespace))
+            self._link(row, memory_id)
+            self._stats["retrievals"][row] = 0
+            self._stats["last_used"][row] = self.next_id
+            emotion_embedding = record.get("emotion_embedding")
+            self._stats["intensity"][row] = 0 if emotion_embedding is None else np.linalg.norm(emotion_embedding)
+            ids[position] = memory_id
+
+        if self._full_rows is not None:
+            self._full_rows[start:len(self.texts)] = -1
+        for key, attribute, mask, dtype in (("semantic_embedding", "_semantic", self._has_semantic, self.semantic_dtype), ("emotion_embedding", "_emotion", self._has_emotion, "float32")):
+            block = [(start + offset, records[position][key]) for offset, position in enumerate(new_positions) if records[position].get(key) is not None]
+            if not block:
+                continue
+            rows = np.array([row for row, _ in block])
+            vectors = normalize_rows([embedding for _, embedding in block])
+            matrix = getattr(self, attribute)
+            if matrix is None:
+                matrix = self._empty_matrix(vectors.shape[1], dtype)
+            matrix[rows] = vectors
+            mask[rows] = True
+            setattr(self, attribute, matrix)
+
+        if self.ann is not None:
+            for row in range(start, len(self.texts)):
+                self.ann.mark(row)
+
+        # Existing memories (and repeats within the block) are overwritten in order, like add()
+        for position, record in enumerate(records):
+            if ids[position] is None:
+                ids[position] = self.add(
+                    record["text"],
+                    record.get("semantic_embedding"),
+                    record.get("emotion_embedding"),
+                    inner_thoughts=record.get("inner_thoughts"),
+                    memory_type=record.get("type"),
+                    agent=record.get("agent"),
+                    scene=record.get("scene"),
+                    group=record.get("group"),
+                    namespace=record.get("namespace", namespace)
+                )
+        return ids
+
+    def semantic_embedding_for_text(self, text):
+        """
+        Returns the stored (unit-length) semantic embedding of any memory with this text, or None.
+        """
+        for memory_id in reversed(self.text_ids.get(text, [])):
+            row = self.id_rows[memory_id]
+            if self._has_semantic[row]:
+                return self._semantic[row]
+        return None
+
+    def update(self, memory_id, **fields):
+        """
+        Updates inner_thoughts, type, group and/or emotion_embedding of a memory in place.
+        """
+        row = self.id_rows[memory_id]
+        self._ensure_writable()
+        if "inner_thoughts" in fields:
+            self.inner_thoughts[row] = fields["inner_thoughts"]
+        if "type" in fields:
+            self._set_code(row, "type", fields["type"])
+        if "group" in fields:
+            self._set_code(row, "group", fields["group"])
+            if self.ann is not None:
+                self.ann.mark(row)
+        if "emotion_embedding" in fields:
+            self._emotion = self._set_row(self._emotion, self._has_emotion, row, fields["emotion_embedding"])
+            self._stats["intensity"][row] = 0 if fields["emotion_embedding"] is None else np.linalg.norm(fields["emotion_embedding"])
+
+    def touch(self, memory_ids):
+        """
+        Records a retrieval of the given memories for their recency and retrieval counts. Only the in-memory
+        stats columns are written, so retrieval never copies a memory-mapped store.
+        """
+        rows = [self.id_rows[memory_id] for memory_id in memory_ids if memory_id in self.id_rows]
+        if not rows:
+            return
+        rows = np.array(rows)
+        self._stats["last_used"][rows] = self.next_id
+        np.add.at(self._stats["retrievals"], rows, 1)
+
+    def set_stats(self, memory_id, **stats):
+        """
+        Overwrites stats of a memory, e.g. to carry the usage of merged memories over to their summary.
+        """
+        row = self.id_rows[memory_id]
+        for column, value in stats.items():
+            self._stats[column][row] = value
+
+    def stats(self):
+        """
+        Returns the stats columns (intensity, last_used, retrievals) of the stored rows, indexed by row.
+        """
+        size = len(self.texts)
+        return {column: values[:size] for column, values in self._stats.items()}
+
+    def remove(self, memory_id):
+        """
+        Removes a memory by moving the last row into its place, so removal is O(1).
+        """
+        row = self.id_rows.get(memory_id)
+        if row is None:
+            return
+        self._ensure_writable()
+        self._unlink(row)
+        last = len(self.texts) - 1
+        if row != last:
+            self._unlink(last)
+            self.texts[row] = self.texts[last]
+            self.inner_thoughts[row] = self.inner_thoughts[last]
+            self._ids[row] = self._ids[last]
+            for codes in self._codes.values():
+                codes[row] = codes[last]
+            for values in self._stats.values():
+                values[row] = values[last]
+            for matrix in (self._semantic, self._emotion):
+                if matrix is not None:
+                    matrix[row] = matrix[last]
+            if self._full_rows is not None:
+                self._full_rows[row] = self._full_rows[last]
+            self._has_semantic[row] = self._has_semantic[last]
+            self._has_emotion[row] = self._has_emotion[last]
+            self._link(row, int(self._ids[row]), keep_order=True)
+        self.texts.pop()
+        self.inner_thoughts.pop()
+        self._has_semantic[last] = False
+        self._has_emotion[last] = False
+        if self._full_rows is not None:
+            self._full_rows[last] = -1
+        if self.ann is not None:
+            self.ann.swap_remove(row, last)
+
+    def get(self, memory_id):
+        """
+        Returns the record of a memory as a dict. Embeddings are the stored unit-length rows.
+        """
+        return self.record(self.id_rows[memory_id])
+
+    def record(self, row):
+        return {
+            "id": int(self._ids[row]),
+            "text": self.texts[row],
+            "semantic_embedding": self._semantic[row] if self._has_semantic[row] else None,
+            "emotion_embedding": self._emotion[row] if self._has_emotion[row] else None,
+            "inner_thoughts": self.inner_thoughts[row],
+            "type": self.strings.lookup(self._codes["type"][row]),
+            "agent": self.strings.lookup(self._codes["agent"][row]),
+            "scene": self.strings.lookup(self._codes["scene"][row]),
+            "group": self.strings.lookup(self._codes["group"][row])
+        }
+
+    def values(self, column):
+        """
+        Returns the distinct values (other than None) of a string column in the stored rows.
+        """
+        return [self.strings.lookup(code) for code, rows in self._postings[column].items() if code >= 0 and rows]
+
+    def namespace_of(self, memory_id):
+        return self.strings.lookup(self._codes["namespace"][self.id_rows[memory_id]])
+
+    def subset(self, rows):
+        """
+        Returns a new index holding copies of the given rows, e.g. one namespace of a shared store, with the
+        namespace column cleared so it saves and loads like an agent's own store. Memory ids are kept.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            index = MemoryIndex(semantic_dtype=self.semantic_dtype)
+        else:
+            codes = {column: np.array(codes[rows]) for column, codes in self._codes.items()}
+            codes["namespace"][:] = -1
+            index = MemoryIndex.from_columns(
+                self._ids[rows],
+                [self.texts[row] for row in rows],
+                [self.inner_thoughts[row] for row in rows],
+                self.strings.strings,
+                codes,
+                None if self._semantic is None else self._semantic.take(rows) if isinstance(self._semantic, QuantizedMatrix) else self._semantic[rows],
+                None if self._emotion is None else self._emotion[rows],
+                self._has_semantic[rows],
+                self._has_emotion[rows],
+                stats={column: values[rows] for column, values in self._stats.items()},
+                semantic_dtype=self.semantic_dtype
+            )
+        index.next_id = max(index.next_id, self.next_id)
+        index.embedding_backend = self.embedding_backend
+        return index
+
+    def filter_rows(self, filters):
+        """
+        Returns the sorted rows matching every filter, from the secondary indexes.
+
+        Args:
+            filters (dict): key: column (type, agent, scene, group or namespace), value: a value or a list of accepted values.
+        """
+        matching = None
+        for column, values in filters.items():
+            if column not in self._postings:
+                raise ValueError(f"Cannot filter memories on {column}, expected one of {self.STRING_COLUMNS}")
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            codes = [-1 if value is None else self.strings.codes.get(value) for value in values]
+            arrays = [self._posting_array(column, code) for code in codes if code is not None]
+            rows = np.concatenate(arrays) if arrays else np.array([], dtype=np.int64)
+            if len(arrays) > 1:
+                rows = np.unique(rows)
+            matching = rows if matching is None else np.intersect1d(matching, rows, assume_unique=True)
+            if len(matching) == 0:
+                break
+        return matching
+
+    def search(self, query_embedding, query_emotion_embedding=None, top_k=5, alpha=0.7, filters=None):
+        """
+        Returns [(score, memory_id), ...] for the top_k memories, best first.
+        """
+        query_emotion_embeddings = None if query_emotion_embedding is None else [query_emotion_embedding]
+        return self.search_batch([query_embedding], query_emotion_embeddings, top_k=top_k, alpha=alpha, filters=filters)[0]
+
+    def search_batch(self, query_embeddings, query_emotion_embeddings=None, top_k=5, alpha=0.7, filters=None):
+        """
+        Scores several queries at once with one matrix product per modality.
+
+        Memories with both embeddings score alpha * semantic_sim + (1 - alpha) * (1 - emotion_cosine) when an
+        emotion query is given; otherwise, and for memories without an emotion embedding, the score is the
+        semantic similarity alone. Memories without a semantic embedding are never returned.
+
+        Args:
+            query_embeddings (list): One semantic embedding per query.
+            query_emotion_embeddings (list): Optional 8-dim Plutchik vector per query.
+            filters (dict): Optional metadata filters, see filter_rows(). Only the matching rows are scored
+                (exactly, without the approximate index).
+
+        Returns:
+            list: One [(score, memory_id), ...] list per query.
+        """
+        num_queries = len(query_embeddings)
+        size = len(self.texts)
+        if size == 0 or self._semantic is None or top_k <= 0:
+            return [[] for _ in range(num_queries)]
+
+        query_vectors = normalize_rows(query_embeddings)
+        query_emotions = None
+        if query_emotion_embeddings is not None and self._emotion is not None:
+            query_emotions = normalize_rows(query_emotion_embeddings)
+
+        if filters:
+            rows = self.filter_rows(filters)
+            if len(rows) == 0:
+                return [[] for _ in range(num_queries)]
+            if len(rows) > size * self.FILTER_SCAN_FRACTION:
+                # Gathering most of the matrix costs more than scoring all of it contiguously and masking
+                mask = np.zeros(size, dtype=bool)
+                mask[rows] = True
+                scores = np.where(mask, self._score(query_vectors, query_emotions, None, alpha), -np.inf)
+                top = self._top(scores, min(top_k, size), None, query_vectors, query_emotions, alpha)
+                return [self._collect(scores[query_idx], top[query_idx], None) for query_idx in range(num_queries)]
+            scores = self._score(query_vectors, query_emotions, rows, alpha)
+            top = self._top(scores, min(top_k, len(rows)), rows, query_vectors, query_emotions, alpha)
+            return [self._collect(scores[query_idx], top[query_idx], rows) for query_idx in range(num_queries)]
+
+        if self.ann is not None:
+            self.ann.sync(self._semantic[:size], groups=self._codes["group"][:size])
+            if self.ann.is_trained:
+                results = []
+                for query_idx, rows in enumerate(self.ann.candidates(query_vectors)):
+                    query_emotion = None if query_emotions is None else query_emotions[query_idx:query_idx + 1]
+                    scores = self._score(query_vectors[query_idx:query_idx + 1], query_emotion, rows, alpha)
+                    top = self._top(scores, min(top_k, len(rows)), rows, query_vectors[query_idx:query_idx + 1], query_emotion, alpha)[0] if len(rows) else []
+                    results.append(self._collect(scores[0], top, rows))
+                return results
+
+        scores = self._score(query_vectors, query_emotions, None, alpha)
+        top = self._top(scores, min(top_k, size), None, query_vectors, query_emotions, alpha)
+        return [self._collect(scores[query_idx], top[query_idx], None) for query_idx in range(num_queries)]
+
+    def search_namespaces(self, namespaces, query_embeddings, query_emotion_embeddings=None, top_k=5, alpha=0.7, filters=None):
+        """
+        Scores a batch of queries from different namespaces, each against the rows of its own namespace only,
+        in one vectorized pass: the rows of the namespaces are gathered and scored against their namespace's
+        query with batched matrix products, so the work is proportional to the rows searched rather than
+        queries x rows, with no per-query Python overhead.
+
+        Args:
+            namespaces (list): The namespace of each query.
+            query_embeddings, query_emotion_embeddings, top_k, alpha: As in search_batch().
+            filters (dict): Optional metadata filters applied within every namespace, see filter_rows().
+
+        Returns:
+            list: One [(score, memory_id), ...] list per query.
+        """
+        num_queries = len(query_embeddings)
+        if len(self.texts) == 0 or self._semantic is None or top_k <= 0:
+            return [[] for _ in range(num_queries)]
+        query_vectors = normalize_rows(query_embeddings)
+        query_emotions = None
+        if query_emotion_embeddings is not None and self._emotion is not None:
+            query_emotions = normalize_rows(query_emotion_embeddings)
+
+        segment_rows = {}
+        for namespace in dict.fromkeys(namespaces):
+            segment_rows[namespace] = self.filter_rows(dict(filters or {}, namespace=namespace))
+        query_rows = [segment_rows[namespace] for namespace in namespaces]
+        lengths = np.array([len(rows) for rows in query_rows])
+        if lengths.sum() == 0:
+            return [[] for _ in range(num_queries)]
+
+        # One row of scores per query, padded with -inf to the longest namespace. Queries are scored in blocks
+        # of about NAMESPACE_BLOCK_ROWS gathered rows, so each block's gathered embeddings stay in cache.
+        scores = np.full((num_queries, lengths.max()), -np.inf, dtype=np.float32)
+        start = 0
+        while start < num_queries:
+            stop, block_size = start + 1, lengths[start]
+            while stop < num_queries and block_size + lengths[stop] <= self.NAMESPACE_BLOCK_ROWS:
+                block_size += lengths[stop]
+                stop += 1
+            block_lengths = lengths[start:stop]
+            width = block_lengths.max()
+            if width > 0:
+                # Padding positions point at row 0 and are masked out below
+                valid = np.arange(width) < block_lengths[:, None]
+                rows = np.zeros((stop - start, width), dtype=np.int64)
+                rows[valid] = np.concatenate(query_rows[start:stop])
+                block_scores = np.matmul(self._semantic[rows], query_vectors[start:stop, :, None])[..., 0]
+                if query_emotions is not None:
+                    emotion_sim = 1 - np.matmul(self._emotion[rows], query_emotions[start:stop, :, None])[..., 0]
+                    block_scores = np.where(self._has_emotion[rows], alpha * block_scores + (1 - alpha) * emotion_sim, block_scores)
+                scores[start:stop, :width] = np.where(valid & self._has_semantic[rows], block_scores, -np.inf)
+            start = stop
+        top = self._top(scores, min(top_k, scores.shape[1]), query_rows, query_vectors, query_emotions, alpha)
+        return [self._collect(scores[query_idx], top[query_idx], query_rows[query_idx]) for query_idx in range(num_queries)]
+
+    def _score(self, query_vectors, query_emotions, rows, alpha, semantic=None):
+        """
+        Scores the given rows (all rows if None) for each query; rows without a semantic embedding score -inf.
+        semantic optionally gives the semantic embeddings of the rows to score with (e.g. full-precision ones).
+        """
+        if rows is None:
+            rows = slice(0, len(self.texts))
+        if semantic is None:
+            semantic = self._semantic[rows]
+        emotion = None if self._emotion is None else self._emotion[rows]
+        has_semantic, has_emotion = self._has_semantic[rows], self._has_emotion[rows]
+
+        scores = matrix_scores(query_vectors, semantic)
+        if query_emotions is not None:
+            emotion_sim = 1 - query_emotions @ emotion.T
+            combined = alpha * scores + (1 - alpha) * emotion_sim
+            scores = np.where(has_emotion, combined, scores)
+        return np.where(has_semantic, scores, -np.inf)
+
+    def _top(self, scores, top_k, rows, query_vectors, query_emotions, alpha):
+        """
+        Returns the top_k positions of each row of scores, like top_k_indices(). With a quantized semantic matrix
+        and retained full-precision rows, the top_k * rerank_factor candidates are rescored first (in scores).
+        rows maps positions to rows: None (positions are rows), an array, or one array per query.
+        """
+        if self._full_rows is None:
+            return top_k_indices(scores, top_k)
+        candidates = top_k_indices(scores, min(top_k * self.rerank_factor, scores.shape[1]))
+        for query_idx, positions in enumerate(candidates):
+            # Candidates masked out by a filter (or padding, see search_namespaces()) stay at -inf
+            positions = positions[np.isfinite(scores[query_idx, positions])]
+            query_rows = rows[query_idx] if isinstance(rows, list) else rows
+            candidate_rows = positions if query_rows is None else query_rows[positions]
+            full_rows = self._full_rows[candidate_rows]
+            retained = full_rows >= 0
+            if not retained.any():
+                continue
+            query_emotion = None if query_emotions is None else query_emotions[query_idx:query_idx + 1]
+            scores[query_idx, positions[retained]] = self._score(
+                query_vectors[query_idx:query_idx + 1],
+                query_emotion,
+                candidate_rows[retained],
+                alpha,
+                semantic=self._semantic_full[full_rows[retained]]
+            )[0]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")[:, :top_k]
+        return np.take_along_axis(candidates, order, axis=1)
+
+    def _collect(self, scores, top, rows):
+        results = []
+        for idx in top:
+            score = scores[idx]
+            if score == -np.inf:
+                break
+            row = idx if rows is None else rows[idx]
+            results.append((float(score), int(self._ids[row])))
+        return results
+
+    def _link(self, row, memory_id, keep_order=False, index_codes=True):
+        text = self.texts[row]
+        self.id_rows[memory_id] = row
+        self.key_rows[self._key(row)] = row
+        ids = self.text_ids.setdefault(text, [])
+        ids.append(memory_id)
+        if keep_order:
+            ids.sort()
+        if not index_codes:
+            return
+        for column, codes in self._codes.items():
+            code = int(codes[row])
+            self._postings[column].setdefault(code, set()).add(row)
+            self._posting_arrays[column].pop(code, None)
+
+    def _unlink(self, row):
+        text = self.texts[row]
+        memory_id = int(self._ids[row])
+        del self.id_rows[memory_id]
+        del self.key_rows[self._key(row)]
+        ids = self.text_ids[text]
+        ids.remove(memory_id)
+        if not ids:
+            del self.text_ids[text]
+        for column, codes in self._codes.items():
+            code = int(codes[row])
+            self._postings[column][code].discard(row)
+            self._posting_arrays[column].pop(code, None)
+
+    def _key(self, row):
+        codes = self._codes
+        return (self.texts[row], self.strings.lookup(codes["agent"][row]), self.strings.lookup(codes["scene"][row]), self.strings.lookup(codes["namespace"][row]))
+
+    def _build_postings(self):
+        # Builds the secondary indexes of all rows at once
+        size = len(self.texts)
+        for column, codes in self._codes.items():
+            codes = np.asarray(codes[:size])
+            order = np.argsort(codes, kind="stable")
+            values, starts = np.unique(codes[order], return_index=True)
+            self._postings[column] = {int(code): set(rows.tolist()) for code, rows in zip(values, np.split(order, starts[1:]))}
+            self._posting_arrays[column] = {}
+
+    def _set_code(self, row, column, value):
+        # Changes a string column of a linked row, keeping its secondary index up to date
+        code = self.strings.intern(value)
+        old_code = int(self._codes[column][row])
+        if code == old_code:
+            return
+        self._postings[column][old_code].discard(row)
+        self._posting_arrays[column].pop(old_code, None)
+        self._postings[column].setdefault(code, set()).add(row)
+        self._posting_arrays[column].pop(code, None)
+        self._codes[column][row] = code
+
+    def _posting_array(self, column, code):
+        rows = self._posting_arrays[column].get(code)
+        if rows is None:
+            rows = np.array(sorted(self._postings[column].get(code, ())), dtype=np.int64)
+            self._posting_arrays[column][code] = rows
+        return rows
+
+    def _ensure_writable(self):
+        # Columns wrapped by from_columns() may be read-only memmaps; copy them before the first write
+        columns = [self._ids, self._has_semantic, self._has_emotion, self._semantic, self._emotion] + list(self._codes.values())
+        if all(column is None or column.flags.writeable for column in columns):
+            return
+        size = len(self.texts)
+        self._resize(max(size + size // 4, 1024))
+
+    def _ensure_capacity(self, size):
+        if size <= self.capacity:
+            return
+        new_capacity = self.capacity
+        while new_capacity < size:
+            new_capacity *= 2
+        self._resize(new_capacity)
+
+    def _resize(self, new_capacity):
+        self._semantic = self._grow(self._semantic, new_capacity)
+        if self._full_rows is not None:
+            self._full_rows = self._grow_column(self._full_rows, new_capacity, -1)
+        self._emotion = self._grow(self._emotion, new_capacity)
+        self._ids = self._grow_column(self._ids, new_capacity, 0)
+        self._codes = {column: self._grow_column(codes, new_capacity, -1) for column, codes in self._codes.items()}
+        self._has_semantic = self._grow_column(self._has_semantic, new_capacity, False)
+        self._has_emotion = self._grow_column(self._has_emotion, new_capacity, False)
+        self._stats = {column: self._grow_column(values, new_capacity, 0) for column, values in self._stats.items()}
+        self.capacity = new_capacity
+
+    @staticmethod
+    def _grow(matrix, new_capacity):
+        if matrix is None:
+            return None
+        if isinstance(matrix, QuantizedMatrix):
+            return matrix.copy_rows(new_capacity)
+        grown = np.zeros((new_capacity, matrix.shape[1]), dtype=np.float32)
+        grown[:min(matrix.shape[0], new_capacity)] = matrix[:new_capacity]
+        return grown
+
+    @staticmethod
+    def _grow_column(column, new_capacity, fill):
+        grown = np.full(new_capacity, fill, dtype=column.dtype)
+        grown[:min(len(column), new_capacity)] = column[:new_capacity]
+        return grown
+
+    def _empty_matrix(self, dim, dtype="float32"):
+        if dtype == "float32":
+            return np.zeros((self.capacity, dim), dtype=np.float32)
+        return QuantizedMatrix.zeros(self.capacity, dim, dtype)
+
+    def _set_row(self, matrix, mask, row, embedding, dtype="float32"):
+        if embedding is None:
+            mask[row] = False
+            if matrix is not None:
+                matrix[row] = 0
+            return matrix
+        if matrix is None:
+            # The dimension is only known once the first embedding arrives
+            matrix = self._empty_matrix(len(embedding), dtype)
+        matrix[row] = normalize_rows(embedding)
+        mask[row] = True
+        return matrix
@@ -0,0 +1,283 @@
+import base64
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from relationship_agent.columnar_store import is_columnar_store, read_store_metadata, save_columnar_store
+
+# Names the current snapshot directory; replaced atomically to publish a new snapshot
+SNAPSHOT_POINTER = "SNAPSHOT"
+# Snapshot directory of stores written before snapshots were versioned
+SNAPSHOT_DIR = "snapshot"
+_segment_pattern = re.compile(r"^wal-(\d+)\.log$")
+_snapshot_pattern = re.compile(r"^snapshot-(\d+)$")
+
+
+def encode_embedding(embedding):
+    if embedding is None:
+        return None
+    return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_embedding(encoded):
+    if encoded is None:
+        return None
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+
+def encode_record(record):
+    """
+    Serializes a log record as one JSON line, with embeddings as base64 float32 (about 8 KB per
+    1536-dim embedding instead of 30 KB of JSON floats).
+    """
+    encoded = dict(record)
+    for key in ("semantic_embedding", "emotion_embedding"):
+        if key in encoded:
+            encoded[key] = encode_embedding(encoded[key])
+    return json.dumps(encoded, ensure_ascii=False)
+
+
+def decode_record(line):
+    record = json.loads(line)
+    for key in ("semantic_embedding", "emotion_embedding"):
+        if key in record:
+            record[key] = decode_embedding(record[key])
+    return record
+
+
+def read_segment(path):
+    """
+    Yields the records of a log segment. A torn last line (from a crash mid-write) is skipped.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield decode_record(line)
+            except ValueError:
+                print(f"Skipping unreadable memory log record in {path}")
+
+
+class MemoryLog():
+    def __init__(self, store_path, compact_every=1000, fsync=False) -> None:
+        """
+        Append-only write-ahead log for a Memory, stored next to a columnar snapshot:
+
+            store_path/SNAPSHOT                 name of the current snapshot directory
+            store_path/snapshot-000004/         columnar store (see columnar_store.py) of the segments up to 4
+            store_path/wal-000005.log           add/update/delete records, one JSON line each
+
+        Every change is appended to the current segment before it is applied, so persisting a new memory costs
+        one line of I/O. Every compact_every records the segment is closed and a background thread folds the
+        closed segments into a new snapshot directory. The snapshot is published by atomically replacing the
+        SNAPSHOT pointer, and only then are the compacted segments and the previous snapshot deleted, so a crash
+        at any point leaves a snapshot plus the segments written after it. Recovery loads the snapshot and
+        replays the newer segments.
+
+        Args:
+            store_path (str): Directory holding the snapshot and the log segments.
+            compact_every (int): Number of records per segment before compaction is triggered.
+            fsync (bool): fsync every record, for durability against OS crashes (not only process crashes).
+        """
+        self.store_path = store_path
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.segment = 0
+        self.records_in_segment = 0
+        self._file = None
+        self._memory_class = None
+        self._embedding_backend = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-compaction")
+        self._compaction = None
+
+        if not os.path.exists(store_path):
+            os.makedirs(store_path)
+
+    def segments(self):
+        """
+        Returns [(segment number, path), ...] of the log segments on disk, oldest first.
+        """
+        segments = []
+        for name in os.listdir(self.store_path):
+            match = _segment_pattern.match(name)
+            if match:
+                segments.append((int(match.group(1)), os.path.join(self.store_path, name)))
+        return sorted(segments)
+
+    @property
+    def snapshot_path(self):
+        """
+        Returns the directory of the current snapshot, or None if nothing was compacted yet.
+        """
+        pointer_path = os.path.join(self.store_path, SNAPSHOT_POINTER)
+        if os.path.exists(pointer_path):
+            with open(pointer_path, "r", encoding="utf-8") as f:
+                return os.path.join(self.store_path, f.read().strip())
+        return self._legacy_snapshot_path()
+
+    def _legacy_snapshot_path(self):
+        # Unversioned snapshots were swapped in with two renames (snapshot -> snapshot.old-PID, then
+        # snapshot.tmp-PID -> snapshot); a crash between them leaves only the renamed copies, both complete
+        path = os.path.join(self.store_path, SNAPSHOT_DIR)
+        if is_columnar_store(path):
+            return path
+        leftovers = [os.path.join(self.store_path, name) for name in os.listdir(self.store_path)
+                     if name.startswith(SNAPSHOT_DIR + ".old-") or name.startswith(SNAPSHOT_DIR + ".tmp-")]
+        leftovers = [leftover for leftover in leftovers if is_columnar_store(leftover)]
+        if not leftovers:
+            return None
+        return max(leftovers, key=lambda leftover: read_store_metadata(leftover).get("wal_segment", 0))
+
+    def snapshot_segment(self):
+        snapshot_path = self.snapshot_path
+        if snapshot_path is None or not is_columnar_store(snapshot_path):
+            return 0
+        return read_store_metadata(snapshot_path).get("wal_segment", 0)
+
+    def recover(self, memory):
+        """
+        Loads the snapshot into memory and replays the log segments written after it, then opens a new
+        segment for writing. A memory that already holds memories and opens an empty store writes them
+        as the initial snapshot.
+        """
+        self._memory_class = type(memory)
+        self._embedding_backend = memory.embedding_backend
+        snapshot_path = self.snapshot_path
+        snapshot_segment = self.snapshot_segment()
+        segments = self.segments()
+
+        if snapshot_path is not None:
+            memory.load_memory_store(snapshot_path)
+        elif not segments and len(memory.index):
+            self._publish_snapshot(memory.index, 0)
+        self._remove_stale_snapshots()
+
+        replayed = 0
+        for segment, path in segments:
+            if segment <= snapshot_segment:
+                # Already compacted; left behind by a crash between the snapshot swap and the cleanup
+                os.remove(path)
+                continue
+            for record in read_segment(path):
+                memory._apply_record(record)
+                replayed += 1
+
+        last_segment = max([snapshot_segment] + [segment for segment, _ in segments])
+        self._open_segment(last_segment + 1)
+        if replayed >= self.compact_every:
+            self.compact()
+        return replayed
+
+    def append(self, record):
+        self._file.write(encode_record(record) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records_in_segment += 1
+        if self.records_in_segment >= self.compact_every:
+            self.compact()
+
+    def append_many(self, records):
+        """
+        Appends a block of records with a single flush (and fsync).
+        """
+        if not records:
+            return
+        self._file.write("".join(encode_record(record) + "\n" for record in records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records_in_segment += len(records)
+        if self.records_in_segment >= self.compact_every:
+            self.compact()
+
+    def compact(self, wait=False):
+        """
+        Closes the current segment and folds every closed segment into a new snapshot in the background.
+        """
+        if self.records_in_segment > 0:
+            self._open_segment(self.segment + 1)
+        # A compaction that has not started yet will already include the segment just closed
+        if self._compaction is None or self._compaction.running() or self._compaction.done():
+            self._compaction = self._executor.submit(self._compact)
+        if wait:
+            self.wait()
+
+    def wait(self):
+        """
+        Waits for the last scheduled compaction.
+        """
+        if self._compaction is not None:
+            self._compaction.result()
+
+    def close(self):
+        self.wait()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            if self.records_in_segment == 0:
+                os.remove(os.path.join(self.store_path, f"wal-{self.segment:06d}.log"))
+
+    def _open_segment(self, segment):
+        if self._file is not None:
+            self._file.close()
+        self.segment = segment
+        self.records_in_segment = 0
+        self._file = open(os.path.join(self.store_path, f"wal-{segment:06d}.log"), "a", encoding="utf-8")
+
+    def _compact(self):
+        # Works on its own copy of the store, so the live Memory keeps serving reads and writes
+        upto = self.segment - 1
+        snapshot_path = self.snapshot_path
+        snapshot_segment = self.snapshot_segment()
+        if upto <= snapshot_segment:
+            return
+        compacted = self._memory_class(embedding_backend=self._embedding_backend)
+        if snapshot_path is not None:
+            compacted.load_memory_store(snapshot_path)
+        segments = [(segment, path) for segment, path in self.segments() if snapshot_segment < segment <= upto]
+        for _, path in segments:
+            for record in read_segment(path):
+                compacted._apply_record(record)
+
+        self._publish_snapshot(compacted.index, upto)
+        # Only deleted once the new snapshot is published: until then they are needed to recover
+        for _, path in segments:
+            os.remove(path)
+        self._remove_stale_snapshots()
+
+    def _publish_snapshot(self, index, upto):
+        """
+        Writes index as the snapshot of the segments up to upto in a new directory, then makes it the current
+        snapshot with one atomic replace of the SNAPSHOT pointer.
+        """
+        name = f"snapshot-{upto:06d}"
+        save_columnar_store(os.path.join(self.store_path, name), index, extra={"wal_segment": upto})
+        pointer_path = os.path.join(self.store_path, SNAPSHOT_POINTER)
+        tmp_path = f"{pointer_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, pointer_path)
+
+    def _remove_stale_snapshots(self):
+        """
+        Deletes the snapshot directories (and leftovers of interrupted writes) other than the current one.
+        A live Memory may still map files of a deleted snapshot; they stay readable until it lets go of them.
+        """
+        current = self.snapshot_path
+        if current is None:
+            return
+        for name in os.listdir(self.store_path):
+            path = os.path.join(self.store_path, name)
+            if os.path.normpath(path) == os.path.normpath(current):
+                continue
+            if _snapshot_pattern.match(name.split(".")[0]) or name.startswith(SNAPSHOT_DIR + ".") or name == SNAPSHOT_DIR:
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+            elif name.startswith(SNAPSHOT_POINTER + ".tmp-"):
+                os.remove(path)
@@ -0,0 +1,201 @@
+import math
+import os
+from jinja2 import Template
+import numpy as np
+import utils.llm_utils as llm_utils
+
+SUMMARY_TYPE = "Summary"
+
+_prompt_path = os.path.join(os.path.dirname(__file__), "prompts", "memory_consolidation.j2")
+_prompt_template = None
+
+def summarize_memories(memories, max_words=80):
+    """
+    Consolidates a group of memories into one with an LLM call.
+
+    Args:
+        memories (list): (text, inner_thoughts) of each memory, oldest first.
+        max_words (int): Length limit of the consolidated memory.
+
+    Returns:
+        tuple: (summary, inner_thoughts)
+    """
+    global _prompt_template
+    if _prompt_template is None:
+        with open(_prompt_path, "r", encoding="utf-8") as f:
+            _prompt_template = Template(f.read())
+    sys_prompt = _prompt_template.render(max_words=max_words)
+    memories_str = ""
+    for idx, (text, inner_thoughts) in enumerate(memories):
+        memories_str += f"{idx}. {text}\n"
+        if inner_thoughts:
+            memories_str += f"   Inner Thoughts: {inner_thoughts}\n"
+
+    # Retry logic for JSON parsing
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            response = llm_utils.model_call_unstructured(sys_prompt, memories_str)
+            response_json = llm_utils.parse_model_json(response)
+            return response_json["summary"], response_json.get("inner_thoughts")
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise
+            print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+
+class MemoryPolicy():
+    def __init__(self, capacity, high_water=1.1, low_water=0.9, recency_half_life=None, recency_weight=1.0, emotion_weight=1.0, retrieval_weight=1.0, merge=True, merge_group_size=4, summarizer=None) -> None:
+        """
+        Capacity policy for a Memory: keeps the number of long-term memories within a budget.
+
+        Every memory gets a value score, a weighted sum of
+            recency:    0.5 ** (memories added since it was added or last retrieved / recency_half_life)
+            emotion:    intensity (norm of its 8-dim Plutchik vector) relative to the most intense memory
+            retrieval:  log(1 + times retrieved) relative to the most retrieved memory
+
+        Once the store grows past capacity * high_water, the lowest-valued memories are consolidated until it
+        is back at capacity * low_water. With merge=True they are grouped with similar memories of the same agent
+        and each group is replaced by one summary memory, written by summarizer in a background thread (see
+        Memory.consolidate()); with merge=False they are simply evicted. Memories added while a merge is in
+        flight that would take the store past capacity * high_water evict the lowest-valued memories, so the
+        store never exceeds that bound however slow the summarizer is.
+
+        Args:
+            capacity (int): Target number of memories.
+            high_water (float): Consolidation starts above capacity * high_water memories.
+            low_water (float): Consolidation stops at capacity * low_water memories.
+            recency_half_life (float): In memories added; defaults to capacity / 2.
+            recency_weight, emotion_weight, retrieval_weight (float): Weights of the value score terms.
+            merge (bool): Merge low-value memories into summaries instead of evicting them.
+            merge_group_size (int): Number of memories merged into one summary.
+            summarizer (callable): summarizer([(text, inner_thoughts), ...]) -> (summary, inner_thoughts).
+                Defaults to an LLM call.
+        """
+        self.capacity = capacity
+        self.high_water = high_water
+        self.low_water = low_water
+        self.recency_half_life = recency_half_life or max(capacity / 2, 1)
+        self.recency_weight = recency_weight
+        self.emotion_weight = emotion_weight
+        self.retrieval_weight = retrieval_weight
+        self.merge = merge
+        self.merge_group_size = max(merge_group_size, 2)
+        self.summarizer = summarizer or summarize_memories
+
+    def over_capacity(self, index):
+        return len(index) > self.capacity * self.high_water
+
+    def scores(self, index):
+        """
+        Returns the value score of every row of a MemoryIndex.
+        """
+        stats = index.stats()
+        age = index.next_id - stats["last_used"]
+        recency = np.power(0.5, age / self.recency_half_life)
+        intensity = stats["intensity"]
+        emotion = intensity / intensity.max() if len(intensity) and intensity.max() > 0 else np.zeros(len(intensity))
+        retrievals = np.log1p(stats["retrievals"])
+        retrieval = retrievals / retrievals.max() if len(retrievals) and retrievals.max() > 0 else np.zeros(len(retrievals))
+        return self.recency_weight * recency + self.emotion_weight * emotion + self.retrieval_weight * retrieval
+
+    def select(self, index, target=None, merge=None, exclude=()):
+        """
+        Returns the rows to consolidate, lowest value first, to bring the store down to target memories
+        (capacity * low_water by default). When merging, enough rows are selected that the store is at target
+        after their summaries are added. Memories whose ids are in exclude are never selected.
+        """
+        merge = self.merge if merge is None else merge
+        target = int(self.capacity * self.low_water) if target is None else target
+        excess = len(index) - target
+        if excess <= 0:
+            return np.array([], dtype=np.int64)
+        if merge:
+            excess = math.ceil(excess * self.merge_group_size / (self.merge_group_size - 1))
+        scores = self.scores(index)
+        excluded = [index.id_rows[memory_id] for memory_id in exclude if memory_id in index.id_rows]
+        scores[excluded] = np.inf
+        excess = min(excess, len(index) - len(excluded))
+        if excess <= 0:
+            return np.array([], dtype=np.int64)
+        rows = np.argpartition(scores, excess - 1)[:excess] if excess < len(index) else np.arange(len(index))
+        return rows[np.argsort(scores[rows], kind="stable")]
+
+    def plan(self, index):
+        """
+        Groups the selected memories for merging: memories of the same agent, each group seeded by the lowest-valued
+        remaining memory and filled with the memories most semantically similar to it.
+        Returns [(member ids, agent, group, [(text, inner_thoughts), ...], summary emotion embedding, summary stats), ...].
+        The summary keeps the members' group if they all share one.
+        The records are copied, so the plan can be summarized in the background while the index keeps changing.
+        """
+        rows = self.select(index)
+        columns = index.columns()
+        agents = columns["codes"]["agent"]
+        stats = index.stats()
+        intensity = stats["intensity"]
+        groups = []
+        for agent_code in dict.fromkeys(agents[rows].tolist()):
+            remaining = [row for row in rows.tolist() if agents[row] == agent_code]
+            while remaining:
+                seed = remaining.pop(0)
+                members = [seed]
+                if remaining and columns["semantic"] is not None:
+                    similarity = columns["semantic"][remaining] @ columns["semantic"][seed]
+                    nearest = np.argsort(-similarity, kind="stable")[:self.merge_group_size - 1]
+                    members += [remaining[idx] for idx in nearest]
+                    remaining = [row for row in remaining if row not in members]
+                else:
+                    members += remaining[:self.merge_group_size - 1]
+                    remaining = remaining[self.merge_group_size - 1:]
+                # Oldest first, so the summarizer reads them in the order they happened
+                members.sort(key=lambda row: columns["ids"][row])
+                emotion = None
+                if columns["emotion"] is not None:
+                    # Mean of the original (un-normalized) emotion vectors
+                    weighted = [columns["emotion"][row] * intensity[row] for row in members if columns["has_emotion"][row]]
+                    emotion = np.mean(weighted, axis=0).tolist() if weighted else None
+                group_codes = set(columns["codes"]["group"][members].tolist())
+                groups.append((
+                    [int(columns["ids"][row]) for row in members],
+                    index.strings.lookup(agent_code),
+                    index.strings.lookup(group_codes.pop()) if len(group_codes) == 1 else None,
+                    [(index.texts[row], index.inner_thoughts[row]) for row in members],
+                    emotion,
+                    # A summary is as recent and as often retrieved as its members, not new
+                    {"last_used": int(stats["last_used"][members].max()), "retrievals": int(stats["retrievals"][members].sum())}
+                ))
+        return groups
+
+    def consolidate(self, groups, embedding_backend=None):
+        """
+        Summarizes and embeds planned groups with embedding_backend (a background job; does not touch the index).
+        Returns [(member ids, summary record), ...] with add records ready for Memory._add_record(); a memory
+        left without a group to merge into has no summary record and is evicted. Groups whose summary fails are
+        skipped and stay in the store.
+        """
+        summaries = []
+        for member_ids, agent, group, memories, emotion, stats in groups:
+            if len(member_ids) == 1:
+                summaries.append((member_ids, None))
+                continue
+            try:
+                summary, inner_thoughts = self.summarizer(memories)
+            except Exception as e:
+                print(f"Memory consolidation failed for {len(member_ids)} memories, keeping them... Error: {e}")
+                continue
+            summaries.append((member_ids, {
+                "text": summary,
+                "emotion_embedding": emotion,
+                "inner_thoughts": inner_thoughts,
+                "type": SUMMARY_TYPE,
+                "agent": agent,
+                "group": group,
+                "stats": stats
+            }))
+        records = [record for _, record in summaries if record is not None]
+        if records:
+            embeddings = llm_utils.get_text_embeddings([record["text"] for record in records], backend=embedding_backend)
+            for record, embedding in zip(records, embeddings):
+                record["semantic_embedding"] = embedding
+        return summaries
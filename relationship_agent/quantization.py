@@ -0,0 +1,187 @@
+import numpy as np
+
+QUANTIZED_DTYPES = ("float16", "int8")
+
+
+class QuantizedMatrix():
+    # Rows converted at a time when copying or growing the matrix, to bound the temporary float32 copy
+    CHUNK_ROWS = 4096
+    # Values dequantized at a time when scoring: small enough for the float32 chunk to stay in cache
+    SCORE_CHUNK_VALUES = 1 << 16
+
+    def __init__(self, codes, scales=None) -> None:
+        """
+        Reduced-precision storage of a matrix of unit-length embedding rows, used by MemoryIndex in place of a
+        float32 matrix:
+            float16  codes are the rows in half precision (2 bytes per value)
+            int8     codes are the rows scalar-quantized to int8 (1 byte per value) with one float32 scale per
+                     row: row ~= codes * scale, scale = max(|row|) / 127
+
+        Indexing with a row, a row list or a mask returns dequantized float32 rows; indexing with a slice returns
+        a QuantizedMatrix view. Assigning float rows quantizes them. scores() computes query similarities in
+        chunks, so scoring every row never materializes the whole float32 matrix.
+
+        Scoring pays for dequantizing every row per query. int8 scoring is close to float32 speed, but NumPy's
+        float16 conversion is slow: expect float16 scoring to take several times as long as float32 scoring
+        (see benchmarks/bench_quantized_retrieval.py).
+
+        Args:
+            codes (np.ndarray): float16 or int8 matrix (possibly a read-only memmap).
+            scales (np.ndarray): Per-row float32 scales, for int8 codes.
+        """
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def zeros(cls, rows, dim, dtype):
+        if dtype == "int8":
+            return cls(np.zeros((rows, dim), dtype=np.int8), np.zeros(rows, dtype=np.float32))
+        return cls(np.zeros((rows, dim), dtype=np.float16))
+
+    @classmethod
+    def from_dense(cls, matrix, dtype):
+        quantized = cls.zeros(len(matrix), matrix.shape[1], dtype)
+        for start in range(0, len(matrix), cls.CHUNK_ROWS):
+            chunk = matrix[start:start + cls.CHUNK_ROWS]
+            quantized[start:start + cls.CHUNK_ROWS] = chunk.dense() if isinstance(chunk, QuantizedMatrix) else chunk
+        return quantized
+
+    @property
+    def dtype(self):
+        return self.codes.dtype
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def flags(self):
+        return self.codes.flags
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return QuantizedMatrix(self.codes[key], None if self.scales is None else self.scales[key])
+        rows = self.codes[key].astype(np.float32)
+        if self.scales is not None:
+            rows *= self.scales[key][..., None]
+        return rows
+
+    def __setitem__(self, key, values):
+        if isinstance(values, QuantizedMatrix):
+            # Copying stored rows (e.g. swap-removal) keeps their codes as they are
+            self.codes[key] = values.codes
+            if self.scales is not None:
+                self.scales[key] = values.scales
+            return
+        values = np.broadcast_to(np.asarray(values, dtype=np.float32), self.codes[key].shape)
+        if self.scales is None:
+            self.codes[key] = values.astype(np.float16)
+            return
+        scales = np.abs(values).max(axis=-1) / 127
+        safe_scales = np.where(scales > 0, scales, 1)
+        self.codes[key] = np.rint(values / safe_scales[..., None]).astype(np.int8)
+        self.scales[key] = scales
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self[np.arange(len(self))]
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __matmul__(self, other):
+        # rows @ other, e.g. assigning rows to approximate index centroids
+        if len(self) == 0:
+            return self.dense() @ other
+        return np.concatenate([self[start:start + self.CHUNK_ROWS].dense() @ other for start in range(0, len(self), self.CHUNK_ROWS)])
+
+    def dense(self):
+        """
+        Returns the rows as a float32 matrix.
+        """
+        return np.asarray(self)
+
+    def take(self, rows):
+        """
+        Returns a new QuantizedMatrix of the given rows, keeping their codes as they are.
+        """
+        return QuantizedMatrix(self.codes[rows], None if self.scales is None else self.scales[rows])
+
+    def copy_rows(self, rows):
+        """
+        Returns a new QuantizedMatrix of rows rows holding (a prefix of) these rows, for growing the matrix.
+        """
+        grown = QuantizedMatrix.zeros(rows, self.shape[1], "int8" if self.scales is not None else "float16")
+        count = min(len(self), rows)
+        grown.codes[:count] = self.codes[:count]
+        if self.scales is not None:
+            grown.scales[:count] = self.scales[:count]
+        return grown
+
+    def scores(self, query_vectors):
+        """
+        Returns query_vectors @ rows.T as float32, one row of scores per query.
+        """
+        rows, dim = self.shape
+        chunk_rows = max(1, self.SCORE_CHUNK_VALUES // max(dim, 1))
+        scores = np.empty((len(query_vectors), rows), dtype=np.float32)
+        # Reused by every chunk instead of allocating a float32 copy per chunk
+        buffer = np.empty((min(chunk_rows, rows), dim), dtype=np.float32)
+        bits = np.empty(buffer.shape, dtype=np.uint32) if self.scales is None else None
+        for start in range(0, rows, chunk_rows):
+            codes = self.codes[start:start + chunk_rows]
+            chunk = buffer[:len(codes)]
+            if self.scales is None:
+                _float16_to_float32(codes, chunk, bits[:len(codes)])
+            else:
+                np.copyto(chunk, codes)
+            chunk_scores = query_vectors @ chunk.T
+            if self.scales is not None:
+                chunk_scores *= self.scales[start:start + chunk_rows]
+            scores[:, start:start + len(codes)] = chunk_scores
+        return scores
+
+
+def _float16_to_float32(codes, out, bits):
+    """
+    Converts float16 codes into the float32 array out, using bits (a uint32 array of the same shape) as scratch.
+    NumPy's float16 cast converts one value at a time; moving the sign, exponent and mantissa bits into place
+    with whole-array integer operations is about 1.5x faster, and exact (including zeros and subnormals).
+    """
+    signs = out.view(np.uint32)
+    np.copyto(bits, codes.view(np.uint16))
+    np.bitwise_and(bits, 0x8000, out=signs)
+    np.left_shift(signs, 16, out=signs)
+    # float16 exponent and mantissa moved to the float32 positions, then rebiased (15 -> 127) by a power of two
+    np.bitwise_and(bits, 0x7fff, out=bits)
+    np.left_shift(bits, 13, out=bits)
+    magnitudes = bits.view(np.float32)
+    np.multiply(magnitudes, np.float32(2.0 ** 112), out=magnitudes)
+    np.bitwise_or(signs, bits, out=signs)
+    return out
+
+
+def quantize_matrix(matrix, dtype):
+    """
+    Returns matrix stored as dtype: a float32 np.ndarray for "float32", else a QuantizedMatrix.
+    """
+    if dtype == "float32":
+        return np.asarray(matrix, dtype=np.float32) if not isinstance(matrix, QuantizedMatrix) else matrix.dense()
+    if dtype not in QUANTIZED_DTYPES:
+        raise ValueError(f"Unsupported embedding storage type {dtype}, expected float32, float16 or int8")
+    if isinstance(matrix, QuantizedMatrix) and matrix.dtype == np.dtype(dtype):
+        return matrix
+    return QuantizedMatrix.from_dense(matrix, dtype)
+
+
+def matrix_scores(query_vectors, matrix):
+    """
+    Returns query_vectors @ matrix.T for a float32 matrix or a QuantizedMatrix.
+    """
+    if isinstance(matrix, QuantizedMatrix):
+        return matrix.scores(query_vectors)
+    return query_vectors @ matrix.T
@@ -1,16 +1,25 @@
 from ast import List
+import asyncio
 import os, json
 from utils.llm_utils import model_call_unstructured, model_call_structured, parse_model_json, model_call_unstructured_async, model_call_structured_async
 import utils.general_utils as general_utils
 import relationship_agent.agent_utils as agent_utils
-from relationship_agent.schemas import AgentActionSchema
+from relationship_agent.schemas import AgentActionSchema, AgentTurnSchema
 import uuid
-from relationship_agent.agent_utils import render_j2_template
+from concurrent.futures import ThreadPoolExecutor
+import utils.llm_utils as llm_utils
+from relationship_agent.agent_utils import render_j2_template, format_retrieved_memories
 from relationship_agent.memory import Memory
+from relationship_agent.memory_bundle import load_memory_bundle
+from relationship_agent.shared_memory_store import shared_memory_store
+from utils.context_window import ContextWindow, render_scene_history
+
+# Query embeddings for long-term memory retrieval are requested here while the agent appraises the narrative
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memory-prefetch")
 
 
 class RelationshipAgent():
-    def __init__(self, name, persona) -> None:
+    def __init__(self, name, persona, context_budgets=None, memory_policy=None, memory_bundle=None, retrieval_top_k=5, embedding_backend=None, semantic_dtype="float32", shared_memory=None) -> None:
 
         self.json_schemas = {}
 
@@ -46,7 +55,20 @@ class RelationshipAgent():
             
         #     self.memory = Memory(id_mem_path)
         # else:
-        self.memory = Memory()
+        # memory_policy (MemoryPolicy) optionally bounds the long-term memory store
+        # embedding_backend (an EmbeddingBackend or spec string, see utils/llm_utils.py) embeds its long-term memories;
+        # semantic_dtype "float16" or "int8" stores their embeddings in reduced precision
+        # shared_memory (True for the process-wide store, or a SharedMemoryStore) keeps them in a shared store
+        # instead, in the agent's namespace, so retrievals of concurrent agents are batched
+        if shared_memory is not None and shared_memory is not False:
+            store = shared_memory_store() if shared_memory is True else shared_memory
+            self.memory = Memory(policy=memory_policy, embedding_backend=embedding_backend, shared_store=store, namespace=self.agent_id)
+        else:
+            self.memory = Memory(policy=memory_policy, embedding_backend=embedding_backend, semantic_dtype=semantic_dtype)
+        # Prebuilt, already appraised and embedded memories (see build_memory_bundle.py), memory-mapped
+        self.memory_bundle = None
+        if memory_bundle is not None:
+            self.memory_bundle = load_memory_bundle(self.memory, memory_bundle)
 
         # memory_path = os.path.join(agent_path, "memories.json")
         # if os.path.exists(memory_path):
@@ -58,6 +80,31 @@ class RelationshipAgent():
         self.emotion_state = []
         self.update_description()
 
+        # Optional token budgets per prompt call site ("appraise", "make_choices", "reflect").
+        # Call sites with a budget keep recent events verbatim and older ones in a rolling summary.
+        self.context_windows = {
+            call_site: ContextWindow(budget) for call_site, budget in (context_budgets or {}).items()
+        }
+
+        # Number of long-term memories retrieved for make_choices (0 disables retrieval)
+        self.retrieval_top_k = retrieval_top_k
+        # (narrative, future of its query embedding) started by prefetch_memories()
+        self._memory_prefetch = None
+
+    def _scene_history_context(self, call_site, scene_history):
+        return render_scene_history(self.context_windows.get(call_site), scene_history)
+
+    def _working_memory_context(self, call_site):
+        window = self.context_windows.get(call_site)
+        if window is None:
+            return self.memory.format_working_memory()
+        return window.render(
+            self.memory.working_memory_entries(),
+            self.memory.working_memory_token_counts(),
+            separator="\n\n",
+            source=self.memory.working_memory
+        )
+
     def add_to_working_memory(self, text, emotion_embedding=None, inner_thoughts=None, memory_type=None, agent=None):
         """
         Adds a memory item to the agent's working memory using all parameters of the Memory class.
@@ -73,15 +120,15 @@ class RelationshipAgent():
     def make_choices(self, current_narrative, appraisal):
         template_content = self.prompts['make_choice.j2']
         
-        # retrievals = self.memory.get_top_memories_from_text(current_narrative, appraisal['emotion_scores'])
+        retrievals = self._retrieve_memories(current_narrative, appraisal)
         
         # Prepare context for the template
         context_dict = {
             "agent_name": self.name,
             "internal_thought": appraisal["inner_thoughts"],
             "agent_persona": self.agent_state,
-            # "retrieved_memories": retrievals,
-            "previous_narrative": self.memory.format_working_memory(),
+            "retrieved_memories": retrievals,
+            "previous_narrative": self._working_memory_context("make_choices"),
             "current_narrative": current_narrative
         }
 
@@ -92,8 +139,10 @@ class RelationshipAgent():
         for attempt in range(max_retries):
             try:
                 response = model_call_unstructured('', prompt)
-                self.emotion_state = parse_model_json(response)
-                return self.emotion_state
+                choice = parse_model_json(response)
+                # The choice is an action, not an emotion state: as in a fused turn, the emotion state is the appraisal acted on
+                self.emotion_state = appraisal
+                return choice
             except Exception as e:
                 if attempt == max_retries - 1:
                     print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
@@ -104,15 +153,15 @@ class RelationshipAgent():
     async def make_choices_async(self, current_narrative, appraisal):
         template_content = self.prompts['make_choice.j2']
         
-        # retrievals = self.memory.get_top_memories_from_text(current_narrative, appraisal['emotion_scores'])
+        retrievals = await self._retrieve_memories_async(current_narrative, appraisal)
         
         # Prepare context for the template
         context_dict = {
             "agent_name": self.name,
             "internal_thought": appraisal["inner_thoughts"],
             "agent_persona": self.agent_state,
-            # "retrieved_memories": retrievals,
-            "previous_narrative": self.memory.format_working_memory(),
+            "retrieved_memories": retrievals,
+            "previous_narrative": self._working_memory_context("make_choices"),
             "current_narrative": current_narrative
         }
 
@@ -123,8 +172,10 @@ class RelationshipAgent():
         for attempt in range(max_retries):
             try:
                 response = await model_call_unstructured_async('', prompt)
-                self.emotion_state = parse_model_json(response)
-                return self.emotion_state
+                choice = parse_model_json(response)
+                # The choice is an action, not an emotion state: as in a fused turn, the emotion state is the appraisal acted on
+                self.emotion_state = appraisal
+                return choice
             except Exception as e:
                 if attempt == max_retries - 1:
                     print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
@@ -132,6 +183,138 @@ class RelationshipAgent():
                     raise
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
+    def prefetch_memories(self, current_narrative):
+        """
+        Starts embedding current_narrative for long-term memory retrieval on a background thread. Call it as soon
+        as the narrative is known: the embedding request then runs while the agent appraises the narrative, and
+        make_choices() only has to score the memories once the appraisal's emotion scores are known. Does nothing
+        if the agent has no long-term memories.
+        """
+        if not self._retrieves_memories():
+            return
+        if self._memory_prefetch is not None and self._memory_prefetch[0] == current_narrative:
+            return
+        self._take_prefetch(None)
+        self._memory_prefetch = (current_narrative, _prefetch_executor.submit(llm_utils.get_text_embeddings, [current_narrative], self.memory.embedding_backend))
+
+    def _retrieves_memories(self):
+        return self.retrieval_top_k > 0 and self.memory.count() > 0
+
+    def _take_prefetch(self, current_narrative):
+        """
+        Returns the future of the prefetched embedding of current_narrative, or None if it was not prefetched.
+        A prefetch for another narrative is discarded.
+        """
+        prefetch, self._memory_prefetch = self._memory_prefetch, None
+        if prefetch is None:
+            return None
+        if prefetch[0] != current_narrative:
+            prefetch[1].cancel()
+            return None
+        return prefetch[1]
+
+    def _retrieve_memories(self, current_narrative, appraisal=None):
+        """
+        Returns the long-term memories most relevant to the narrative and the appraisal's emotion scores,
+        formatted for make_choice.j2 and appraise_and_act.j2 ("" without long-term memories). Without an
+        appraisal (fused turns appraise and choose in the same call) memories are retrieved by the narrative only.
+        """
+        if not self._retrieves_memories():
+            return ""
+        prefetch = self._take_prefetch(current_narrative)
+        try:
+            embeddings = prefetch.result() if prefetch is not None else llm_utils.get_text_embeddings([current_narrative], backend=self.memory.embedding_backend)
+        except Exception as e:
+            print(f"Memory retrieval failed, choosing without long-term memories... Error: {e}")
+            return ""
+        return self._score_memories(embeddings[0], appraisal)
+
+    async def _retrieve_memories_async(self, current_narrative, appraisal=None):
+        if not self._retrieves_memories():
+            return ""
+        prefetch = self._take_prefetch(current_narrative)
+        try:
+            if prefetch is not None:
+                embeddings = await asyncio.wrap_future(prefetch)
+            else:
+                embeddings = await llm_utils.get_text_embeddings_async([current_narrative], backend=self.memory.embedding_backend)
+        except Exception as e:
+            print(f"Memory retrieval failed, choosing without long-term memories... Error: {e}")
+            return ""
+        retrievals = await self.memory.get_top_memories_async(embeddings[0], self._query_emotion(appraisal), top_k=self.retrieval_top_k)
+        return format_retrieved_memories(retrievals)
+
+    def _score_memories(self, query_embedding, appraisal):
+        # The emotion vector is only known once the appraisal arrives, so it is applied at scoring time
+        retrievals = self.memory.get_top_memories(query_embedding, self._query_emotion(appraisal), top_k=self.retrieval_top_k)
+        return format_retrieved_memories(retrievals)
+
+    def _query_emotion(self, appraisal):
+        return appraisal.get("emotion_scores") if appraisal is not None else None
+
+    def appraise_and_choose(self, current_narrative):
+        """
+        Fused turn: appraises the current narrative and chooses an action with a single LLM call.
+        Returns (appraisal, action) in the same shape as appraise() and make_choices().
+        """
+        prompt = self._render_turn_prompt(current_narrative, self._retrieve_memories(current_narrative))
+
+        # Retry logic for JSON parsing and schema validation
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                response = model_call_unstructured('', prompt)
+                turn = AgentTurnSchema(**parse_model_json(response))
+                return self._split_turn(turn)
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    raise
+                print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+    async def appraise_and_choose_async(self, current_narrative):
+        """
+        Async version of appraise_and_choose().
+        """
+        prompt = self._render_turn_prompt(current_narrative, await self._retrieve_memories_async(current_narrative))
+
+        # Retry logic for JSON parsing and schema validation
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                response = await model_call_unstructured_async('', prompt)
+                turn = AgentTurnSchema(**parse_model_json(response))
+                return self._split_turn(turn)
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    raise
+                print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+    def _render_turn_prompt(self, current_narrative, retrievals):
+        template_content = self.prompts['appraise_and_act.j2']
+
+        # The working memory already holds the scene history, so it is only sent once
+        context_dict = {
+            "agent_name": self.name,
+            "agent_persona": self.agent_state,
+            "retrieved_memories": retrievals,
+            "previous_narrative": self._working_memory_context("make_choices"),
+            "current_narrative": current_narrative
+        }
+
+        return render_j2_template(template_content, context_dict)
+
+    def _split_turn(self, turn):
+        appraisal = {
+            "emotion_scores": turn.emotion_scores,
+            "inner_thoughts": turn.inner_thoughts
+        }
+        self.emotion_state = appraisal
+        return appraisal, {"action": turn.action}
+
     #slightly deprecated, might go back to this version
     def act(self, scene_history, action_question, action_options):
         with open(os.path.join(os.path.dirname(__file__), "json_schemas", "agent_action_schema.json"), "r", encoding="utf-8") as f:
@@ -221,7 +404,7 @@ class RelationshipAgent():
         context_dict = {
             "agent_information": self.agent_state,
             "context": "",  # You may want to add more context here if available
-            "conversation_history": general_utils.history_to_str(scene_history)
+            "conversation_history": self._scene_history_context("reflect", scene_history)
         }
 
         prompt = render_j2_template(template_content, context_dict)
@@ -248,7 +431,7 @@ class RelationshipAgent():
         context_dict = {
             "agent_information": self.agent_state,
             "context": "",  # You may want to add more context here if available
-            "conversation_history": general_utils.history_to_str(scene_history)
+            "conversation_history": self._scene_history_context("reflect", scene_history)
         }
 
         prompt = render_j2_template(template_content, context_dict)
@@ -273,7 +456,7 @@ class RelationshipAgent():
         context_dict = {
             "agent_information": self.agent_state,
             "context": "",
-            "conversation_history": general_utils.history_to_str(scene_history)
+            "conversation_history": self._scene_history_context("appraise", scene_history)
         }
 
         prompt = render_j2_template(template_content, context_dict)
@@ -299,7 +482,63 @@ class RelationshipAgent():
         context_dict = {
             "agent_information": self.agent_state,
             "context": "",
-            "conversation_history": general_utils.history_to_str(scene_history)
+            "conversation_history": self._scene_history_context("appraise", scene_history)
+        }
+
+        prompt = render_j2_template(template_content, context_dict)
+
+        # Retry logic for JSON parsing
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                response = await model_call_unstructured_async('', prompt)
+                self.emotion_state = parse_model_json(response)
+                return self.emotion_state
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    self.emotion_state = None
+                    return self.emotion_state
+                print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+    def appraise_partner_action(self, scene_history):
+        """
+        Appraises the partner's most recent action in the scene history from this agent's perspective.
+        """
+        template_content = self.prompts['appraise_partner_action.j2']
+
+        context_dict = {
+            "agent_information": self.agent_state,
+            "conversation_history": self._scene_history_context("appraise", scene_history)
+        }
+
+        prompt = render_j2_template(template_content, context_dict)
+
+        # Retry logic for JSON parsing
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                response = model_call_unstructured('', prompt)
+                self.emotion_state = parse_model_json(response)
+                return self.emotion_state
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    self.emotion_state = None
+                    return self.emotion_state
+                print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+    async def appraise_partner_action_async(self, scene_history):
+        """
+        Async version of appraise_partner_action().
+        """
+        template_content = self.prompts['appraise_partner_action.j2']
+
+        context_dict = {
+            "agent_information": self.agent_state,
+            "conversation_history": self._scene_history_context("appraise", scene_history)
         }
 
         prompt = render_j2_template(template_content, context_dict)
@@ -319,58 +558,113 @@ class RelationshipAgent():
                     return self.emotion_state
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
-    def batch_appraise_memory(self, memories, batch_size = 8):
+    def batch_appraise_memory(self, memories, batch_size = 8, checkpoint_path = None, groups = None):
+        """
+        Scores the emotions of each memory with the LLM, batch_size memories per call, and adds them to the
+        long-term memory store, embedding each batch with one request.
+
+        Args:
+            memories (list): Memory texts.
+            batch_size (int): Memories per appraisal call.
+            checkpoint_path (str): Optional JSONL file recording finished appraisals. Rerunning with the same
+                file (e.g. after a crash) only appraises the memories that were not finished.
+            groups (list): Optional group label per memory (e.g. "childhood"), see GroupIndex.
+        """
         sys_prompt = self.prompts['batch_appraisal.j2']
-        for batch_start in range(0, len(memories), batch_size):
+        appraisals = agent_utils.read_appraisal_checkpoint(checkpoint_path)
+        group_of = dict(zip(memories, groups or []))
+        self._store_appraised_memories(memories, appraisals, group_of)
+        pending = [memory for memory in dict.fromkeys(memories) if memory not in appraisals]
+        for batch_start in range(0, len(pending), batch_size):
             memories_str = ""
-            batch = memories[batch_start:batch_start+batch_size]
+            batch = pending[batch_start:batch_start+batch_size]
             for idx, memory in enumerate(batch):
                 memories_str += f"{idx}. {memory}\n"
             print(f"Processing batch {batch_start // batch_size + 1}")
             
             # Retry logic for JSON parsing
             max_retries = 3
+            response = None
             for attempt in range(max_retries):
                 try:
                     response = model_call_unstructured(sys_prompt, memories_str, 'qwen3-32b-fp8')
                     response_json = parse_model_json(response)
-                    for idx, memory in enumerate(batch):
-                        self.memory.add_memory(text = memory, emotion_embedding=response_json[str(idx)], memory_type='memory')
+                    emotion_embeddings = [response_json[str(idx)] for idx in range(len(batch))]
                     break  # Success, exit retry loop
                 except Exception as e:
                     if attempt == max_retries - 1:
                         print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
                         print(f"Raw response: {response}")
-                        response_json = None
+                        emotion_embeddings = None
                     else:
                         print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+            if emotion_embeddings is None:
+                continue
+            if checkpoint_path is not None:
+                agent_utils.append_appraisal_checkpoint(checkpoint_path, batch, emotion_embeddings)
+            self.memory.add_memories(self._appraised_entries(batch, emotion_embeddings, group_of))
 
-    async def batch_appraise_memory_async(self, memories, batch_size = 8):
+    async def batch_appraise_memory_async(self, memories, batch_size = 8, max_concurrency = 8, checkpoint_path = None, groups = None):
+        """
+        Async version of batch_appraise_memory(): up to max_concurrency appraisal calls run at once, and each batch
+        is embedded and stored as soon as its appraisal returns, while other batches are still being appraised.
+        Memories are stored in the order their batches finish.
+        """
         sys_prompt = self.prompts['batch_appraisal.j2']
-        for batch_start in range(0, len(memories), batch_size):
+        appraisals = agent_utils.read_appraisal_checkpoint(checkpoint_path)
+        group_of = dict(zip(memories, groups or []))
+        await self._store_appraised_memories_async(memories, appraisals, group_of)
+        pending = [memory for memory in dict.fromkeys(memories) if memory not in appraisals]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def appraise_batch(batch_start):
             memories_str = ""
-            batch = memories[batch_start:batch_start+batch_size]
+            batch = pending[batch_start:batch_start+batch_size]
             for idx, memory in enumerate(batch):
                 memories_str += f"{idx}. {memory}\n"
-            print(f"Processing batch {batch_start // batch_size + 1}")
-            
-            # Retry logic for JSON parsing
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = await model_call_unstructured_async(sys_prompt, memories_str, 'qwen3-32b-fp8')
-                    response_json = parse_model_json(response)
-                    for idx, memory in enumerate(batch):
-                        self.memory.add_memory(text = memory, emotion_embedding=response_json[str(idx)], memory_type='memory')
-                    break  # Success, exit retry loop
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
-                        print(f"Raw response: {response}")
-                        response_json = None
-                    else:
+
+            async with semaphore:
+                print(f"Processing batch {batch_start // batch_size + 1}")
+                # Retry logic for JSON parsing
+                max_retries = 3
+                response = None
+                for attempt in range(max_retries):
+                    try:
+                        response = await model_call_unstructured_async(sys_prompt, memories_str, 'qwen3-32b-fp8')
+                        response_json = parse_model_json(response)
+                        emotion_embeddings = [response_json[str(idx)] for idx in range(len(batch))]
+                        break  # Success, exit retry loop
+                    except Exception as e:
+                        if attempt == max_retries - 1:
+                            print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
+                            print(f"Raw response: {response}")
+                            return
                         print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
+            # Checkpointed before embedding, so a crash from here on never repeats the appraisal
+            if checkpoint_path is not None:
+                agent_utils.append_appraisal_checkpoint(checkpoint_path, batch, emotion_embeddings)
+            await self.memory.add_memories_async(self._appraised_entries(batch, emotion_embeddings, group_of))
+
+        await asyncio.gather(*[appraise_batch(batch_start) for batch_start in range(0, len(pending), batch_size)])
+
+    def _store_appraised_memories(self, memories, appraisals, group_of):
+        # Memories appraised in an earlier run that are not in the store yet (e.g. the process crashed)
+        self.memory.add_memories(self._unstored_appraisals(memories, appraisals, group_of))
+
+    async def _store_appraised_memories_async(self, memories, appraisals, group_of):
+        await self.memory.add_memories_async(self._unstored_appraisals(memories, appraisals, group_of))
+
+    def _unstored_appraisals(self, memories, appraisals, group_of):
+        unstored = [memory for memory in dict.fromkeys(memories) if memory in appraisals and self.memory.find(memory) is None]
+        return self._appraised_entries(unstored, [appraisals[memory] for memory in unstored], group_of)
+
+    def _appraised_entries(self, memories, emotion_embeddings, group_of):
+        return [
+            {"text": memory, "emotion_embedding": emotion_embedding, "type": 'memory', "group": group_of.get(memory)}
+            for memory, emotion_embedding in zip(memories, emotion_embeddings)
+        ]
+
     def set_goal(self, goal):
         self.agent_state["goal"] = goal
         self.update_description()
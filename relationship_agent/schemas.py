@@ -13,4 +13,8 @@ class ReflectionSchema(BaseModel):
     change_in_trust: int
     change_in_resentment: int
     mood_change: List[str] = Field(..., description="The agent's current emotional tone or general affective state.")
-    memory_log_entry: List[str] = Field(..., description="New emotionally salient moments (positive or negative) that influence future trust, resentment, and decisions.")
\ No newline at end of file
+    memory_log_entry: List[str] = Field(..., description="New emotionally salient moments (positive or negative) that influence future trust, resentment, and decisions.")
+class AgentTurnSchema(BaseModel):
+    emotion_scores: List[float] = Field(..., min_length=8, max_length=8, description="Scores for joy, acceptance, fear, surprise, sadness, disgust, anger and anticipation.")
+    inner_thoughts: str
+    action: str
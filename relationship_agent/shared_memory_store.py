@@ -0,0 +1,164 @@
+import asyncio
+import utils.llm_utils as llm_utils
+from relationship_agent.memory import Memory
+from relationship_agent.memory_index import MemoryIndex
+from relationship_agent.columnar_store import save_columnar_store, load_columnar_store
+
+
+class SharedMemoryStore():
+    def __init__(self, embedding_backend=None, semantic_dtype="float32", capacity=1024, batch_window=0.0) -> None:
+        """
+        One long-term memory store for many agents: every agent's memories are rows of the same columnar
+        MemoryIndex, partitioned by a namespace column (one namespace per agent), instead of one small index per
+        agent. An agent's Memory in the store (see memory()) behaves like its own store: adds, updates, deletes,
+        retrieval, saving and loading only see its namespace.
+
+        Retrievals of many agents can be served together: search_batch() and get_top_memories_batch() score one
+        query per namespace in a single vectorized pass, and get_top_memories_async() gathers the queries that
+        concurrent coroutines issue in the same event loop iteration (or within batch_window seconds) into one
+        such pass.
+
+        Approximate indexes, capacity policies and write-ahead logs are per-agent store features; they are not
+        supported in a shared store.
+
+        Args:
+            embedding_backend: Embedding backend of all the memories (an EmbeddingBackend or a spec string, see
+                utils/llm_utils.py); the default one if None.
+            semantic_dtype (str): "float32", "float16" or "int8" storage of the semantic embeddings (see MemoryIndex).
+            capacity (int): Initial number of rows allocated.
+            batch_window (float): Seconds get_top_memories_async() waits for more queries before searching;
+                0 batches the queries issued in the same event loop iteration only.
+        """
+        self.embedding_backend = llm_utils.resolve_embedding_backend(embedding_backend)
+        self.semantic_dtype = semantic_dtype
+        self.batch_window = batch_window
+        self.index = MemoryIndex(capacity=capacity, semantic_dtype=semantic_dtype)
+        self.index.embedding_backend = self.embedding_backend.name
+        self._memories = {}
+        # Queries waiting for the next batched search, key: (top_k, alpha, filters, has emotion query),
+        # value: [(namespace, query_embedding, query_emotion_embedding, future), ...]
+        self._pending = {}
+        self._flush_handle = None
+
+    def memory(self, namespace):
+        """
+        Returns the Memory of a namespace, created on first use.
+        """
+        memory = self._memories.get(namespace)
+        if memory is None:
+            memory = Memory(shared_store=self, namespace=namespace)
+            self._memories[namespace] = memory
+        return memory
+
+    def namespaces(self):
+        """
+        Returns the namespaces holding memories.
+        """
+        return self.index.values("namespace")
+
+    def __len__(self):
+        return len(self.index)
+
+    def search_batch(self, namespaces, query_embeddings, query_emotion_embeddings=None, top_k=5, alpha=0.7, filters=None):
+        """
+        Scores one query per namespace in one vectorized pass, see MemoryIndex.search_namespaces().
+        Returns one [(score, memory_id), ...] list per query.
+        """
+        return self.index.search_namespaces(namespaces, query_embeddings, query_emotion_embeddings, top_k=top_k, alpha=alpha, filters=filters)
+
+    def get_top_memories_batch(self, namespaces, query_embeddings, query_emotion_embeddings=None, top_k=5, alpha=0.7, memory_type=None, agent=None, scene=None, group=None):
+        """
+        Batched Memory.get_top_memories() across namespaces: query i retrieves from namespaces[i].
+        query_emotion_embeddings: one 8-dim Plutchik vector per query, or None for semantic-only retrieval
+        memory_type, agent, scene, group: optional filters, applied within every namespace.
+        Returns one list of (memory, inner_thoughts) per query.
+        """
+        filters = {"type": memory_type, "agent": agent, "scene": scene, "group": group}
+        filters = {column: value for column, value in filters.items() if value is not None}
+        results = self.search_batch(namespaces, query_embeddings, query_emotion_embeddings, top_k=top_k, alpha=alpha, filters=filters)
+        self.index.touch([memory_id for similarities in results for _, memory_id in similarities])
+        return [[(self.index.texts[self.index.id_rows[memory_id]], self.index.inner_thoughts[self.index.id_rows[memory_id]]) for _, memory_id in similarities]
+                for similarities in results]
+
+    async def get_top_memories_async(self, namespace, query_embedding, query_emotion_embedding=None, top_k=5, alpha=0.7, memory_type=None, agent=None, scene=None, group=None):
+        """
+        Memory.get_top_memories() for one namespace, queued for the next batched search: queries with the same
+        top_k, alpha and filters from every namespace are scored together by get_top_memories_batch().
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        filters = tuple(tuple(value) if isinstance(value, (list, tuple, set)) else value for value in (memory_type, agent, scene, group))
+        key = (top_k, alpha, filters, query_emotion_embedding is not None)
+        self._pending.setdefault(key, []).append((namespace, query_embedding, query_emotion_embedding, future))
+        if self._flush_handle is None:
+            if self.batch_window > 0:
+                self._flush_handle = loop.call_later(self.batch_window, self._flush)
+            else:
+                self._flush_handle = loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        self._flush_handle = None
+        for (top_k, alpha, filters, has_emotion), queries in pending.items():
+            memory_type, agent, scene, group = [list(value) if isinstance(value, tuple) else value for value in filters]
+            try:
+                results = self.get_top_memories_batch(
+                    [namespace for namespace, _, _, _ in queries],
+                    [query_embedding for _, query_embedding, _, _ in queries],
+                    [query_emotion for _, _, query_emotion, _ in queries] if has_emotion else None,
+                    top_k=top_k,
+                    alpha=alpha,
+                    memory_type=memory_type,
+                    agent=agent,
+                    scene=scene,
+                    group=group
+                )
+            except Exception as e:
+                for _, _, _, future in queries:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, _, future), result in zip(queries, results):
+                # Callers may have been cancelled while waiting
+                if not future.done():
+                    future.set_result(result)
+
+    def save(self, path, dtype="float32"):
+        """
+        Saves every namespace as one columnar store directory (see save_columnar_store()).
+        """
+        save_columnar_store(path, self.index, dtype=dtype)
+
+    @classmethod
+    def load(cls, path, embedding_backend=None, semantic_dtype="float32", mmap=True, batch_window=0.0):
+        """
+        Loads a store saved by save(). Raises ValueError if it was embedded with another embedding backend.
+        """
+        store = cls(embedding_backend=embedding_backend, semantic_dtype=semantic_dtype, batch_window=batch_window)
+        index = load_columnar_store(path, mmap=mmap, semantic_dtype=semantic_dtype)
+        if index.embedding_backend is None:
+            index.embedding_backend = store.embedding_backend.name
+        elif index.embedding_backend != store.embedding_backend.name:
+            raise ValueError(f"Memory store was embedded with {index.embedding_backend}, but this store uses {store.embedding_backend.name}")
+        store.index = index
+        return store
+
+
+_shared_memory_store = None
+
+def shared_memory_store():
+    """
+    Returns the process-wide shared memory store, created with the default embedding backend on first use.
+    """
+    global _shared_memory_store
+    if _shared_memory_store is None:
+        _shared_memory_store = SharedMemoryStore()
+    return _shared_memory_store
+
+def set_shared_memory_store(store):
+    """
+    Sets the process-wide shared memory store (a SharedMemoryStore, or None to create a default one on next use).
+    """
+    global _shared_memory_store
+    _shared_memory_store = store
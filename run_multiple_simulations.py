@@ -9,9 +9,10 @@ import json
 from relationship_agent.relationship_agent import RelationshipAgent
 from scene_master.scene_master import SceneMaster
 from simulation.simulation import Simulation
+from simulation.event_sinks import JsonlSink
 import os
 
-async def run_single_simulation(simulation_id, agent1_name, agent1_persona, agent2_name, agent2_persona, num_interactions=3):
+async def run_single_simulation(simulation_id, agent1_name, agent1_persona, agent2_name, agent2_persona, num_interactions=3, scene_library=None, event_sink=None):
     """
     Run a single simulation pipeline asynchronously.
     
@@ -22,6 +23,8 @@ async def run_single_simulation(simulation_id, agent1_name, agent1_persona, agen
         agent2_name: Name of the second agent
         agent2_persona: Persona description of the second agent
         num_interactions: Number of interactions per scene
+        scene_library: Optional SceneStateLibrary shared across simulations to reuse opening scenes
+        event_sink: Sink of the simulation's events (see simulation/event_sinks.py); printed to the terminal if None
     
     Returns:
         dict: Results of the simulation including commitment log
@@ -33,10 +36,10 @@ async def run_single_simulation(simulation_id, agent1_name, agent1_persona, agen
     agent2 = RelationshipAgent(agent2_name, agent2_persona)
     
     # Create scene master
-    scene_master = SceneMaster(agent1, agent2)
+    scene_master = SceneMaster(agent1, agent2, scene_library=scene_library)
     
     # Create simulation
-    simulation = Simulation(scene_master, agent1, agent2)
+    simulation = Simulation(scene_master, agent1, agent2, event_sink=event_sink, simulation_id=simulation_id)
     
     try:
         # Run the simulation asynchronously
@@ -89,6 +92,9 @@ async def run_multiple_simulations_concurrently():
         }
     ]
     
+    # The simulations' events go to one buffered JSONL file instead of interleaving on stdout
+    event_sink = JsonlSink("simulation_results/concurrent_simulation_events.jsonl")
+
     # Create tasks for all simulations
     tasks = []
     for config in simulation_configs:
@@ -98,14 +104,18 @@ async def run_multiple_simulations_concurrently():
             agent1_persona=config["agent1_persona"],
             agent2_name=config["agent2_name"],
             agent2_persona=config["agent2_persona"],
-            num_interactions=2  # Reduced for faster execution
+            num_interactions=2,  # Reduced for faster execution
+            event_sink=event_sink
         )
         tasks.append(task)
     
     print(f"Starting {len(tasks)} simulations concurrently...")
     
     # Run all simulations concurrently and wait for all to complete
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        event_sink.close()
     
     # Process results
     successful_results = []
@@ -138,6 +148,7 @@ async def run_multiple_simulations_concurrently():
         json.dump(output_data, f, indent=2, default=str)
     
     print(f"Results saved to simulation_results/concurrent_simulation_results.json")
+    print(f"Simulation events saved to {event_sink.path}")
     
     return output_data
 
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import random
+from scene_master.schemas.scene_schema import SceneSchema
+
+
+class SceneStateLibrary():
+    def __init__(self, library_path=None, variants_per_key=5, fresh_fraction=0.2, seed=None) -> None:
+        """
+        A reusable library of initialized scene states, keyed by (persona hashes, turning-point category,
+        template version), so experiment sweeps over the same persona pair stop regenerating the same
+        opening scenes.
+
+        Args:
+            library_path (str): Optional JSON file the library is loaded from and saved to.
+            variants_per_key (int): Number of cached variants kept per key.
+            fresh_fraction (float): Fraction of draws that generate a fresh scene even when the key is full.
+            seed (int): Optional seed for reproducible draws.
+        """
+        self.library_path = library_path
+        self.variants_per_key = variants_per_key
+        self.fresh_fraction = fresh_fraction
+        self.rng = random.Random(seed)
+        self.entries = {}  # key: list of scene state dicts
+
+        if library_path is not None and os.path.exists(library_path):
+            with open(library_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def persona_hash(agent):
+        """
+        Hashes the parts of an agent that the opening scene is generated from.
+        """
+        content = json.dumps({"name": agent.name, "persona": agent.persona}, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def template_version(template_content):
+        return hashlib.sha256(template_content.encode("utf-8")).hexdigest()[:12]
+
+    def make_key(self, agent_1, agent_2, category, template_content):
+        """
+        Agents are kept in order, since character_1_goal and character_2_goal belong to agent_1 and agent_2.
+        """
+        return "|".join([
+            self.persona_hash(agent_1),
+            self.persona_hash(agent_2),
+            category,
+            self.template_version(template_content)
+        ])
+
+    def should_generate(self, key):
+        """
+        Returns True if the caller should generate a fresh scene state for this key instead of drawing one.
+        """
+        if len(self.entries.get(key, [])) < self.variants_per_key:
+            return True
+        return self.rng.random() < self.fresh_fraction
+
+    def draw(self, key):
+        """
+        Returns a random cached variant for the key, or None if there is none.
+        """
+        variants = self.entries.get(key)
+        if not variants:
+            return None
+        return SceneSchema(**self.rng.choice(variants))
+
+    def add(self, key, scene_state):
+        """
+        Adds a freshly generated scene state, replacing a random variant once the key is full.
+        """
+        variants = self.entries.setdefault(key, [])
+        if len(variants) < self.variants_per_key:
+            variants.append(scene_state.model_dump())
+        else:
+            variants[self.rng.randrange(len(variants))] = scene_state.model_dump()
+        if self.library_path is not None:
+            self.save()
+
+    def save(self, library_path=None):
+        library_path = library_path or self.library_path
+        directory = os.path.dirname(library_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(library_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
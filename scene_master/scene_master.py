@@ -1,15 +1,18 @@
-from scene_master.schemas.scene_schema import SceneSchema, ActionSchema, ConversationSchema, SceneSummarySchema
+from scene_master.schemas.scene_schema import SceneSchema, ActionSchema, ConversationSchema, SceneSummarySchema, SceneSkeletonSchema
 import utils.general_utils as general_utils
 from utils.llm_utils import model_call_structured, model_call_unstructured, parse_model_json, model_call_structured_async, model_call_unstructured_async
 import json
 import json5
 import os
+import asyncio
 import scene_master.scene_utils as scene_utils
 from relationship_agent.agent_utils import render_j2_template
+from utils.scene_history import SceneHistory
+from utils.context_window import ContextWindow, render_scene_history, prefetch_scene_history
 
 
 class SceneMaster():
-    def __init__(self, agent_1, agent_2) -> None:
+    def __init__(self, agent_1, agent_2, scene_library=None, context_budgets=None) -> None:
 
         turningpoint_order_path = os.path.join(os.path.dirname(__file__), "turningpoint_order.txt")
         with open(turningpoint_order_path, "r", encoding="utf-8") as f:
@@ -41,7 +44,7 @@ class SceneMaster():
             scene_conflict=""
         )
 
-        self.scene_history = []
+        self.scene_history = SceneHistory()
         self.progression = 0
         # if scene_template_path:
         #     if os.path.isdir(scene_template_path):
@@ -59,13 +62,27 @@ class SceneMaster():
         self.total_scenes = len(self.turningpoint_order)
         self.agent_1 = agent_1
         self.agent_2 = agent_2
+
+        # Scene skeletons planned ahead of time by plan_arc_async(), keyed by scene index
+        self.scene_plan = {}
+        # Optional SceneStateLibrary of cached opening scenes shared across simulations
+        self.scene_library = scene_library
+        # Optional token budgets per prompt call site ("progress", "summarize")
+        self.context_windows = {
+            call_site: ContextWindow(budget) for call_site, budget in (context_budgets or {}).items()
+        }
         
 
     def initialize(self):
+        if self.progression in self.scene_plan:
+            self.scene_state = self.refine_scene(self.progression)
+            self.agent_1.set_goal(self.scene_state.character_1_goal)
+            self.agent_2.set_goal(self.scene_state.character_2_goal)
+            return self.scene_state
+
         # INSERT_YOUR_CODE
         turning_points_path = os.path.join(os.path.dirname(__file__), "turing_points.json")
-        with open(turning_points_path, "r", encoding="utf-8") as f:
-            turning_points = json5.load(f)
+        turning_points = scene_utils.load_turning_points(turning_points_path)
         
         template_content = self.prompts['initialize.j2']
 
@@ -74,6 +91,16 @@ class SceneMaster():
         # eligible_scenes = scene_utils.list_to_string(self.scenes_array[self.progression])
         tp_type = self.turningpoint_order[self.progression]
 
+        # Draw a cached opening scene for this persona pair and turning point if the library allows it
+        library_key = None
+        if self.scene_library is not None:
+            library_key = self.scene_library.make_key(self.agent_1, self.agent_2, tp_type, template_content)
+            if not self.scene_library.should_generate(library_key):
+                self.scene_state = self.scene_library.draw(library_key)
+                self.agent_1.set_goal(self.scene_state.character_1_goal)
+                self.agent_2.set_goal(self.scene_state.character_2_goal)
+                return self.scene_state
+
         eligible_scenes = scene_utils.find_scenarios_by_category(turning_points, tp_type)
 
         context_dict = {
@@ -93,6 +120,8 @@ class SceneMaster():
                 response_json = parse_model_json(response)
                 if isinstance(response_json, dict):
                     self.scene_state = SceneSchema(**response_json)
+                    if library_key is not None:
+                        self.scene_library.add(library_key, self.scene_state)
                     self.agent_1.set_goal(self.scene_state.character_1_goal)
                     self.agent_2.set_goal(self.scene_state.character_2_goal)
                     return self.scene_state
@@ -114,10 +143,15 @@ class SceneMaster():
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
     async def initialize_async(self):
+        if self.progression in self.scene_plan:
+            self.scene_state = await self.refine_scene_async(self.progression)
+            self.agent_1.set_goal(self.scene_state.character_1_goal)
+            self.agent_2.set_goal(self.scene_state.character_2_goal)
+            return self.scene_state
+
         # INSERT_YOUR_CODE
         turning_points_path = os.path.join(os.path.dirname(__file__), "turing_points.json")
-        with open(turning_points_path, "r", encoding="utf-8") as f:
-            turning_points = json5.load(f)
+        turning_points = scene_utils.load_turning_points(turning_points_path)
         
         template_content = self.prompts['initialize.j2']
 
@@ -126,6 +160,16 @@ class SceneMaster():
         # eligible_scenes = scene_utils.list_to_string(self.scenes_array[self.progression])
         tp_type = self.turningpoint_order[self.progression]
 
+        # Draw a cached opening scene for this persona pair and turning point if the library allows it
+        library_key = None
+        if self.scene_library is not None:
+            library_key = self.scene_library.make_key(self.agent_1, self.agent_2, tp_type, template_content)
+            if not self.scene_library.should_generate(library_key):
+                self.scene_state = self.scene_library.draw(library_key)
+                self.agent_1.set_goal(self.scene_state.character_1_goal)
+                self.agent_2.set_goal(self.scene_state.character_2_goal)
+                return self.scene_state
+
         eligible_scenes = scene_utils.find_scenarios_by_category(turning_points, tp_type)
 
         context_dict = {
@@ -145,6 +189,8 @@ class SceneMaster():
                 response_json = parse_model_json(response)
                 if isinstance(response_json, dict):
                     self.scene_state = SceneSchema(**response_json)
+                    if library_key is not None:
+                        self.scene_library.add(library_key, self.scene_state)
                     self.agent_1.set_goal(self.scene_state.character_1_goal)
                     self.agent_2.set_goal(self.scene_state.character_2_goal)
                     return self.scene_state
@@ -222,19 +268,30 @@ class SceneMaster():
                     raise
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
-    def progress(self):
+    def render_progress_prompt(self):
+        """
+        Renders the prompt of the next progress call from the current scene history, context window and scene state.
+        """
         template_content = self.prompts['progress_narrative.j2']
 
-        state = self.scene_state.model_dump_json(indent=2)
-
         context_dict = {
             "partner_1": self.agent_1.description,
             "partner_2": self.agent_2.description,
-            "scene_history": general_utils.history_to_str(self.scene_history),
+            "scene_history": render_scene_history(self.context_windows.get("progress"), self.scene_history),
             "scene_conflict": self.scene_state.scene_conflict
         }
 
-        prompt = render_j2_template(template_content, context_dict)
+        return render_j2_template(template_content, context_dict)
+
+    def progress(self, prompt=None):
+        """
+        Generates the next narrative beat of the scene and the character who acts next.
+
+        Args:
+            prompt (str): A prompt rendered by render_progress_prompt(); rendered now if None.
+        """
+        if prompt is None:
+            prompt = self.render_progress_prompt()
         
         # Retry logic for JSON parsing and schema validation
         max_retries = 3
@@ -258,19 +315,12 @@ class SceneMaster():
                     raise
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
-    async def progress_async(self):
-        template_content = self.prompts['progress_narrative.j2']
-
-        state = self.scene_state.model_dump_json(indent=2)
-
-        context_dict = {
-            "partner_1": self.agent_1.description,
-            "partner_2": self.agent_2.description,
-            "scene_history": general_utils.history_to_str(self.scene_history),
-            "scene_conflict": self.scene_state.scene_conflict
-        }
-
-        prompt = render_j2_template(template_content, context_dict)
+    async def progress_async(self, prompt=None):
+        """
+        Async version of progress().
+        """
+        if prompt is None:
+            prompt = self.render_progress_prompt()
         
         # Retry logic for JSON parsing and schema validation
         max_retries = 3
@@ -301,16 +351,21 @@ class SceneMaster():
         else:
             source = type.name
         self.scene_history.append([source, action])
+        # Summarize the rows that fall out of the summary's window while the scene plays, not at its end
+        prefetch_scene_history(self.context_windows.get("summarize"), self.scene_history)
         return [source, action]
     
-    def summarize(self):
-        
+    def summarize(self, scene_history=None):
+        if scene_history is None:
+            scene_history = self.scene_history
+
         prompt_path = os.path.join(os.path.dirname(__file__), "prompts", "update_state.txt")
         with open(prompt_path, "r", encoding="utf-8") as f:
             prompt = f.read()
         state = self.scene_state.model_dump_json(indent=2)
         prompt_filled = prompt.replace("{{scene_state}}", state)
-        scene_hist_str = general_utils.history_to_str(self.scene_history)
+        # The summary covers the whole scene: rows that fell out of the window are summarized by then (see append_to_history())
+        scene_hist_str = render_scene_history(self.context_windows.get("summarize"), scene_history, complete=True)
         prompt_filled = prompt_filled.replace("{{scene_history}}", scene_hist_str)
         
         # Retry logic for JSON parsing and schema validation
@@ -339,14 +394,18 @@ class SceneMaster():
                     raise
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
-    async def summarize_async(self):
-        
+    async def summarize_async(self, scene_history=None):
+        if scene_history is None:
+            scene_history = self.scene_history
+
         prompt_path = os.path.join(os.path.dirname(__file__), "prompts", "update_state.txt")
         with open(prompt_path, "r", encoding="utf-8") as f:
             prompt = f.read()
         state = self.scene_state.model_dump_json(indent=2)
         prompt_filled = prompt.replace("{{scene_state}}", state)
-        scene_hist_str = general_utils.history_to_str(self.scene_history)
+        # The summary covers the whole scene: rows that fell out of the window are summarized by then (see append_to_history());
+        # waiting for a summary still in flight happens off the event loop
+        scene_hist_str = await asyncio.to_thread(render_scene_history, self.context_windows.get("summarize"), scene_history, True)
         prompt_filled = prompt_filled.replace("{{scene_history}}", scene_hist_str)
         
         # Retry logic for JSON parsing and schema validation
@@ -375,10 +434,13 @@ class SceneMaster():
                     raise
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
         
-    def commitment_score(self, summary):
+    def commitment_score(self, summary=None, scene_history=None):
+        if scene_history is None:
+            scene_history = self.scene_history
+
         template_content = self.prompts['commitment.j2']
         context_dict = {
-            "relationship_context": self.scene_history
+            "relationship_context": scene_history
         }
         prompt = render_j2_template(template_content, context_dict)
         
@@ -396,10 +458,13 @@ class SceneMaster():
                     raise
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
-    async def commitment_score_async(self, summary):
+    async def commitment_score_async(self, summary=None, scene_history=None):
+        if scene_history is None:
+            scene_history = self.scene_history
+
         template_content = self.prompts['commitment.j2']
         context_dict = {
-            "relationship_context": self.scene_history
+            "relationship_context": scene_history
         }
         prompt = render_j2_template(template_content, context_dict)
         
@@ -445,24 +510,35 @@ class SceneMaster():
     #         raise ValueError("Response could not be converted to SummarySchema")
 
 
-    def next_scene(self):
-        self.scene_state.current_scene = ''
-        self.scene_state.scene_conflict = ''
-        self.scene_state.character_1_goal = ''
-        self.scene_state.character_2_goal = ''
-        self.scene_history = []
-        self.progression += 1
+    def next_scene(self, previous_summary=None):
+        if self.progression + 1 in self.scene_plan:
+            # The scene was planned ahead, so only the cheap refine call is needed
+            self.scene_state = self.refine_scene(self.progression + 1, previous_summary or "")
+            self.scene_history = SceneHistory()
+            self.progression += 1
+            self.agent_1.set_goal(self.scene_state.character_1_goal)
+            self.agent_2.set_goal(self.scene_state.character_2_goal)
+            return self.scene_state
+
+        # Work on a cleared copy of the state and only commit it once the new scene is generated,
+        # so the finished scene's state and history stay readable while this call is in flight
+        cleared_state = self.scene_state.model_copy(update={
+            "current_scene": '',
+            "scene_conflict": '',
+            "character_1_goal": '',
+            "character_2_goal": ''
+        })
+        next_progression = self.progression + 1
 
         turning_points_path = os.path.join(os.path.dirname(__file__), "turing_points.json")
-        with open(turning_points_path, "r", encoding="utf-8") as f:
-            turning_points = json5.load(f)
+        turning_points = scene_utils.load_turning_points(turning_points_path)
         
         template_content = self.prompts['next_scene.j2']
 
-        state = self.scene_state.model_dump_json(indent=2)
+        state = cleared_state.model_dump_json(indent=2)
 
         # eligible_scenes = scene_utils.list_to_string(self.scenes_array[self.progression])
-        tp_type = self.turningpoint_order[self.progression]
+        tp_type = self.turningpoint_order[next_progression]
 
         eligible_scenes = scene_utils.find_scenarios_by_category(turning_points, tp_type)
 
@@ -483,6 +559,8 @@ class SceneMaster():
                 response_json = parse_model_json(response)
                 if isinstance(response_json, dict):
                     self.scene_state = SceneSchema(**response_json)
+                    self.scene_history = SceneHistory()
+                    self.progression = next_progression
                     self.agent_1.set_goal(self.scene_state.character_1_goal)
                     self.agent_2.set_goal(self.scene_state.character_2_goal)
                     return self.scene_state
@@ -503,24 +581,35 @@ class SceneMaster():
                     raise
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
 
-    async def next_scene_async(self):
-        self.scene_state.current_scene = ''
-        self.scene_state.scene_conflict = ''
-        self.scene_state.character_1_goal = ''
-        self.scene_state.character_2_goal = ''
-        self.scene_history = []
-        self.progression += 1
+    async def next_scene_async(self, previous_summary=None):
+        if self.progression + 1 in self.scene_plan:
+            # The scene was planned ahead, so only the cheap refine call is needed
+            self.scene_state = await self.refine_scene_async(self.progression + 1, previous_summary or "")
+            self.scene_history = SceneHistory()
+            self.progression += 1
+            self.agent_1.set_goal(self.scene_state.character_1_goal)
+            self.agent_2.set_goal(self.scene_state.character_2_goal)
+            return self.scene_state
+
+        # Work on a cleared copy of the state and only commit it once the new scene is generated,
+        # so the finished scene's state and history stay readable while this call is in flight
+        cleared_state = self.scene_state.model_copy(update={
+            "current_scene": '',
+            "scene_conflict": '',
+            "character_1_goal": '',
+            "character_2_goal": ''
+        })
+        next_progression = self.progression + 1
 
         turning_points_path = os.path.join(os.path.dirname(__file__), "turing_points.json")
-        with open(turning_points_path, "r", encoding="utf-8") as f:
-            turning_points = json5.load(f)
+        turning_points = scene_utils.load_turning_points(turning_points_path)
         
         template_content = self.prompts['next_scene.j2']
 
-        state = self.scene_state.model_dump_json(indent=2)
+        state = cleared_state.model_dump_json(indent=2)
 
         # eligible_scenes = scene_utils.list_to_string(self.scenes_array[self.progression])
-        tp_type = self.turningpoint_order[self.progression]
+        tp_type = self.turningpoint_order[next_progression]
 
         eligible_scenes = scene_utils.find_scenarios_by_category(turning_points, tp_type)
 
@@ -541,6 +630,8 @@ class SceneMaster():
                 response_json = parse_model_json(response)
                 if isinstance(response_json, dict):
                     self.scene_state = SceneSchema(**response_json)
+                    self.scene_history = SceneHistory()
+                    self.progression = next_progression
                     self.agent_1.set_goal(self.scene_state.character_1_goal)
                     self.agent_2.set_goal(self.scene_state.character_2_goal)
                     return self.scene_state
@@ -560,3 +651,146 @@ class SceneMaster():
                     print(f"Raw response: {response}")
                     raise
                 print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+    async def plan_scene_async(self, scene_index):
+        """
+        Generates the skeleton (setting, conflict and goals) of the scene at scene_index.
+        """
+        turning_points_path = os.path.join(os.path.dirname(__file__), "turing_points.json")
+        turning_points = scene_utils.load_turning_points(turning_points_path)
+
+        template_content = self.prompts['plan_scene.j2']
+
+        tp_type = self.turningpoint_order[scene_index]
+
+        eligible_scenes = scene_utils.find_scenarios_by_category(turning_points, tp_type)
+
+        context_dict = {
+            "arc": self.turningpoint_order,
+            "scene_index": scene_index,
+            "eligible_scenes": eligible_scenes,
+            "partner_1": self.agent_1.description,
+            "partner_2": self.agent_2.description
+        }
+
+        prompt = render_j2_template(template_content, context_dict)
+
+        # Retry logic for JSON parsing and schema validation
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                response = await model_call_unstructured_async('', user_message=prompt)
+                response_json = parse_model_json(response)
+                if isinstance(response_json, dict):
+                    return SceneSkeletonSchema(**response_json)
+                else:
+                    raise ValueError("Response could not be converted to SceneSkeletonSchema")
+            except (ValueError, TypeError) as e:
+                # Schema validation error
+                if attempt == max_retries - 1:
+                    print(f"Failed to validate schema after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    raise
+                print(f"Attempt {attempt + 1} failed (schema validation), retrying... Error: {e}")
+            except Exception as e:
+                # Other errors (JSON parsing, network, etc.)
+                if attempt == max_retries - 1:
+                    print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    raise
+                print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+    async def plan_arc_async(self):
+        """
+        Plans the skeletons of all remaining scenes concurrently. Once planned, initialize() and
+        next_scene() only need a cheap refine call that conditions the skeleton on the previous summary.
+        """
+        scene_indices = range(self.progression, self.total_scenes)
+        skeletons = await asyncio.gather(*[self.plan_scene_async(i) for i in scene_indices])
+        self.scene_plan.update(zip(scene_indices, skeletons))
+        return self.scene_plan
+
+    def refine_scene(self, scene_index, previous_summary=""):
+        """
+        Turns the planned skeleton of scene_index into a full scene state, conditioned on the previous summary.
+        """
+        skeleton = self.scene_plan[scene_index]
+        prompt = self._render_refine_prompt(skeleton, previous_summary)
+
+        # Retry logic for JSON parsing and schema validation
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                response = model_call_unstructured('', user_message=prompt)
+                response_json = parse_model_json(response)
+                if isinstance(response_json, dict):
+                    return self._refined_scene_state(scene_index, skeleton, response_json, previous_summary)
+                else:
+                    raise ValueError("Response could not be converted to SceneSchema")
+            except (ValueError, TypeError) as e:
+                # Schema validation error
+                if attempt == max_retries - 1:
+                    print(f"Failed to validate schema after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    raise
+                print(f"Attempt {attempt + 1} failed (schema validation), retrying... Error: {e}")
+            except Exception as e:
+                # Other errors (JSON parsing, network, etc.)
+                if attempt == max_retries - 1:
+                    print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    raise
+                print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+    async def refine_scene_async(self, scene_index, previous_summary=""):
+        """
+        Async version of refine_scene().
+        """
+        skeleton = self.scene_plan[scene_index]
+        prompt = self._render_refine_prompt(skeleton, previous_summary)
+
+        # Retry logic for JSON parsing and schema validation
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                response = await model_call_unstructured_async('', user_message=prompt)
+                response_json = parse_model_json(response)
+                if isinstance(response_json, dict):
+                    return self._refined_scene_state(scene_index, skeleton, response_json, previous_summary)
+                else:
+                    raise ValueError("Response could not be converted to SceneSchema")
+            except (ValueError, TypeError) as e:
+                # Schema validation error
+                if attempt == max_retries - 1:
+                    print(f"Failed to validate schema after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    raise
+                print(f"Attempt {attempt + 1} failed (schema validation), retrying... Error: {e}")
+            except Exception as e:
+                # Other errors (JSON parsing, network, etc.)
+                if attempt == max_retries - 1:
+                    print(f"Failed to parse LLM response after {max_retries} attempts: {e}")
+                    print(f"Raw response: {response}")
+                    raise
+                print(f"Attempt {attempt + 1} failed, retrying... Error: {e}")
+
+    def _render_refine_prompt(self, skeleton, previous_summary):
+        context_dict = {
+            "partner_1_name": self.agent_1.name,
+            "partner_2_name": self.agent_2.name,
+            "skeleton": skeleton.model_dump_json(indent=2),
+            "previous_summary": previous_summary or "This is the first scene."
+        }
+        return render_j2_template(self.prompts['refine_scene.j2'], context_dict)
+
+    def _refined_scene_state(self, scene_index, skeleton, response_json, previous_summary):
+        return SceneSchema(
+            theme=self.turningpoint_order[scene_index],
+            setting=skeleton.setting,
+            NPC=skeleton.NPC,
+            current_scene=response_json["current_scene"],
+            previous_summary=previous_summary,
+            character_1_goal=response_json.get("character_1_goal") or skeleton.character_1_goal,
+            character_2_goal=response_json.get("character_2_goal") or skeleton.character_2_goal,
+            scene_conflict=skeleton.scene_conflict
+        )
@@ -27,6 +27,23 @@ from typing import Iterable, List, Dict, Union
 Scenario = Dict[str, object]
 
 import random
+import json
+import json5
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def load_turning_points(turning_points_path):
+    """
+    Loads the turning point scenarios once per process.
+    The file is large, so it is parsed with the strict JSON parser and only falls back to json5
+    if needed. Callers must treat the returned list as read-only.
+    """
+    with open(turning_points_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return json5.loads(content)
 
 def find_scenarios_by_category(
     scenarios: Iterable[Scenario],
@@ -19,4 +19,10 @@ class ConversationSchema(BaseModel):
     first_character_to_speak: str
 
 class SceneSummarySchema(BaseModel):
-    summary: str
\ No newline at end of file
+    summary: str
+class SceneSkeletonSchema(BaseModel):
+    setting: str
+    NPC: list[str]
+    scene_conflict: str
+    character_1_goal: str
+    character_2_goal: str
@@ -0,0 +1,243 @@
+import asyncio
+import time
+from simulation import simulation_utils
+from simulation.pipeline import PipelineStep, run_pipeline
+from simulation.speculation import SpeculativeProgress
+
+# Kinds of events emitted by SimulationEngine, in the order they occur
+EVENT_KINDS = ("simulation_start", "scene_start", "narrative", "appraisal", "action", "summary", "commitment", "simulation_end", "error")
+# Level of each kind of event, for filtering in event sinks (see simulation/event_sinks.py)
+EVENT_LEVELS = {"appraisal": "debug", "error": "error"}
+
+
+class SimulationEvent():
+    def __init__(self, kind, content=None, scene=None, turn=None, agent=None, agent_index=0, data=None, simulation_id=None) -> None:
+        """
+        A structured event of a running simulation.
+
+        Args:
+            kind (str): One of EVENT_KINDS.
+            content (str): The event's text: the theme, a narrative, inner thoughts, an action, a summary,
+                the commitment reasoning or an error message.
+            scene (int): Scene number, starting at 1.
+            turn (int): Interaction number within the scene, starting at 1.
+            agent (str): Name of the agent the event is about, None for the scene master.
+            agent_index (int): 0 for the scene master, 1 or 2 for the agents.
+            data (dict): Kind-specific fields, e.g. emotion_scores of an appraisal.
+            simulation_id (str): Id of the simulation that emitted the event.
+        """
+        self.kind = kind
+        # "debug", "info" or "error", see EVENT_LEVELS
+        self.level = EVENT_LEVELS.get(kind, "info")
+        self.simulation_id = simulation_id
+        self.content = content
+        self.scene = scene
+        self.turn = turn
+        self.agent = agent
+        self.agent_index = agent_index
+        self.data = data or {}
+        self.timestamp = time.time()
+
+    def to_dict(self):
+        return {
+            "simulation_id": self.simulation_id,
+            "kind": self.kind,
+            "level": self.level,
+            "content": self.content,
+            "scene": self.scene,
+            "turn": self.turn,
+            "agent": self.agent,
+            "agent_index": self.agent_index,
+            "data": self.data,
+            "timestamp": self.timestamp
+        }
+
+    def __repr__(self):
+        return f"SimulationEvent({self.kind!r}, scene={self.scene}, turn={self.turn}, agent={self.agent!r})"
+
+
+class SimulationEngine():
+    def __init__(self, simulation) -> None:
+        """
+        The turn loop of a Simulation, as async generators of SimulationEvents. Every way of running a
+        simulation (Simulation.run_auto/run_auto_async/run_scene_by_scene, the batch runner and the web
+        endpoints in app.py) consumes these events, so the loop and its optimizations (fused turns, memory
+        prefetch, speculative progression, the scene transition pipeline) live in one place.
+
+        The engine reads and updates the simulation's state: sm_action, commitment_log and speculation_log.
+        Events are stamped with the simulation's simulation_id.
+
+        Args:
+            simulation (Simulation): The simulation to run.
+        """
+        self.simulation = simulation
+
+    async def run(self, num_interactions_per_scene):
+        """
+        Runs every remaining scene with a fixed number of interactions per scene, then the scene transition.
+        """
+        sim = self.simulation
+        scene_master = sim.scene_master
+        yield self._event("simulation_start", "Theme: " + simulation_utils.snake_to_title(scene_master.scene_state.theme))
+        await self.start()
+        for scene_index in range(scene_master.progression, scene_master.total_scenes):
+            async for event in self.run_scene(num_interactions_per_scene):
+                yield event
+            async for event in self.end_scene(scene_index):
+                yield event
+        yield self._event("simulation_end", data={"commitment_log": sim.commitment_log})
+
+    async def start(self):
+        """
+        Initializes the first scene, or restores the scene master action of a loaded simulation.
+        """
+        sim = self.simulation
+        if not sim.from_save:
+            if sim.plan_arc:
+                await sim.scene_master.plan_arc_async()
+            sim.sm_action = await sim.scene_master.initialize_async()
+        else:
+            sim.sm_action = sim.scene_master.scene_state
+
+    async def run_scene(self, num_interactions):
+        """
+        Runs the current scene with num_interactions agent interactions.
+        """
+        sim = self.simulation
+        scene_master = sim.scene_master
+        scene = scene_master.progression + 1
+        # Add the scene conflict to both agents' working memory
+        sim.agent_1.add_to_working_memory(text = scene_master.scene_state.scene_conflict, memory_type = "Scene Conflict")
+        sim.agent_2.add_to_working_memory(text = scene_master.scene_state.scene_conflict, memory_type = "Scene Conflict")
+        # Add the current scene to the scene history and agents' memory
+        scene_master.append_to_history(0, sim.sm_action.current_scene)
+        sim.agent_1.add_to_working_memory(text = sim.sm_action.current_scene, memory_type = "Narrative")
+        sim.agent_2.add_to_working_memory(text = sim.sm_action.current_scene, memory_type = "Narrative")
+        yield self._event("scene_start", sim.sm_action.current_scene, scene=scene, data={"conflict": scene_master.scene_state.scene_conflict})
+
+        speculation = SpeculativeProgress(scene_master) if sim.speculative else None
+        try:
+            for action_index in range(num_interactions):
+                async for event in self._run_turn(scene, action_index, num_interactions, speculation):
+                    yield event
+        finally:
+            if speculation is not None:
+                speculation.cancel()
+                sim.speculation_log.extend(speculation.turn_log)
+
+    async def _run_turn(self, scene, action_index, num_interactions, speculation):
+        sim = self.simulation
+        scene_master = sim.scene_master
+        turn = action_index + 1
+        # Progress the scene and get the next narrative/action
+        if speculation is not None:
+            sim.sm_action = await speculation.next_action()
+        else:
+            sim.sm_action = await scene_master.progress_async()
+        scene_master.append_to_history(0, sim.sm_action.narrative)
+        # Determine which agent acts next based on character_uuid
+        if sim.sm_action.character_uuid == sim.agent_1.agent_id:
+            curr_agent, other_agent, agent_ind = sim.agent_1, sim.agent_2, 1
+        elif sim.sm_action.character_uuid == sim.agent_2.agent_id:
+            curr_agent, other_agent, agent_ind = sim.agent_2, sim.agent_1, 2
+        else:
+            yield self._event("narrative", sim.sm_action.narrative, scene=scene, turn=turn)
+            yield self._event("error", f"Unknown character_uuid: {sim.sm_action.character_uuid}", scene=scene, turn=turn)
+            return
+        yield self._event("narrative", sim.sm_action.narrative, scene=scene, turn=turn, data={"next_agent": curr_agent.name, "next_agent_index": agent_ind})
+
+        if sim.fused_turns:
+            # Agent appraises the scene and chooses its action in one call
+            agent_appraisal, agent_action = await curr_agent.appraise_and_choose_async(sim.sm_action.narrative)
+            yield self._appraisal_event(agent_appraisal, scene, turn, curr_agent, agent_ind)
+        else:
+            # Long-term memory retrieval for make_choices overlaps with the appraisal
+            curr_agent.prefetch_memories(sim.sm_action.narrative)
+            # Agent appraises the current scene history
+            agent_appraisal = await curr_agent.appraise_async(scene_master.scene_history)
+            yield self._appraisal_event(agent_appraisal, scene, turn, curr_agent, agent_ind)
+            # Agent makes a choice/action
+            agent_action = await curr_agent.make_choices_async(sim.sm_action.narrative, appraisal=agent_appraisal)
+        # Append the agent's action to the scene history
+        scene_master.append_to_history(curr_agent, agent_action["action"])
+        # The next narrative only depends on the scene history, so start it before the remaining bookkeeping
+        if speculation is not None and action_index < num_interactions - 1:
+            speculation.start()
+        yield self._event("action", agent_action["action"], scene=scene, turn=turn, agent=curr_agent.name, agent_index=agent_ind)
+
+        # Post-turn work: the other agent appraises the action it just witnessed
+        partner_appraisal = None
+        if sim.partner_appraisal:
+            partner_appraisal = await other_agent.appraise_partner_action_async(scene_master.scene_history)
+            # None when the appraisal could not be parsed; the turn goes on without it
+            if partner_appraisal is not None:
+                yield self._appraisal_event(partner_appraisal, scene, turn, other_agent, 3 - agent_ind, partner=True)
+        # Add the agent's action to both agents' working memory
+        narrative_with_action = simulation_utils.combine_narrative_action(sim.sm_action.narrative, agent_name=curr_agent.name, action=agent_action['action'])
+        curr_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory", emotion_embedding=agent_appraisal["emotion_scores"], inner_thoughts=agent_appraisal["inner_thoughts"])
+        if partner_appraisal is not None:
+            other_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory", emotion_embedding=partner_appraisal["emotion_scores"], inner_thoughts=partner_appraisal["inner_thoughts"])
+        else:
+            other_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory")
+
+    def _event(self, kind, content=None, **fields):
+        return SimulationEvent(kind, content, simulation_id=self.simulation.simulation_id, **fields)
+
+    def _appraisal_event(self, appraisal, scene, turn, agent, agent_ind, partner=False):
+        return self._event(
+            "appraisal",
+            appraisal.get("inner_thoughts"),
+            scene=scene,
+            turn=turn,
+            agent=agent.name,
+            agent_index=agent_ind,
+            data={"emotion_scores": appraisal.get("emotion_scores"), "partner": partner}
+        )
+
+    async def end_scene(self, scene_index):
+        """
+        Runs the scene transition as a dependency-aware pipeline: the summary, the commitment score and
+        the next scene only depend on the finished scene, so they are generated concurrently.
+        If the next scene was planned ahead, its refine call waits for the summary instead.
+        """
+        sim = self.simulation
+        scene_master = sim.scene_master
+        # Snapshot the finished scene so every step reads the same history
+        scene_history = scene_master.scene_history.copy()
+
+        steps = [
+            PipelineStep("summary", lambda: scene_master.summarize_async(scene_history)),
+            PipelineStep("commitment", lambda: scene_master.commitment_score_async(scene_history=scene_history)),
+        ]
+        if scene_index + 1 in scene_master.scene_plan:
+            # A planned scene only needs a cheap refine call, conditioned on the summary: it runs after the summary
+            # (one extra short round-trip) so that the next scene continues from how this one ended
+            steps.append(PipelineStep("next_scene", lambda summary: scene_master.next_scene_async(previous_summary=summary.summary), depends_on=["summary"]))
+        elif scene_index < scene_master.total_scenes - 1:
+            steps.append(PipelineStep("next_scene", scene_master.next_scene_async))
+
+        results = await run_pipeline(steps)
+        summary = results["summary"]
+        commit_score = results["commitment"]
+        sim.log_commitment(scene_index, summary.summary, commit_score["reasoning"], commit_score["commitment_score"])
+        if "next_scene" in results:
+            sim.sm_action = results["next_scene"]
+        yield self._event("summary", summary.summary, scene=scene_index + 1, data={"summary": summary})
+        yield self._event("commitment", commit_score["reasoning"], scene=scene_index + 1, data={"commitment_score": commit_score["commitment_score"], "result": commit_score})
+
+
+def iterate_events(events):
+    """
+    Iterates an async generator of events from synchronous code (e.g. a Flask view or the CLI) on a private
+    event loop, yielding each event as soon as it is emitted.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(events.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(events.aclose())
+        loop.close()
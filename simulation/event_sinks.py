@@ -0,0 +1,215 @@
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import zlib
+from simulation.simulation_utils import format_event
+
+LEVELS = {"debug": 10, "info": 20, "error": 40}
+
+
+def _to_json(value):
+    # Event data may hold pydantic models (e.g. the scene summary)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+class EventSink():
+    def __init__(self, level="info", sample_rate=1.0) -> None:
+        """
+        Receives the SimulationEvents (see simulation/engine.py) of one or many simulations. Subclasses
+        implement write(); emit() only passes on the events the sink accepts:
+            level        events below this level ("debug", "info" or "error") are dropped, e.g. appraisals
+                         (debug) at the default "info"
+            sample_rate  fraction of turns kept: the narrative, appraisal and action events of a turn are kept
+                         or dropped together. Scene-level events and errors are always kept.
+
+        Args:
+            level (str): Lowest level written.
+            sample_rate (float): Fraction of turns written, between 0 and 1.
+        """
+        self.level = LEVELS[level]
+        self.sample_rate = sample_rate
+        # Makes each sink sample its own turns
+        self._salt = random.getrandbits(32)
+
+    def accepts(self, event):
+        level = LEVELS[event.level]
+        if level < self.level:
+            return False
+        if self.sample_rate >= 1 or event.turn is None or level >= LEVELS["error"]:
+            return True
+        key = f"{self._salt}:{event.simulation_id}:{event.scene}:{event.turn}".encode()
+        return zlib.crc32(key) < self.sample_rate * 2**32
+
+    def emit(self, event):
+        if self.accepts(event):
+            self.write(event)
+
+    def write(self, event):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class NullSink(EventSink):
+    """
+    Drops every event, for batch runs that only need the simulation results.
+    """
+    def emit(self, event):
+        pass
+
+
+class TerminalSink(EventSink):
+    def __init__(self, stream=None, level="info", sample_rate=1.0) -> None:
+        """
+        Pretty-prints events as the CLI always has (see format_event()). Each event is written with a single
+        write call under a lock, so the lines of concurrent simulations never interleave within an event.
+
+        Args:
+            stream: Text stream to write to; sys.stdout if None.
+        """
+        super().__init__(level=level, sample_rate=sample_rate)
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, event):
+        text = format_event(event)
+        if not text:
+            return
+        stream = self.stream or sys.stdout
+        with self._lock:
+            stream.write(text + "\n")
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
+
+
+class JsonlSink(EventSink):
+    def __init__(self, path, level="info", sample_rate=1.0, buffer_events=512) -> None:
+        """
+        Appends events to a JSON Lines file, one event dict (SimulationEvent.to_dict()) per line. Events are
+        serialized when emitted but buffered and written buffer_events at a time, so many concurrent
+        simulations can share one sink at the cost of a write call per buffer.
+
+        Args:
+            path (str): File to append to; its directory is created if needed.
+            buffer_events (int): Events buffered before they are written.
+        """
+        super().__init__(level=level, sample_rate=sample_rate)
+        self.path = path
+        self.buffer_events = buffer_events
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, event):
+        line = json.dumps(event.to_dict(), ensure_ascii=False, default=_to_json)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.buffer_events:
+                self._write_buffer()
+
+    def flush(self):
+        with self._lock:
+            self._write_buffer()
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write_buffer(self):
+        if not self._buffer:
+            return
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._buffer = []
+
+
+class QueueSink(EventSink):
+    # Put on the queue by close(); iteration stops there
+    CLOSED = object()
+
+    def __init__(self, maxsize=0, level="debug", sample_rate=1.0) -> None:
+        """
+        Hands events to another thread through a thread-safe queue, e.g. from a simulation running in the
+        background to a web request streaming them. emit() never blocks: when a bounded queue is full, the
+        oldest event is dropped. Iterating the sink yields the events until close() is called.
+
+        Args:
+            maxsize (int): Events held at most; unbounded if 0.
+        """
+        super().__init__(level=level, sample_rate=sample_rate)
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def write(self, event):
+        self._put(event)
+
+    def close(self):
+        self._put(self.CLOSED)
+
+    def _put(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """
+        Returns the next event, or None once the sink is closed. Raises queue.Empty after timeout seconds.
+        """
+        item = self.queue.get(timeout=timeout)
+        if item is self.CLOSED:
+            # Later get() calls see the end too
+            self._put(self.CLOSED)
+            return None
+        return item
+
+    def __iter__(self):
+        while True:
+            event = self.get()
+            if event is None:
+                return
+            yield event
+
+
+class FanoutSink(EventSink):
+    def __init__(self, *sinks) -> None:
+        """
+        Passes every event to several sinks, each applying its own level and sampling.
+        """
+        super().__init__(level="debug")
+        self.sinks = sinks
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,50 @@
+import asyncio
+
+
+class PipelineStep():
+    def __init__(self, name, func, depends_on=()) -> None:
+        """
+        A single step of an async pipeline.
+
+        Args:
+            name (str): Unique name of the step. Its result is passed to dependent steps under this name.
+            func (callable): Async function called with the results of its dependencies as keyword arguments.
+            depends_on (iterable): Names of the steps that must finish before this one starts.
+        """
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+
+async def run_pipeline(steps):
+    """
+    Runs a list of PipelineSteps concurrently, starting each step as soon as its dependencies have finished.
+    Steps may only depend on steps listed before them, which keeps the pipeline acyclic.
+    If any step fails, the remaining steps are cancelled and the exception is raised.
+
+    Returns:
+        dict: Mapping of step name to the step's result.
+    """
+    tasks = {}
+    for step in steps:
+        if step.name in tasks:
+            raise ValueError(f"Duplicate pipeline step: {step.name}")
+        for dep in step.depends_on:
+            if dep not in tasks:
+                raise ValueError(f"Step '{step.name}' depends on unknown or later step '{dep}'")
+        tasks[step.name] = asyncio.ensure_future(_run_step(step, tasks))
+
+    try:
+        results = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    return dict(zip(tasks.keys(), results))
+
+
+async def _run_step(step, tasks):
+    dep_results = {}
+    for dep in step.depends_on:
+        dep_results[dep] = await tasks[dep]
+    return await step.func(**dep_results)
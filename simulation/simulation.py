@@ -1,17 +1,34 @@
 # from scene_master.scene_master import SceneMaster
 from relationship_agent.relationship_agent import RelationshipAgent
-from simulation import simulation_utils
-import utils.general_utils as utils
-from simulation.simulation_utils import print_separator, print_formatted, print_scene_separator
+from simulation.event_sinks import TerminalSink
+from simulation.engine import SimulationEngine, iterate_events
+from utils.scene_history import SceneHistory
 import os
 import json
 import asyncio
+import uuid
 
 class Simulation():
-    def __init__(self, scene_master, agent_1, agent_2) -> None:
+    def __init__(self, scene_master, agent_1, agent_2, fused_turns=False, speculative=False, partner_appraisal=False, plan_arc=False, event_sink=None, simulation_id=None) -> None:
 
         self.commitment_log = []
 
+        # Receives the simulation's events (see simulation/event_sinks.py); pretty-printed to the terminal by default.
+        # Concurrent simulations can share one sink, their events tell them apart by simulation_id.
+        self.event_sink = event_sink if event_sink is not None else TerminalSink()
+        self.simulation_id = simulation_id or str(uuid.uuid4())
+
+        # Opt-in: appraise and act with a single LLM call per agent turn instead of two
+        self.fused_turns = fused_turns
+        # Opt-in: start the next scene master narrative while the current turn is wrapped up
+        self.speculative = speculative
+        # Opt-in: the other agent appraises each action it witnesses
+        self.partner_appraisal = partner_appraisal
+        # Per-turn record of speculative progress calls and the wall-clock time they saved
+        self.speculation_log = []
+        # Opt-in: plan all scene skeletons concurrently before the first scene
+        self.plan_arc = plan_arc
+
         # Initialize the Simulation with a scene master and two agents
         self.scene_master = scene_master
         self.agent_1 = agent_1
@@ -20,194 +37,78 @@ class Simulation():
         # Flag to indicate if simulation is loaded from a save file
         self.from_save = False
 
+    def events(self, num_interactions_per_scene):
+        """
+        Returns an async generator of the SimulationEvents of running all remaining scenes automatically,
+        with a fixed number of interactions per scene (see simulation/engine.py).
+        """
+        return SimulationEngine(self).run(num_interactions_per_scene)
+
     def run_auto(self, num_interactions_per_scene):
         """
         Runs the simulation automatically for all scenes, with a fixed number of interactions per scene.
         """
-        
-        print_formatted(0, "Theme: " + simulation_utils.snake_to_title(self.scene_master.scene_state.theme))
-
-        # Setup: initialize or restore the scene master action
-        if not self.from_save:
-            self.sm_action = self.scene_master.initialize()
-        else:
-            self.sm_action = self.scene_master.scene_state
-            
-        # Main loop over scenes
-        start_ind = self.scene_master.progression
-
-        for scene_index in range(start_ind, self.scene_master.total_scenes):
-            print_scene_separator(scene_index + 1)
-            print_formatted(0, "Scene Conflict: " + self.scene_master.scene_state.scene_conflict)
-            self.run_scene(num_interactions_per_scene)
-            if scene_index == self.scene_master.total_scenes:
-                print("Simulation Ended")
-                return self.commitment_log
-            summary = self.scene_master.summarize()
-            commit_score = self.scene_master.commitment_score(summary)
-            print(summary)
-            print(commit_score)
-            self.log_commitment(scene_index, summary.summary, commit_score["reasoning"], commit_score["commitment_score"])
-            if scene_index < self.scene_master.total_scenes - 1:
-                self.sm_action = self.scene_master.next_scene()
+        try:
+            for event in iterate_events(self.events(num_interactions_per_scene)):
+                self.event_sink.emit(event)
+        finally:
+            self.event_sink.flush()
+        return self.commitment_log
 
     async def run_auto_async(self, num_interactions_per_scene):
         """
         Runs the simulation automatically for all scenes asynchronously, with a fixed number of interactions per scene.
         """
-        
-        print_formatted(0, "Theme: " + simulation_utils.snake_to_title(self.scene_master.scene_state.theme))
-
-        # Setup: initialize or restore the scene master action
-        if not self.from_save:
-            self.sm_action = await self.scene_master.initialize_async()
-        else:
-            self.sm_action = self.scene_master.scene_state
-            
-        # Main loop over scenes
-        start_ind = self.scene_master.progression
+        try:
+            async for event in self.events(num_interactions_per_scene):
+                self.event_sink.emit(event)
+        finally:
+            self.event_sink.flush()
+        return self.commitment_log
 
-        for scene_index in range(start_ind, self.scene_master.total_scenes):
-            print_scene_separator(scene_index + 1)
-            print_formatted(0, "Scene Conflict: " + self.scene_master.scene_state.scene_conflict)
-            await self.run_scene_async(num_interactions_per_scene)
-            if scene_index == self.scene_master.total_scenes:
-                print("Simulation Ended")
-                return self.commitment_log
-            summary = await self.scene_master.summarize_async()
-            commit_score = await self.scene_master.commitment_score_async(summary)
-            print(summary)
-            print(commit_score)
-            self.log_commitment(scene_index, summary.summary, commit_score["reasoning"], commit_score["commitment_score"])
-            if scene_index < self.scene_master.total_scenes - 1:
-                self.sm_action = await self.scene_master.next_scene_async()
+    async def end_scene_async(self, scene_index):
+        """
+        Runs the scene transition (summary, commitment score and next scene, concurrently, see
+        SimulationEngine.end_scene) and returns its events.
+        """
+        events = []
+        async for event in SimulationEngine(self).end_scene(scene_index):
+            self.event_sink.emit(event)
+            events.append(event)
+        return events
 
     def run_scene(self, num_interactions):
         """
         Runs a single scene with a specified number of agent interactions.
         """
-        # Add the scene conflict to both agents' working memory
-        self.agent_1.add_to_working_memory(text = self.scene_master.scene_state.scene_conflict, memory_type = "Scene Conflict")
-        self.agent_2.add_to_working_memory(text = self.scene_master.scene_state.scene_conflict, memory_type = "Scene Conflict")
-        # Add the current scene to the scene history and agents' memory
-        self.scene_master.append_to_history(0, self.sm_action.current_scene)
-        self.agent_1.add_to_working_memory(text = self.sm_action.current_scene, memory_type = "Narrative")
-        self.agent_2.add_to_working_memory(text = self.sm_action.current_scene, memory_type = "Narrative")
-        print_formatted(0, "[Scene Master]")
-        print_formatted(0, self.sm_action.current_scene)
-        # Loop for each interaction in the scene
-        for action_index in range(num_interactions):
-            print_separator()
-            # Progress the scene and get the next narrative/action
-            self.sm_action = self.scene_master.progress()
-            self.scene_master.append_to_history(0, self.sm_action.narrative)
-            print_formatted(0, "[Scene Master:]")
-            print_formatted(0, self.sm_action.narrative)
-            print_separator()
-            # Determine which agent acts next based on character_uuid
-            if self.sm_action.character_uuid == self.agent_1.agent_id:
-                curr_agent = self.agent_1
-                other_agent = self.agent_2
-                agent_ind = 1
-            elif self.sm_action.character_uuid == self.agent_2.agent_id:
-                curr_agent = self.agent_2
-                other_agent = self.agent_1
-                agent_ind = 2
-            # Agent appraises the current scene history
-            agent_appraisal = curr_agent.appraise(self.scene_master.scene_history)
-            # Add the narrative and agent's reflection to working memory
-            # curr_agent.add_to_working_memory(
-            #     text=self.sm_action.narrative,
-            #     emotion_embedding=agent_reflection["emotion_scores"],
-            #     inner_thoughts=agent_reflection["inner_thoughts"],
-            #     memory_type = "Narrative"
-            # )
-            # other_agent.add_to_working_memory(text=self.sm_action.narrative, memory_type = "Narrative")
-            # Agent makes a choice/action
-            agent_action = curr_agent.make_choices(self.sm_action.narrative, appraisal=agent_appraisal)
-            # Add the agent's action to both agents' working memory
-            narrative_with_action = simulation_utils.combine_narrative_action(self.sm_action.narrative, agent_name=curr_agent.name, action=agent_action['action'])
-            curr_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory", emotion_embedding=agent_appraisal["emotion_scores"], inner_thoughts=agent_appraisal["inner_thoughts"])
-            other_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory")
-            # Append the agent's action to the scene history
-            self.scene_master.append_to_history(curr_agent, agent_action["action"])
-            print_formatted(agent_ind, "[" + curr_agent.name + "]")
-            print_formatted(agent_ind, agent_action["action"])
+        for event in iterate_events(SimulationEngine(self).run_scene(num_interactions)):
+            self.event_sink.emit(event)
 
     async def run_scene_async(self, num_interactions):
         """
         Runs a single scene with a specified number of agent interactions asynchronously.
         """
-        # Add the scene conflict to both agents' working memory
-        self.agent_1.add_to_working_memory(text = self.scene_master.scene_state.scene_conflict, memory_type = "Scene Conflict")
-        self.agent_2.add_to_working_memory(text = self.scene_master.scene_state.scene_conflict, memory_type = "Scene Conflict")
-        # Add the current scene to the scene history and agents' memory
-        self.scene_master.append_to_history(0, self.sm_action.current_scene)
-        self.agent_1.add_to_working_memory(text = self.sm_action.current_scene, memory_type = "Narrative")
-        self.agent_2.add_to_working_memory(text = self.sm_action.current_scene, memory_type = "Narrative")
-        print_formatted(0, "[Scene Master]")
-        print_formatted(0, self.sm_action.current_scene)
-        # Loop for each interaction in the scene
-        for action_index in range(num_interactions):
-            print_separator()
-            # Progress the scene and get the next narrative/action
-            self.sm_action = await self.scene_master.progress_async()
-            self.scene_master.append_to_history(0, self.sm_action.narrative)
-            print_formatted(0, "[Scene Master:]")
-            print_formatted(0, self.sm_action.narrative)
-            print_separator()
-            # Determine which agent acts next based on character_uuid
-            if self.sm_action.character_uuid == self.agent_1.agent_id:
-                curr_agent = self.agent_1
-                other_agent = self.agent_2
-                agent_ind = 1
-            elif self.sm_action.character_uuid == self.agent_2.agent_id:
-                curr_agent = self.agent_2
-                other_agent = self.agent_1
-                agent_ind = 2
-            # Agent appraises the current scene history
-            agent_appraisal = await curr_agent.appraise_async(self.scene_master.scene_history)
-            # Add the narrative and agent's reflection to working memory
-            # curr_agent.add_to_working_memory(
-            #     text=self.sm_action.narrative,
-            #     emotion_embedding=agent_reflection["emotion_scores"],
-            #     inner_thoughts=agent_reflection["inner_thoughts"],
-            #     memory_type = "Narrative"
-            # )
-            # other_agent.add_to_working_memory(text=self.sm_action.narrative, memory_type = "Narrative")
-            # Agent makes a choice/action
-            agent_action = await curr_agent.make_choices_async(self.sm_action.narrative, appraisal=agent_appraisal)
-            # Add the agent's action to both agents' working memory
-            narrative_with_action = simulation_utils.combine_narrative_action(self.sm_action.narrative, agent_name=curr_agent.name, action=agent_action['action'])
-            curr_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory", emotion_embedding=agent_appraisal["emotion_scores"], inner_thoughts=agent_appraisal["inner_thoughts"])
-            other_agent.add_to_working_memory(text=narrative_with_action, memory_type="Memory")
-            # Append the agent's action to the scene history
-            self.scene_master.append_to_history(curr_agent, agent_action["action"])
-            print_formatted(agent_ind, "[" + curr_agent.name + "]")
-            print_formatted(agent_ind, agent_action["action"])
+        async for event in SimulationEngine(self).run_scene(num_interactions):
+            self.event_sink.emit(event)
 
     def run_scene_by_scene(self):
         """
         Runs the simulation interactively, prompting the user for the number of interactions per scene.
         """
+        engine = SimulationEngine(self)
         # Setup: initialize or restore the scene master action
-        if not self.from_save:
-            self.sm_action = self.scene_master.initialize()
-        else:
-            self.sm_action = self.scene_master.scene_state
+        asyncio.run(engine.start())
         # Main loop over scenes
-        for scene_index in range(self.scene_master.total_scenes):
-            print_scene_separator(scene_index + 1)
-            usr_input = input("# of interactions(or 'quit' to stop): ")
+        for scene_index in range(self.scene_master.progression, self.scene_master.total_scenes):
+            usr_input = input(f"Scene {scene_index + 1} - # of interactions(or 'quit' to stop): ")
             if usr_input == 'quit':
                 self.save_simulation()
                 print("Simulation Terminated")
-                break            
-            self.run_scene(int(usr_input))
-            if scene_index == self.scene_master.total_scenes:
                 break
-            self.scene_master.summarize()
-            self.sm_action = self.scene_master.next_scene()
+            for event in iterate_events(engine.run_scene(int(usr_input))):
+                self.event_sink.emit(event)
+            for event in iterate_events(engine.end_scene(scene_index)):
+                self.event_sink.emit(event)
 
     def save_simulation(self, filename=None):
         """
@@ -278,7 +179,7 @@ class Simulation():
             self.scene_master.scene_state = data["scene_state"]
 
         # Restore scene history
-        self.scene_master.scene_history = data.get("scene_history", [])
+        self.scene_master.scene_history = SceneHistory(data.get("scene_history", []))
 
         # Restore agents' goals (and optionally other attributes)
         if hasattr(self.agent_1, "goal"):
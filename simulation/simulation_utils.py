@@ -1,17 +1,49 @@
+SEPARATOR = "------------------------------------------------------------------------------"
+
 def print_separator():
-    print("------------------------------------------------------------------------------")
+    print(SEPARATOR)
 
-def print_formatted(source, output_str):
+def color_formatted(source, output_str):
     if source == 0:
         color = '\033[91m'
     elif source == 1:
         color = '\033[92m'
     else:
         color = '\033[94m'
-    print(f'{color}{output_str}\033[0m')
+    return f'{color}{output_str}\033[0m'
+
+def print_formatted(source, output_str):
+    print(color_formatted(source, output_str))
+
+def scene_separator(scene_ind):
+    return f'-------------------------------- SCENE {scene_ind} --------------------------------'
 
 def print_scene_separator(scene_ind):
-    print(f'-------------------------------- SCENE {scene_ind} --------------------------------')
+    print(scene_separator(scene_ind))
+
+def format_event(event):
+    """
+    Renders a SimulationEvent (see simulation/engine.py) for the terminal, as one string of lines.
+    """
+    if event.kind == "simulation_start":
+        lines = [color_formatted(0, event.content)]
+    elif event.kind == "scene_start":
+        lines = [scene_separator(event.scene), color_formatted(0, "Scene Conflict: " + event.data["conflict"]), color_formatted(0, "[Scene Master]"), color_formatted(0, event.content)]
+    elif event.kind == "narrative":
+        lines = [SEPARATOR, color_formatted(0, "[Scene Master:]"), color_formatted(0, event.content), SEPARATOR]
+    elif event.kind == "appraisal":
+        lines = [color_formatted(event.agent_index, f"({event.agent} thinks) {event.content}")]
+    elif event.kind == "action":
+        lines = [color_formatted(event.agent_index, "[" + event.agent + "]"), color_formatted(event.agent_index, event.content)]
+    elif event.kind == "summary":
+        lines = [str(event.data["summary"])]
+    elif event.kind == "commitment":
+        lines = [str(event.data["result"])]
+    elif event.kind == "simulation_end":
+        lines = []
+    else:
+        lines = [str(event.content)]
+    return "\n".join(lines)
 
     # INSERT_YOUR_CODE
 def combine_narrative_action(narrative, agent_name, action):
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+
+class SpeculativeProgress():
+    def __init__(self, scene_master) -> None:
+        """
+        Starts the scene master's next progress_async() call as soon as the current agent's action is in
+        the scene history, so it overlaps with the rest of the turn's bookkeeping, printing and post-turn work.
+
+        progress_async() depends on nothing but its prompt, which is rendered from the scene history through
+        the scene master's context window (including its rolling summary), both agents' descriptions and the
+        scene conflict. The speculative call's prompt is rendered up front; when the result is consumed, the
+        prompt is rendered again from the current state, and the result is discarded and regenerated from
+        the new prompt if the two differ.
+        """
+        self.scene_master = scene_master
+        self.pending = None
+        # One entry per consumed progress call
+        self.turn_log = []
+
+    def start(self):
+        """
+        Launches the next progress_async() call in the background.
+        """
+        self.cancel()
+        prompt = self.scene_master.render_progress_prompt()
+        speculation = {"started_at": time.perf_counter(), "finished_at": None, "prompt": prompt}
+
+        async def run():
+            try:
+                return await self.scene_master.progress_async(prompt)
+            finally:
+                speculation["finished_at"] = time.perf_counter()
+
+        speculation["task"] = asyncio.ensure_future(run())
+        self.pending = speculation
+
+    async def next_action(self):
+        """
+        Returns the next scene master action, using the speculative call if it is still valid.
+        """
+        speculation = self.pending
+        self.pending = None
+        needed_at = time.perf_counter()
+        prompt = self.scene_master.render_progress_prompt()
+
+        if speculation is not None:
+            if speculation["prompt"] == prompt:
+                result = await speculation["task"]
+                saved = min(speculation["finished_at"], needed_at) - speculation["started_at"]
+                self.turn_log.append({"speculated": True, "used": True, "saved_seconds": max(saved, 0.0)})
+                return result
+            self._discard(speculation["task"])
+            self.turn_log.append({"speculated": True, "used": False, "saved_seconds": 0.0})
+        else:
+            self.turn_log.append({"speculated": False, "used": False, "saved_seconds": 0.0})
+
+        return await self.scene_master.progress_async(prompt)
+
+    def cancel(self):
+        """
+        Cancels any in-flight speculative call, e.g. when the scene ends early.
+        """
+        if self.pending is not None:
+            self._discard(self.pending["task"])
+            self.pending = None
+
+    def _discard(self, task):
+        task.cancel()
+        # Retrieve the exception of a failed speculation so it is not reported as unhandled
+        if task.done() and not task.cancelled():
+            task.exception()
+
+    def total_saved(self):
+        return sum(entry["saved_seconds"] for entry in self.turn_log)
@@ -11,6 +11,7 @@ import os
 from relationship_agent.relationship_agent import RelationshipAgent
 from scene_master.scene_master import SceneMaster
 from simulation.simulation import Simulation
+from simulation.event_sinks import NullSink
 
 async def measure_single_simulation_time():
     """Measure how long a single simulation takes to complete."""
@@ -20,7 +21,7 @@ async def measure_single_simulation_time():
     agent1 = RelationshipAgent("TestAgent1", "A test agent for performance measurement.")
     agent2 = RelationshipAgent("TestAgent2", "Another test agent for performance measurement.")
     scene_master = SceneMaster(agent1, agent2)
-    simulation = Simulation(scene_master, agent1, agent2)
+    simulation = Simulation(scene_master, agent1, agent2, event_sink=NullSink())
     
     start_time = time.time()
     try:
@@ -42,7 +43,7 @@ async def test_concurrent_load(num_simulations):
         agent1 = RelationshipAgent(f"Agent1_{sim_id}", f"Test agent 1 for simulation {sim_id}")
         agent2 = RelationshipAgent(f"Agent2_{sim_id}", f"Test agent 2 for simulation {sim_id}")
         scene_master = SceneMaster(agent1, agent2)
-        simulation = Simulation(scene_master, agent1, agent2)
+        simulation = Simulation(scene_master, agent1, agent2, event_sink=NullSink())
         
         try:
             await simulation.run_auto_async(num_interactions_per_scene=1)
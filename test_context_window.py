@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that a ContextWindow never leaves an entry out of the prompt: entries that
+fall out of the window stay verbatim until a summary covers them, a complete render over a scene
+uses the summary prefetched while the scene played, and a failed summary keeps every entry. Uses
+stand-in summarizers, so no API calls are made.
+"""
+
+import threading
+from utils.context_window import ContextWindow, render_scene_history, prefetch_scene_history
+from utils.scene_history import SceneHistory
+
+def row(i):
+    return ("Alex" if i % 2 else "Sam", f"event {i} " + "word " * 20)
+
+class StubSummarizer():
+    """Summarizes by listing the events it covers; blocks until released if gated."""
+    def __init__(self, gated=False) -> None:
+        self.calls = []
+        self.release = threading.Event()
+        if not gated:
+            self.release.set()
+
+    def __call__(self, summary, new_entries, max_words):
+        self.calls.append((threading.current_thread().name, len(new_entries)))
+        self.release.wait()
+        covered = [entry.split("event ")[1].split(" ")[0] for entry in new_entries]
+        return (summary + ", " if summary else "covers ") + ", ".join(covered)
+
+def covered_events(text):
+    """Returns the event numbers in the summary and the verbatim event numbers of a rendered text."""
+    summary = set()
+    if text.startswith("[Summary"):
+        summary_line = text.split("\n")[1]
+        summary = {int(number) for number in summary_line[len("covers "):].split(", ")}
+        text = text.split("[Recent events]:\n", 1)[1]
+    verbatim = {int(part.split(" ")[0]) for part in text.split("event ")[1:]}
+    return summary, verbatim
+
+def test_no_entry_left_out():
+    """Test that entries out of the window stay verbatim while their summary is pending, even over budget."""
+    print("Testing that no entry is left out while a summary is pending...")
+    summarizer = StubSummarizer(gated=True)
+    window = ContextWindow(150, summarizer=summarizer)
+    history = SceneHistory()
+    for i in range(30):
+        history.append(row(i))
+        summary, verbatim = covered_events(render_scene_history(window, history))
+        if summary | verbatim != set(range(i + 1)):
+            print(f"❌ Pending summary test FAILED - after {i + 1} entries, events {sorted(set(range(i + 1)) - summary - verbatim)} are missing")
+            summarizer.release.set()
+            return False
+    if len(summarizer.calls) != 1:
+        print(f"❌ Pending summary test FAILED - {len(summarizer.calls)} summaries were started while one was pending")
+        summarizer.release.set()
+        return False
+
+    summarizer.release.set()
+    window.flush()
+    for i in range(30, 40):
+        history.append(row(i))
+        summary, verbatim = covered_events(render_scene_history(window, history))
+        if summary | verbatim != set(range(i + 1)):
+            print(f"❌ Pending summary test FAILED - after the summary, events {sorted(set(range(i + 1)) - summary - verbatim)} are missing")
+            return False
+        window.flush()
+    if not summary:
+        print("❌ Pending summary test FAILED - the summary never replaced the old entries")
+        return False
+    print("✅ Pending summary test PASSED")
+    return True
+
+def test_complete_render_uses_prefetch():
+    """Test that a complete render of a finished scene only uses the summary prefetched on the summary thread."""
+    print("\nTesting a complete render after prefetching...")
+    summarizer = StubSummarizer()
+    window = ContextWindow(150, summarizer=summarizer)
+    history = SceneHistory()
+    for i in range(30):
+        history.append(row(i))
+        prefetch_scene_history(window, history)
+        window.flush()
+    calls = len(summarizer.calls)
+
+    # The scene transition renders a snapshot of the finished scene
+    summary, verbatim = covered_events(render_scene_history(window, history.copy(), complete=True))
+    if summary | verbatim != set(range(30)) or not summary:
+        print(f"❌ Complete render test FAILED - rendered events {sorted(summary | verbatim)}")
+        return False
+    if len(summarizer.calls) != calls:
+        print("❌ Complete render test FAILED - the complete render summarized again instead of using the prefetched summary")
+        return False
+    if any(not thread.startswith("rolling-summary") for thread, _ in summarizer.calls):
+        print("❌ Complete render test FAILED - a summary ran on the caller's thread")
+        return False
+
+    # Without a prefetch, the complete render still fits the budget by summarizing on the summary thread
+    window = ContextWindow(150, summarizer=summarizer)
+    summary, verbatim = covered_events(render_scene_history(window, history.copy(), complete=True))
+    if summary | verbatim != set(range(30)) or not summary or not summarizer.calls[-1][0].startswith("rolling-summary"):
+        print("❌ Complete render test FAILED - a complete render without a prefetch left out events")
+        return False
+    print("✅ Complete render test PASSED")
+    return True
+
+def test_failed_summary():
+    """Test that a failed summary keeps every entry verbatim."""
+    print("\nTesting a failed summary...")
+    def failing_summarizer(summary, new_entries, max_words):
+        raise RuntimeError("summarizer unavailable")
+    history = SceneHistory([row(i) for i in range(30)])
+    for complete in (False, True):
+        window = ContextWindow(150, summarizer=failing_summarizer)
+        render_scene_history(window, history, complete=complete)
+        window.flush()
+        summary, verbatim = covered_events(render_scene_history(window, history, complete=complete))
+        if summary or verbatim != set(range(30)):
+            print(f"❌ Failed summary test FAILED - rendered events {sorted(verbatim)} with complete={complete}")
+            return False
+    print("✅ Failed summary test PASSED")
+    return True
+
+def main():
+    """Run all context window tests."""
+    print("=== Context Window Tests ===\n")
+
+    tests = [
+        ("No Entry Left Out", test_no_entry_left_out),
+        ("Complete Render Uses Prefetch", test_complete_render_uses_prefetch),
+        ("Failed Summary", test_failed_summary)
+    ]
+
+    results = {}
+    for test_name, test_func in tests:
+        try:
+            results[test_name] = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with error: {e}")
+            results[test_name] = False
+
+    # Summary
+    print("\nTest Summary:")
+    for test_name, result in results.items():
+        status = "PASSED" if result else "FAILED"
+        print(f"  {test_name}: {status}")
+
+    all_passed = all(results.values())
+    print(f"\nOverall: {'ALL TESTS PASSED' if all_passed else 'SOME TESTS FAILED'}")
+    return all_passed
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that the memory write-ahead log recovers every change after a crash:
+recovery from a log that was never closed, replay across a compaction boundary, a torn last
+line, and a crash while a new snapshot is swapped in. Uses the offline hashed n-gram embedding
+backend, so no API calls are made.
+"""
+
+import os
+import tempfile
+from relationship_agent.memory import Memory
+from relationship_agent.memory_log import MemoryLog
+from relationship_agent.columnar_store import save_columnar_store
+
+EMBEDDING_BACKEND = "hashed-ngram"
+
+def emotion(i):
+    return [((i + j) % 8) / 8 for j in range(8)]
+
+def new_memory():
+    return Memory(embedding_backend=EMBEDDING_BACKEND)
+
+def snapshot(memory):
+    """Returns {text: (inner_thoughts, type)} of every memory, for comparing stores."""
+    return {text: (record["inner_thoughts"], record["type"]) for text, record in memory.memory_store.items()}
+
+def write_memories(memory, start, count):
+    for i in range(start, start + count):
+        memory.add_memory(f"memory {i}", emotion(i), inner_thoughts=f"thoughts {i}", memory_type="Narrative")
+
+def test_recovery_after_unclosed_log():
+    """Test that adds, updates and deletes survive a process that never closed its log."""
+    print("Testing recovery after an unclosed log...")
+    store_path = tempfile.mkdtemp()
+
+    memory = new_memory()
+    memory.open_log(store_path, compact_every=1000)
+    write_memories(memory, 0, 50)
+    memory.update_memory("memory 3", inner_thoughts="updated thoughts")
+    memory.delete_memory("memory 7")
+    expected = snapshot(memory)
+    # Simulated crash: the log is left open and nothing is compacted
+
+    recovered = new_memory()
+    replayed = recovered.open_log(store_path, compact_every=1000)
+    print(f"Replayed {replayed} records, recovered {len(recovered.memory_store)} memories")
+
+    if snapshot(recovered) != expected:
+        print("❌ Recovery test FAILED - recovered memories differ")
+        return False
+    if recovered.memory_store["memory 3"]["inner_thoughts"] != "updated thoughts" or "memory 7" in recovered.memory_store:
+        print("❌ Recovery test FAILED - update or delete was not replayed")
+        return False
+    recovered.close_log()
+    print("✅ Recovery test PASSED")
+    return True
+
+def test_replay_across_compaction():
+    """Test that changes on both sides of a compaction are recovered, including changes to compacted memories."""
+    print("\nTesting replay across a compaction boundary...")
+    store_path = tempfile.mkdtemp()
+
+    memory = new_memory()
+    memory.open_log(store_path, compact_every=40)
+    write_memories(memory, 0, 100)
+    memory.log.wait()
+    # These records land in segments written after the snapshot and touch memories that are already compacted
+    memory.update_memory("memory 5", inner_thoughts="updated after compaction")
+    memory.delete_memory("memory 10")
+    write_memories(memory, 100, 5)
+    expected = snapshot(memory)
+    snapshot_segment = memory.log.snapshot_segment()
+    print(f"Snapshot covers segments up to {snapshot_segment}, log is at segment {memory.log.segment}")
+    # Simulated crash between the snapshot swap and the removal of the compacted segments: a compacted
+    # segment is still on disk, and must not be replayed on top of the snapshot
+    leftover_path = os.path.join(store_path, f"wal-{snapshot_segment:06d}.log")
+    with open(leftover_path, "w", encoding="utf-8") as f:
+        f.write('{"op": "delete", "text": "memory 1"}\n')
+
+    recovered = new_memory()
+    replayed = recovered.open_log(store_path, compact_every=40)
+    print(f"Replayed {replayed} records, recovered {len(recovered.memory_store)} memories")
+
+    if snapshot_segment == 0:
+        print("❌ Compaction test FAILED - no snapshot was written")
+        return False
+    if replayed >= 100:
+        print("❌ Compaction test FAILED - compacted records were replayed again")
+        return False
+    if snapshot(recovered) != expected:
+        print("❌ Compaction test FAILED - recovered memories differ")
+        return False
+    if os.path.exists(leftover_path):
+        print("❌ Compaction test FAILED - the compacted segment left behind was not removed")
+        return False
+
+    # Compacting everything and reopening gives the same store from the snapshot alone
+    recovered.log.compact(wait=True)
+    recovered.close_log()
+    reopened = new_memory()
+    replayed = reopened.open_log(store_path)
+    if replayed != 0 or snapshot(reopened) != expected:
+        print("❌ Compaction test FAILED - store differs after a full compaction")
+        return False
+    reopened.close_log()
+    print("✅ Compaction test PASSED")
+    return True
+
+def test_torn_last_line():
+    """Test that a record torn by a crash mid-write is skipped and the records before it are kept."""
+    print("\nTesting recovery from a torn last line...")
+    store_path = tempfile.mkdtemp()
+
+    memory = new_memory()
+    memory.open_log(store_path, compact_every=1000)
+    write_memories(memory, 0, 20)
+    expected = snapshot(memory)
+    segment_path = memory.log.segments()[-1][1]
+    # A crash can cut a record anywhere, including right before its newline: a line without one was never
+    # fully written, even if it happens to parse
+    memory.log._file.write('{"op": "delete", "text": "memory 3"}')
+    memory.log._file.flush()
+
+    recovered = new_memory()
+    replayed = recovered.open_log(store_path, compact_every=1000)
+    print(f"Replayed {replayed} records, recovered {len(recovered.memory_store)} memories")
+
+    if snapshot(recovered) != expected:
+        print("❌ Torn line test FAILED - recovered memories differ")
+        return False
+
+    # New records go to a new segment, so they are never appended to the torn line
+    recovered.add_memory("memory 21", emotion(21), inner_thoughts="thoughts 21", memory_type="Narrative")
+    if recovered.log.segments()[-1][1] == segment_path:
+        print("❌ Torn line test FAILED - new records were appended to the torn segment")
+        return False
+    expected = snapshot(recovered)
+    reopened = new_memory()
+    reopened.open_log(store_path, compact_every=1000)
+    if snapshot(reopened) != expected:
+        print("❌ Torn line test FAILED - records written after recovery were lost")
+        return False
+    reopened.close_log()
+    print("✅ Torn line test PASSED")
+    return True
+
+def test_crash_during_snapshot_swap():
+    """Test that a crash while a compaction publishes its snapshot loses no memories."""
+    print("\nTesting a crash during the snapshot swap...")
+    store_path = tempfile.mkdtemp()
+
+    memory = new_memory()
+    memory.open_log(store_path, compact_every=40)
+    write_memories(memory, 0, 50)
+    memory.log.wait()
+    write_memories(memory, 50, 40)
+    expected = snapshot(memory)
+
+    # Simulated crash after the next snapshot directory is written but before it is published
+    publish_snapshot = MemoryLog._publish_snapshot
+    def crash_before_publishing(log, index, upto):
+        save_columnar_store(os.path.join(log.store_path, f"snapshot-{upto:06d}"), index, extra={"wal_segment": upto})
+        raise RuntimeError("simulated crash")
+    MemoryLog._publish_snapshot = crash_before_publishing
+    try:
+        memory.log.compact()
+        try:
+            memory.log.wait()
+            print("❌ Snapshot swap test FAILED - the simulated crash did not happen")
+            return False
+        except RuntimeError:
+            pass
+    finally:
+        MemoryLog._publish_snapshot = publish_snapshot
+
+    recovered = new_memory()
+    recovered.open_log(store_path, compact_every=40)
+    if snapshot(recovered) != expected:
+        print(f"❌ Snapshot swap test FAILED - recovered {len(recovered.memory_store)} of {len(expected)} memories")
+        return False
+    recovered.log.compact(wait=True)
+    recovered.close_log()
+
+    # Stores written before snapshots were versioned swapped them in with two renames; a crash between
+    # the renames left the previous snapshot under a temporary name and no snapshot directory
+    snapshot_path = MemoryLog(store_path).snapshot_path
+    os.remove(os.path.join(store_path, "SNAPSHOT"))
+    os.rename(snapshot_path, os.path.join(store_path, "snapshot.old-1234"))
+    reopened = new_memory()
+    reopened.open_log(store_path)
+    if snapshot(reopened) != expected:
+        print(f"❌ Snapshot swap test FAILED - recovered {len(reopened.memory_store)} of {len(expected)} memories from an interrupted rename")
+        return False
+    reopened.close_log()
+    print("✅ Snapshot swap test PASSED")
+    return True
+
+def main():
+    """Run all write-ahead log tests."""
+    print("=== Memory Write-Ahead Log Tests ===\n")
+
+    tests = [
+        ("Recovery After Unclosed Log", test_recovery_after_unclosed_log),
+        ("Replay Across Compaction", test_replay_across_compaction),
+        ("Torn Last Line", test_torn_last_line),
+        ("Crash During Snapshot Swap", test_crash_during_snapshot_swap)
+    ]
+
+    results = {}
+    for test_name, test_func in tests:
+        try:
+            results[test_name] = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with error: {e}")
+            results[test_name] = False
+
+    # Summary
+    print("\nTest Summary:")
+    for test_name, result in results.items():
+        status = "PASSED" if result else "FAILED"
+        print(f"  {test_name}: {status}")
+
+    all_passed = all(results.values())
+    print(f"\nOverall: {'ALL TESTS PASSED' if all_passed else 'SOME TESTS FAILED'}")
+    return all_passed
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that the namespaces of a SharedMemoryStore are isolated: every agent only
+reads, retrieves, deletes and saves its own memories, and batched retrieval across namespaces
+matches retrieving from each namespace alone. Uses the offline hashed n-gram embedding backend,
+so no API calls are made.
+"""
+
+import asyncio
+import os
+import tempfile
+from relationship_agent.shared_memory_store import SharedMemoryStore
+from relationship_agent.memory import Memory
+
+NAMESPACES = ["alice", "bob", "carol"]
+
+def build_store(semantic_dtype="float32"):
+    store = SharedMemoryStore(embedding_backend="hashed-ngram", semantic_dtype=semantic_dtype)
+    for agent in NAMESPACES:
+        store.memory(agent).add_memories(
+            [{"text": f"{agent} remembers a walk with the {'cat' if i % 2 else 'dog'} {i}", "emotion_embedding": [((i + j) % 8) / 8 for j in range(8)]} for i in range(20)]
+            # The same text in every namespace
+            + [{"text": "dinner at the lake", "emotion_embedding": [0.5] * 8}]
+        )
+    return store
+
+def own_texts(agent, texts):
+    return all(text.startswith(agent) or text == "dinner at the lake" for text in texts)
+
+def test_namespace_isolation():
+    """Test that reads, retrievals and deletes only see the agent's own namespace."""
+    print("Testing namespace isolation...")
+    store = build_store()
+    query = store.embedding_backend.embed(["a walk with the cat"])[0]
+
+    for agent in NAMESPACES:
+        memory = store.memory(agent)
+        if memory.count() != 21 or not own_texts(agent, memory.memory_store):
+            print(f"❌ Isolation test FAILED - {agent} sees memories of other namespaces")
+            return False
+        if not own_texts(agent, [text for text, _ in memory.get_top_memories(query, [0.5] * 8, top_k=5)]):
+            print(f"❌ Isolation test FAILED - {agent} retrieved memories of other namespaces")
+            return False
+
+    store.memory("bob").delete_memory("dinner at the lake")
+    if "dinner at the lake" in store.memory("bob").memory_store or "dinner at the lake" not in store.memory("alice").memory_store:
+        print("❌ Isolation test FAILED - deleting a shared text affected another namespace")
+        return False
+    try:
+        store.memory("bob").delete_memory(store.memory("alice").find("dinner at the lake"))
+        print("❌ Isolation test FAILED - a namespace deleted another namespace's memory by id")
+        return False
+    except KeyError:
+        pass
+
+    print("✅ Isolation test PASSED")
+    return True
+
+def test_batched_retrieval():
+    """Test that batched and concurrent retrieval match retrieving from each namespace alone."""
+    print("\nTesting batched retrieval across namespaces...")
+    for semantic_dtype in ("float32", "int8"):
+        store = build_store(semantic_dtype)
+        query = store.embedding_backend.embed(["dinner with the dog"])[0]
+        namespaces = NAMESPACES + ["alice", "nobody"]
+        expected = [store.memory(agent).get_top_memories(query, [0.5] * 8, top_k=3) for agent in namespaces]
+
+        batched = store.get_top_memories_batch(namespaces, [query] * len(namespaces), [[0.5] * 8] * len(namespaces), top_k=3)
+
+        async def retrieve_concurrently():
+            return await asyncio.gather(*[store.memory(agent).get_top_memories_async(query, [0.5] * 8, top_k=3) for agent in namespaces])
+        concurrent = asyncio.run(retrieve_concurrently())
+
+        if batched != expected or concurrent != expected:
+            print(f"❌ Batched retrieval test FAILED - results differ with {semantic_dtype} storage")
+            return False
+        if expected[-1] != []:
+            print("❌ Batched retrieval test FAILED - an empty namespace retrieved memories")
+            return False
+
+    print("✅ Batched retrieval test PASSED")
+    return True
+
+def test_save_and_load():
+    """Test that saving a namespace only writes its memories, and that a saved store keeps its namespaces."""
+    print("\nTesting saving and loading namespaces...")
+    store = build_store()
+    directory = tempfile.mkdtemp()
+
+    store.memory("alice").save_memory_store(os.path.join(directory, "alice"))
+    own_memory = Memory(embedding_backend="hashed-ngram")
+    own_memory.load_memory_store(os.path.join(directory, "alice"))
+    if len(own_memory.index) != 21 or not own_texts("alice", own_memory.memory_store):
+        print("❌ Save test FAILED - a saved namespace holds other namespaces' memories")
+        return False
+
+    store.save(os.path.join(directory, "store"))
+    loaded = SharedMemoryStore.load(os.path.join(directory, "store"), embedding_backend="hashed-ngram")
+    if sorted(loaded.namespaces()) != sorted(NAMESPACES):
+        print("❌ Save test FAILED - namespaces were not restored")
+        return False
+    for agent in NAMESPACES:
+        if set(loaded.memory(agent).memory_store) != set(store.memory(agent).memory_store):
+            print(f"❌ Save test FAILED - {agent}'s memories differ after loading")
+            return False
+
+    print("✅ Save test PASSED")
+    return True
+
+def main():
+    """Run all shared memory store tests."""
+    print("=== Shared Memory Store Tests ===\n")
+
+    tests = [
+        ("Namespace Isolation", test_namespace_isolation),
+        ("Batched Retrieval", test_batched_retrieval),
+        ("Save and Load", test_save_and_load)
+    ]
+
+    results = {}
+    for test_name, test_func in tests:
+        try:
+            results[test_name] = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with error: {e}")
+            results[test_name] = False
+
+    # Summary
+    print("\nTest Summary:")
+    for test_name, result in results.items():
+        status = "PASSED" if result else "FAILED"
+        print(f"  {test_name}: {status}")
+
+    all_passed = all(results.values())
+    print(f"\nOverall: {'ALL TESTS PASSED' if all_passed else 'SOME TESTS FAILED'}")
+    return all_passed
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the order of the events the SimulationEngine emits, in the two-call, fused
+and partner appraisal turn modes, that failed or unknown turns are reported without ending the
+simulation, and that speculative progress calls are discarded when their prompt changed. Uses
+stand-in agents and a stand-in scene master, so no API calls are made.
+"""
+
+import asyncio
+import types
+from utils.scene_history import SceneHistory
+from simulation.simulation import Simulation
+from simulation.engine import iterate_events
+from simulation.event_sinks import NullSink, QueueSink
+from simulation.speculation import SpeculativeProgress
+
+class StubAgent():
+    def __init__(self, name, agent_id, partner_appraisal=None) -> None:
+        self.name = name
+        self.agent_id = agent_id
+        self.description = name
+        self.working_memory = []
+        self.partner_appraisal = partner_appraisal
+
+    def add_to_working_memory(self, **memory):
+        self.working_memory.append(memory)
+
+    def prefetch_memories(self, current_narrative):
+        pass
+
+    async def appraise_async(self, scene_history):
+        return {"emotion_scores": [0.1] * 8, "inner_thoughts": f"{self.name} thinks"}
+
+    async def make_choices_async(self, current_narrative, appraisal):
+        return {"action": f"{self.name} acts"}
+
+    async def appraise_and_choose_async(self, current_narrative):
+        return {"emotion_scores": [0.1] * 8, "inner_thoughts": f"{self.name} thinks"}, {"action": f"{self.name} acts"}
+
+    async def appraise_partner_action_async(self, scene_history):
+        return self.partner_appraisal
+
+class StubSceneMaster():
+    def __init__(self, agent_1, agent_2, total_scenes=2, unknown_turns=()) -> None:
+        self.agent_1 = agent_1
+        self.agent_2 = agent_2
+        self.progression = 0
+        self.total_scenes = total_scenes
+        self.scene_plan = {}
+        self.scene_state = types.SimpleNamespace(theme="first_date", scene_conflict="conflict 1")
+        self.scene_history = SceneHistory()
+        self.unknown_turns = unknown_turns
+        self.turns = 0
+        self.context_summary = ""
+
+    def append_to_history(self, source, action):
+        self.scene_history.append((str(source), action))
+
+    async def initialize_async(self):
+        return types.SimpleNamespace(current_scene="opening 1")
+
+    def render_progress_prompt(self):
+        # Stands in for the scene history as rendered through the context window
+        return f"{self.scene_state.scene_conflict}: {len(self.scene_history)} rows, summary {self.context_summary}"
+
+    async def progress_async(self, prompt=None):
+        self.turns += 1
+        character_uuid = "unknown" if self.turns in self.unknown_turns else [self.agent_2, self.agent_1][self.turns % 2].agent_id
+        return types.SimpleNamespace(current_scene="", narrative=f"narrative {self.turns}", character_uuid=character_uuid)
+
+    async def summarize_async(self, scene_history):
+        return types.SimpleNamespace(summary=f"summary {self.progression + 1}")
+
+    async def commitment_score_async(self, scene_history=None):
+        return {"reasoning": "reasoning", "commitment_score": 5}
+
+    async def next_scene_async(self, previous_summary=None):
+        self.progression += 1
+        self.scene_state.scene_conflict = f"conflict {self.progression + 1}"
+        return types.SimpleNamespace(current_scene=f"opening {self.progression + 1}")
+
+def make_simulation(partner_appraisal_result=None, unknown_turns=(), **options):
+    agent_1 = StubAgent("Alex", "1", partner_appraisal_result)
+    agent_2 = StubAgent("Sam", "2", partner_appraisal_result)
+    scene_master = StubSceneMaster(agent_1, agent_2, unknown_turns=unknown_turns)
+    return Simulation(scene_master, agent_1, agent_2, event_sink=NullSink(), simulation_id="test", **options)
+
+def expected_kinds(turn_kinds, turns=2, scenes=2):
+    kinds = ["simulation_start"]
+    for _ in range(scenes):
+        kinds += ["scene_start"] + turn_kinds * turns + ["summary", "commitment"]
+    return kinds + ["simulation_end"]
+
+def check_order(name, simulation, turn_kinds):
+    events = list(iterate_events(simulation.events(2)))
+    kinds = [event.kind for event in events]
+    if kinds != expected_kinds(turn_kinds):
+        print(f"❌ {name} FAILED - unexpected event order: {kinds}")
+        return False
+    if [(event.scene, event.turn) for event in events if event.kind == "action"] != [(1, 1), (1, 2), (2, 1), (2, 2)]:
+        print(f"❌ {name} FAILED - actions have the wrong scene or turn numbers")
+        return False
+    if any(event.simulation_id != "test" for event in events) or len(simulation.commitment_log) != 2:
+        print(f"❌ {name} FAILED - events are not stamped or scenes were not logged")
+        return False
+    return True
+
+def test_event_order():
+    """Test the event order of every turn mode."""
+    print("Testing event order...")
+    partner_appraisal_result = {"emotion_scores": [0.2] * 8, "inner_thoughts": "partner thinks"}
+    checks = [
+        ("Two-call turns", make_simulation(), ["narrative", "appraisal", "action"]),
+        ("Fused turns", make_simulation(fused_turns=True), ["narrative", "appraisal", "action"]),
+        ("Speculative turns", make_simulation(speculative=True), ["narrative", "appraisal", "action"]),
+        ("Partner appraisal", make_simulation(partner_appraisal_result, partner_appraisal=True), ["narrative", "appraisal", "action", "appraisal"]),
+    ]
+    for name, simulation, turn_kinds in checks:
+        if not check_order(name, simulation, turn_kinds):
+            return False
+    print("✅ Event order test PASSED")
+    return True
+
+def test_failed_turns():
+    """Test that a failed partner appraisal and an unknown character are reported and the simulation goes on."""
+    print("\nTesting failed turns...")
+    # A partner appraisal that could not be parsed is None: the turn goes on without its event
+    if not check_order("Failed partner appraisal", make_simulation(None, partner_appraisal=True), ["narrative", "appraisal", "action"]):
+        return False
+
+    events = list(iterate_events(make_simulation(unknown_turns=(1,)).events(2)))
+    kinds = [event.kind for event in events]
+    if kinds[:4] != ["simulation_start", "scene_start", "narrative", "error"] or kinds[-1] != "simulation_end":
+        print(f"❌ Failed turns test FAILED - unexpected events for an unknown character: {kinds}")
+        return False
+    print("✅ Failed turns test PASSED")
+    return True
+
+def test_event_sink():
+    """Test that the run methods send every event to the simulation's event sink."""
+    print("\nTesting the event sink...")
+    expected = [event.kind for event in iterate_events(make_simulation().events(2))]
+    for run in ("sync", "async"):
+        simulation = make_simulation()
+        simulation.event_sink = QueueSink()
+        if run == "sync":
+            simulation.run_auto(2)
+        else:
+            asyncio.run(simulation.run_auto_async(2))
+        simulation.event_sink.close()
+        kinds = [event.kind for event in simulation.event_sink]
+        if kinds != expected:
+            print(f"❌ Event sink test FAILED - {run} run emitted {kinds}")
+            return False
+    print("✅ Event sink test PASSED")
+    return True
+
+def test_speculation():
+    """Test that a speculative progress call is only used if its prompt, including the rolling summary, is unchanged."""
+    print("\nTesting speculative progress calls...")
+    scene_master = StubSceneMaster(StubAgent("Alex", "1"), StubAgent("Sam", "2"))
+
+    async def run():
+        speculation = SpeculativeProgress(scene_master)
+        speculation.start()
+        await speculation.next_action()
+        # A rolling summary that lands in between changes the prompt even though the scene history did not change
+        speculation.start()
+        scene_master.context_summary = "they met at the lake"
+        await speculation.next_action()
+        speculation.start()
+        scene_master.append_to_history("Alex", "waves")
+        await speculation.next_action()
+        return [entry["used"] for entry in speculation.turn_log]
+
+    used = asyncio.run(run())
+    if used != [True, False, False]:
+        print(f"❌ Speculation test FAILED - speculative calls used: {used}")
+        return False
+    print("✅ Speculation test PASSED")
+    return True
+
+def main():
+    """Run all simulation engine tests."""
+    print("=== Simulation Engine Tests ===\n")
+
+    tests = [
+        ("Event Order", test_event_order),
+        ("Failed Turns", test_failed_turns),
+        ("Event Sink", test_event_sink),
+        ("Speculation", test_speculation)
+    ]
+
+    results = {}
+    for test_name, test_func in tests:
+        try:
+            results[test_name] = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with error: {e}")
+            results[test_name] = False
+
+    # Summary
+    print("\nTest Summary:")
+    for test_name, result in results.items():
+        status = "PASSED" if result else "FAILED"
+        print(f"  {test_name}: {status}")
+
+    all_passed = all(results.values())
+    print(f"\nOverall: {'ALL TESTS PASSED' if all_passed else 'SOME TESTS FAILED'}")
+    return all_passed
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script to verify how working memory is rendered and how it reaches the long-term store: the
+cached rendering follows a replaced or edited working memory, and every store only adds the
+entries added since the last one, so memories a capacity policy evicted stay evicted. Uses the
+offline hashed n-gram embedding backend, so no API calls are made.
+"""
+
+import asyncio
+from relationship_agent.memory import Memory
+from relationship_agent.memory_policy import MemoryPolicy
+
+EMBEDDING_BACKEND = "hashed-ngram"
+
+def emotion(i):
+    return [((i + j) % 8) / 8 for j in range(8)]
+
+def add_events(memory, start, count):
+    for i in range(start, start + count):
+        memory.add_to_working_memory(f"event {i} at the lake", emotion_embedding=emotion(i), inner_thoughts=f"thoughts {i}", memory_type="Memory")
+
+def test_evicted_memories_stay_evicted():
+    """Test that storing working memory again does not bring back evicted memories."""
+    print("Testing that evicted memories stay evicted...")
+    memory = Memory(embedding_backend=EMBEDDING_BACKEND, policy=MemoryPolicy(capacity=10, merge=False))
+    add_events(memory, 0, 15)
+    memory.store_working_memory_to_memory_store()
+    evicted = {f"event {i} at the lake" for i in range(15)} - set(memory.memory_store)
+    print(f"Stored 15 events, {len(evicted)} evicted")
+    if not evicted:
+        print("❌ Eviction test FAILED - the policy evicted nothing")
+        return False
+
+    add_events(memory, 15, 1)
+    stored_ids = memory.store_working_memory_to_memory_store()
+    if len(stored_ids) != 1:
+        print(f"❌ Eviction test FAILED - storing one new event stored {len(stored_ids)} memories")
+        return False
+    if evicted & set(memory.memory_store):
+        print("❌ Eviction test FAILED - evicted memories came back")
+        return False
+    if "event 15 at the lake" not in memory.memory_store:
+        print("❌ Eviction test FAILED - the new event was not stored")
+        return False
+    print("✅ Eviction test PASSED")
+    return True
+
+def test_store_only_new_entries():
+    """Test that sync and async stores, and a replaced working memory, store each entry once."""
+    print("\nTesting that each working memory entry is stored once...")
+    memory = Memory(embedding_backend=EMBEDDING_BACKEND)
+    add_events(memory, 0, 3)
+    first = memory.store_working_memory_to_memory_store()
+    add_events(memory, 3, 2)
+    second = asyncio.run(memory.store_working_memory_to_memory_store_async())
+    nothing = memory.store_working_memory_to_memory_store()
+    if (len(first), len(second), len(nothing)) != (3, 2, 0) or len(memory.index) != 5:
+        print(f"❌ Store test FAILED - stored {len(first)}, {len(second)} and {len(nothing)} memories")
+        return False
+
+    # A new working memory list (e.g. a new scene) is stored from its first entry
+    memory.working_memory = []
+    add_events(memory, 10, 2)
+    replaced = memory.store_working_memory_to_memory_store()
+    if len(replaced) != 2 or len(memory.index) != 7:
+        print(f"❌ Store test FAILED - stored {len(replaced)} memories of a replaced working memory")
+        return False
+    print("✅ Store test PASSED")
+    return True
+
+def test_rendering_follows_changes():
+    """Test that the cached rendering is rebuilt when working memory is replaced or changed other than by appends."""
+    print("\nTesting the working memory rendering cache...")
+    memory = Memory(embedding_backend=EMBEDDING_BACKEND)
+    add_events(memory, 0, 2)
+    memory.format_working_memory()
+
+    # A replaced list that is as long or longer than the rendered one
+    memory.working_memory = []
+    add_events(memory, 10, 3)
+    if "event 0 " in memory.format_working_memory() or "event 10 " not in memory.format_working_memory():
+        print("❌ Rendering test FAILED - a replaced working memory was rendered from the old list")
+        return False
+
+    # An entry removed in place, then one appended: the length did not shrink below the rendered one
+    del memory.working_memory[0]
+    add_events(memory, 20, 1)
+    text = memory.format_working_memory()
+    if "event 10 " in text or "event 20 " not in text or len(memory.working_memory_entries()) != 3:
+        print("❌ Rendering test FAILED - an edited working memory was rendered from stale entries")
+        return False
+    if text != "\n\n".join(memory._render_working_memory_entry(i + 1, mem) for i, mem in enumerate(memory.working_memory)):
+        print("❌ Rendering test FAILED - the cached rendering differs from a full rendering")
+        return False
+    print("✅ Rendering test PASSED")
+    return True
+
+def main():
+    """Run all working memory tests."""
+    print("=== Working Memory Tests ===\n")
+
+    tests = [
+        ("Evicted Memories Stay Evicted", test_evicted_memories_stay_evicted),
+        ("Store Only New Entries", test_store_only_new_entries),
+        ("Rendering Follows Changes", test_rendering_follows_changes)
+    ]
+
+    results = {}
+    for test_name, test_func in tests:
+        try:
+            results[test_name] = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with error: {e}")
+            results[test_name] = False
+
+    # Summary
+    print("\nTest Summary:")
+    for test_name, result in results.items():
+        status = "PASSED" if result else "FAILED"
+        print(f"  {test_name}: {status}")
+
+    all_passed = all(results.values())
+    print(f"\nOverall: {'ALL TESTS PASSED' if all_passed else 'SOME TESTS FAILED'}")
+    return all_passed
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,190 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from jinja2 import Template
+import utils.llm_utils as llm_utils
+import utils.general_utils as general_utils
+from utils.scene_history import SceneHistory
+
+# Rolling summaries are produced in the background, off the critical path of the turn loop
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rolling-summary")
+
+_prompt_path = os.path.join(os.path.dirname(__file__), "prompts", "rolling_summary.j2")
+_prompt_template = None
+
+def summarize_entries(summary, new_entries, max_words):
+    """
+    Folds new_entries into the running summary with one LLM call.
+    """
+    global _prompt_template
+    if _prompt_template is None:
+        with open(_prompt_path, "r", encoding="utf-8") as f:
+            _prompt_template = Template(f.read())
+    prompt = _prompt_template.render(
+        summary=summary or "(none yet)",
+        new_events="\n".join(entry.strip() for entry in new_entries),
+        max_words=max_words
+    )
+    return llm_utils.model_call_unstructured('', prompt).strip()
+
+
+class ContextWindow():
+    def __init__(self, token_budget, summarizer=None, summary_fraction=0.25) -> None:
+        """
+        Keeps a growing list of rendered entries (scene history rows, working memory events) within a
+        token budget for one prompt call site.
+
+        The most recent entries that fit are kept verbatim. Older entries are compacted into a rolling
+        summary by a background thread, so the prompt never waits for summarization: entries that have
+        fallen out of the window but are not summarized yet stay verbatim, over budget, until the summary
+        catches up. One-off calls that must fit the budget over a whole scene (e.g. a scene summary) render
+        with complete=True, and prefetch() as the scene grows so that render only waits for a summary
+        that is already running.
+
+        Args:
+            token_budget (int): Maximum number of tokens of the rendered context.
+            summarizer (callable): summarizer(summary, new_entries, max_words) -> str. Defaults to an LLM call.
+            summary_fraction (float): Share of the budget reserved for the rolling summary.
+        """
+        self.token_budget = token_budget
+        self.summarizer = summarizer or summarize_entries
+        self.summary_budget = int(token_budget * summary_fraction)
+        self._reset(None, None)
+
+    def render(self, entries, token_counts, separator="", source=None, complete=False):
+        """
+        Returns the rolling summary followed by the most recent entries that fit in the budget, and every
+        older entry the summary does not cover yet.
+
+        Args:
+            entries (list): Rendered entries, oldest first. Only ever appended to for a given source.
+            token_counts (list): Token count of each entry.
+            separator (str): String used to join verbatim entries.
+            source (object): The object the entries come from; a new source (e.g. a new scene's history)
+                resets the summary, unless its entries continue the current ones (e.g. a copy of it).
+            complete (bool): Summarize the entries that fell out of the window before returning, e.g. for a
+                one-off call over a whole scene. Waits for the summary started by prefetch(), and summarizes
+                the entries it does not cover on the summary thread.
+        """
+        self._use_source(entries, source)
+        if complete:
+            self.flush()
+            start = self._window_start(entries, token_counts, self._complete_budget())
+            if start > self._summarized_upto:
+                self._schedule_summary(entries[self._summarized_upto:start], start)
+                # A failed summary keeps the entries verbatim: over budget beats leaving entries out
+                self.flush()
+        else:
+            self._collect_summary()
+            start = self._window_start(entries, token_counts, self.token_budget - (self._summary_tokens if self._summary else 0))
+            if start > self._summarized_upto:
+                self._schedule_summary(entries[self._summarized_upto:start], start)
+
+        summary_text = self._summary_header() if self._summary else ""
+        return summary_text + separator.join(entries[self._summarized_upto:])
+
+    def prefetch(self, entries, token_counts, source=None):
+        """
+        Starts summarizing, in the background, the entries a render(complete=True) would leave out of the
+        window, so that the complete render does not wait for a summary of the whole scene at its end.
+        Arguments as in render().
+        """
+        self._use_source(entries, source)
+        self._collect_summary()
+        start = self._window_start(entries, token_counts, self._complete_budget())
+        if start > self._summarized_upto:
+            self._schedule_summary(entries[self._summarized_upto:start], start)
+
+    def flush(self):
+        """
+        Waits for any in-flight summary, e.g. before saving or in tests.
+        """
+        if self._pending is not None:
+            # A failed summary is reported by _collect_summary(), not raised
+            wait([self._pending[0]])
+            self._collect_summary()
+
+    def _use_source(self, entries, source):
+        if source is not self._source or len(entries) < self._summarized_upto:
+            # Entries covered by the summary, or by the one in flight
+            covered = max(self._summarized_upto, self._pending[1] if self._pending is not None else 0)
+            if self._entries is not None and len(entries) >= covered and entries[:covered] == self._entries[:covered]:
+                # The entries continue the summarized ones (e.g. a snapshot of the source): keep the summary
+                self._source = source
+                if self._pending is not None:
+                    self._pending = self._pending[:2] + (source,)
+            else:
+                self._reset(source, entries)
+        self._entries = entries
+
+    def _window_start(self, entries, token_counts, verbatim_budget):
+        # Walk back from the newest entry; always keep at least the newest one
+        start = len(entries)
+        used_tokens = 0
+        while start > self._summarized_upto:
+            entry_tokens = token_counts[start - 1]
+            if used_tokens + entry_tokens > verbatim_budget and start < len(entries):
+                break
+            used_tokens += entry_tokens
+            start -= 1
+        return start
+
+    def _complete_budget(self):
+        # Reserve the summary's share of the budget up front, since it is written before the entries are chosen
+        return self.token_budget - max(self.summary_budget, self._summary_tokens)
+
+    def _reset(self, source, entries):
+        # Holding the source (rather than its id) keeps the identity check valid after the old source is gone
+        self._source = source
+        self._entries = entries
+        self._summary = ""
+        self._summary_tokens = 0
+        self._summarized_upto = 0
+        self._pending = None
+
+    def _summary_header(self):
+        return f"[Summary of earlier events]:\n{self._summary}\n\n[Recent events]:\n"
+
+    def _schedule_summary(self, new_entries, upto):
+        if self._pending is not None:
+            return
+        max_words = max(int(self.summary_budget * 0.75), 20)
+        future = _summary_executor.submit(self.summarizer, self._summary, list(new_entries), max_words)
+        self._pending = (future, upto, self._source)
+
+    def _collect_summary(self):
+        if self._pending is None or not self._pending[0].done():
+            return
+        future, upto, source = self._pending
+        self._pending = None
+        if source is not self._source:
+            return
+        try:
+            summary = future.result()
+        except Exception as e:
+            # Keep the previous summary; the entries stay verbatim and are retried on the next render
+            print(f"Rolling summary failed, retrying later... Error: {e}")
+            return
+        self._summary = summary
+        self._summary_tokens = general_utils.count_tokens(self._summary_header())
+        self._summarized_upto = upto
+
+
+def render_scene_history(window, scene_history, complete=False):
+    """
+    Renders a scene history through a ContextWindow, or in full if window is None.
+    complete: summarize the rows that fell out of the window before returning (see ContextWindow.render()).
+    """
+    if window is None:
+        return general_utils.history_to_str(scene_history)
+    rows = scene_history if isinstance(scene_history, SceneHistory) else SceneHistory(scene_history)
+    return window.render(rows.rendered_rows, rows.token_counts, source=scene_history, complete=complete)
+
+def prefetch_scene_history(window, scene_history):
+    """
+    Starts summarizing the rows a complete render of scene_history would leave out (see ContextWindow.prefetch()).
+    Does nothing if window is None.
+    """
+    if window is None:
+        return
+    rows = scene_history if isinstance(scene_history, SceneHistory) else SceneHistory(scene_history)
+    window.prefetch(rows.rendered_rows, rows.token_counts, source=scene_history)
@@ -1,8 +1,33 @@
+import re
+
+def format_history_row(row):
+    return f"[{row[0]}]: {row[1]}\n"
+
 def history_to_str(history):
-    hist_str = ""
-    for row in history:
-        hist_str += f"[{row[0]}]: {row[1]}\n"
-    return hist_str
+    # SceneHistory keeps its rendering up to date as rows are appended
+    if hasattr(history, "render"):
+        return history.render()
+    return "".join(format_history_row(row) for row in history)
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_tiktoken_encoding = None
+
+def count_tokens(text):
+    """
+    Counts the tokens in text with a local tokenizer.
+    Uses tiktoken if it is installed, otherwise approximates BPE tokens by splitting words and
+    punctuation and counting one token per 4 characters of longer words.
+    """
+    global _tiktoken_encoding
+    if _tiktoken_encoding is None:
+        try:
+            import tiktoken
+            _tiktoken_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _tiktoken_encoding = False
+    if _tiktoken_encoding:
+        return len(_tiktoken_encoding.encode(text))
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PATTERN.findall(text))
 
 def list_to_indexed_string(items):
 
@@ -1,7 +1,13 @@
 from openai import OpenAI
 from pydantic import BaseModel
 import asyncio
+import json
 import os
+import threading
+import re
+import zlib
+import numpy as np
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,11 +16,21 @@ lambda_api_key = os.getenv("LAMBDA_API_KEY")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 openai_api_base = "https://api.lambda.ai/v1"
 
-client = OpenAI(api_key=lambda_api_key, base_url=openai_api_base)
+# Created on first use, so the module (and the offline embedding backends) can be imported without an API key
+client = None
+_client_lock = threading.Lock()
+
+def _get_client():
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                client = OpenAI(api_key=lambda_api_key, base_url=openai_api_base)
+    return client
 
 def model_call_structured(user_message, output_format, model = "llama3.1-8b-instruct"):
     # print(user_message)
-    completion = client.chat.completions.create(
+    completion = _get_client().chat.completions.create(
         model= model,
         messages=[
             {
@@ -30,7 +46,7 @@ def model_call_structured(user_message, output_format, model = "llama3.1-8b-inst
 async def model_call_structured_async(user_message, output_format, model = "llama3.1-8b-instruct"):
     # print(user_message)
     completion = await asyncio.to_thread(
-        client.chat.completions.create,
+        _get_client().chat.completions.create,
         model=model,
         messages=[
             {
@@ -44,7 +60,7 @@ async def model_call_structured_async(user_message, output_format, model = "llam
     return str(completion.choices[0].message.content)
 
 def model_call_unstructured(system_message, user_message, model = "llama3.1-8b-instruct"):
-    completion = client.chat.completions.create(
+    completion = _get_client().chat.completions.create(
         model= model,
         messages=[
                 {"role": "system", "content": system_message},
@@ -57,7 +73,7 @@ def model_call_unstructured(system_message, user_message, model = "llama3.1-8b-i
 
 async def model_call_unstructured_async(system_message, user_message, model = "llama3.1-8b-instruct"):
     completion = await asyncio.to_thread(
-        client.chat.completions.create,
+        _get_client().chat.completions.create,
         model=model,
         messages=[
                 {"role": "system", "content": system_message},
@@ -68,28 +84,211 @@ async def model_call_unstructured_async(system_message, user_message, model = "l
     )
     return str(completion.choices[0].message.content)
 
-def get_text_embedding(text, model="text-embedding-3-small"):
-    print(openai_api_key)
-    client = OpenAI(api_key=openai_api_key)
-    response = client.embeddings.create(
-    input=text,
-    model=model
-)
-    embedding = response.data[0].embedding
-    return embedding
-
-async def get_text_embedding_async(text, model="text-embedding-3-small"):
-    print(openai_api_key)
-    client = OpenAI(api_key=openai_api_key)
-    response = await asyncio.to_thread(
-        client.embeddings.create,
-        input=text,
-        model=model
-    )
-    embedding = response.data[0].embedding
-    return embedding
+# Embeddings are deterministic per (backend, text), so recently embedded texts are not embedded again
+EMBEDDING_CACHE_SIZE = 10000
+_embedding_cache = OrderedDict()
+# Embeddings are also requested from background threads (e.g. memory retrieval prefetch)
+_embedding_cache_lock = threading.Lock()
+EMBEDDING_BATCH_SIZE = 256  # inputs per embeddings request
+
+
+class EmbeddingBackend():
+    """
+    Turns texts into semantic embeddings. Backends have a name that identifies the embedding space (backend,
+    model and parameters), which memory stores record so that they are only queried with embeddings of the
+    same space.
+    """
+    name = None
+
+    def embed(self, texts):
+        """
+        Returns one embedding per text, in order.
+        """
+        raise NotImplementedError
+
+    async def embed_async(self, texts):
+        return await asyncio.to_thread(self.embed, texts)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, model="text-embedding-3-small", batch_size=EMBEDDING_BATCH_SIZE) -> None:
+        """
+        Embeddings from the OpenAI embeddings API, requested in batches of batch_size texts.
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.name = f"openai:{model}"
+
+    def embed(self, texts):
+        embedding_client = OpenAI(api_key=openai_api_key)
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            embeddings += _embed_batch(embedding_client, texts[start:start + self.batch_size], self.model)
+        return embeddings
+
+    async def embed_async(self, texts):
+        # The batches are requested concurrently
+        embedding_client = OpenAI(api_key=openai_api_key)
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*[asyncio.to_thread(_embed_batch, embedding_client, batch, self.model) for batch in batches])
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+
+class HashedNgramEmbeddingBackend(EmbeddingBackend):
+    _word_pattern = re.compile(r"\w+")
+
+    def __init__(self, dimension=512, min_n=3, max_n=5) -> None:
+        """
+        Offline embeddings computed in NumPy: the words and character n-grams (min_n to max_n characters, across
+        word boundaries) of a lowercased text are hashed into dimension signed buckets, counts are log-scaled
+        and the vector is normalized. Texts that share words and word fragments get similar embeddings. No
+        network or model is needed, and a text takes tens of microseconds to embed.
+        """
+        self.dimension = dimension
+        self.min_n = min_n
+        self.max_n = max_n
+        self.name = f"hashed-ngram:{dimension}:{min_n}-{max_n}"
+
+    def _features(self, text):
+        words = self._word_pattern.findall(text.lower())
+        padded = f" {' '.join(words)} "
+        features = [f"#{word}" for word in words]
+        for n in range(self.min_n, self.max_n + 1):
+            features += [padded[i:i + n] for i in range(len(padded) - n + 1)]
+        return features
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            # crc32 is stable across processes, unlike hash()
+            hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            matrix[row] = np.bincount(hashes % self.dimension, weights=signs, minlength=self.dimension)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return list(matrix / np.maximum(norms, 1e-8))
+
+
+class SentenceTransformerEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, model="all-MiniLM-L6-v2", batch_size=64) -> None:
+        """
+        Embeddings from a small local model (a model name or a local path) loaded with the optional
+        sentence-transformers package. Runs offline once the model is on disk.
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("SentenceTransformerEmbeddingBackend requires the sentence-transformers package") from e
+        self.model = SentenceTransformer(model)
+        self.batch_size = batch_size
+        self.name = f"sentence-transformers:{model}"
+
+    def embed(self, texts):
+        return list(self.model.encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True))
+
+
+def embedding_backend_from_spec(spec):
+    """
+    Builds an embedding backend from a spec string: "openai" or "openai:<model>", "hashed-ngram" (or "local")
+    optionally with ":<dimension>", or "sentence-transformers:<model>".
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "openai":
+        return OpenAIEmbeddingBackend(arg) if arg else OpenAIEmbeddingBackend()
+    if kind in ("hashed-ngram", "local"):
+        return HashedNgramEmbeddingBackend(int(arg)) if arg else HashedNgramEmbeddingBackend()
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbeddingBackend(arg) if arg else SentenceTransformerEmbeddingBackend()
+    raise ValueError(f"Unknown embedding backend: {spec}")
+
+_embedding_backend = None
+
+def get_embedding_backend():
+    """
+    Returns the default embedding backend, configured with the EMBEDDING_BACKEND environment variable
+    (a spec for embedding_backend_from_spec(); "openai" if unset) or set_embedding_backend().
+    """
+    global _embedding_backend
+    if _embedding_backend is None:
+        _embedding_backend = embedding_backend_from_spec(os.getenv("EMBEDDING_BACKEND", "openai"))
+    return _embedding_backend
+
+def set_embedding_backend(backend):
+    """
+    Sets the default embedding backend: an EmbeddingBackend or a spec string.
+    """
+    global _embedding_backend
+    _embedding_backend = embedding_backend_from_spec(backend) if isinstance(backend, str) else backend
+
+def resolve_embedding_backend(backend=None):
+    """
+    Returns backend (an EmbeddingBackend or a spec string) as an EmbeddingBackend, or the default one if None.
+    """
+    if backend is None:
+        return get_embedding_backend()
+    return embedding_backend_from_spec(backend) if isinstance(backend, str) else backend
+
+def get_text_embedding(text, backend=None):
+    return get_text_embeddings([text], backend=backend)[0]
+
+async def get_text_embedding_async(text, backend=None):
+    return (await get_text_embeddings_async([text], backend=backend))[0]
+
+def _cached_embeddings(texts, backend_name):
+    """
+    Returns (embeddings, missing): embeddings has None for texts not in the cache, missing lists those texts once.
+    """
+    embeddings = []
+    # A dict keeps the missing texts in order and checks for duplicates in constant time
+    missing = {}
+    with _embedding_cache_lock:
+        for text in texts:
+            embedding = _embedding_cache.get((backend_name, text))
+            if embedding is not None:
+                _embedding_cache.move_to_end((backend_name, text))
+            else:
+                missing[text] = None
+            embeddings.append(embedding)
+    return embeddings, list(missing)
+
+def _cache_embeddings(texts, embeddings, backend_name):
+    with _embedding_cache_lock:
+        for text, embedding in zip(texts, embeddings):
+            _embedding_cache[(backend_name, text)] = embedding
+            _embedding_cache.move_to_end((backend_name, text))
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+def _embed_batch(embedding_client, texts, model):
+    response = embedding_client.embeddings.create(input=texts, model=model)
+    # The API returns one item per input, tagged with its position
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def get_text_embeddings(texts, backend=None):
+    """
+    Embeds many texts with backend (the default embedding backend if None), skipping texts whose embeddings
+    are cached. Returns one embedding per text, in order.
+    """
+    backend = resolve_embedding_backend(backend)
+    embeddings, missing = _cached_embeddings(texts, backend.name)
+    fetched = {}
+    if missing:
+        fetched = dict(zip(missing, backend.embed(missing)))
+        _cache_embeddings(fetched.keys(), fetched.values(), backend.name)
+    return [embedding if embedding is not None else fetched[text] for text, embedding in zip(texts, embeddings)]
 
-import json, re
+async def get_text_embeddings_async(texts, backend=None):
+    """
+    Async get_text_embeddings().
+    """
+    backend = resolve_embedding_backend(backend)
+    embeddings, missing = _cached_embeddings(texts, backend.name)
+    fetched = {}
+    if missing:
+        fetched = dict(zip(missing, await backend.embed_async(missing)))
+        _cache_embeddings(fetched.keys(), fetched.values(), backend.name)
+    return [embedding if embedding is not None else fetched[text] for text, embedding in zip(texts, embeddings)]
 
 def _strip_code_fences(s: str) -> str:
     # If the model put the JSON in ```json ... ``` fences, grab the inside
@@ -0,0 +1,101 @@
+import utils.general_utils as general_utils
+
+
+class SceneHistory(list):
+    """
+    A scene history (list of [source, text] rows) that keeps its rendered text and per-row token
+    counts up to date as rows are appended, so history_to_str() returns the current rendering
+    without re-formatting the whole scene on every call.
+
+    It is still a plain list to everything else (saving, templates, indexing). Mutations other than
+    append/extend invalidate the cache, which is rebuilt on the next render.
+    """
+
+    def __init__(self, rows=()) -> None:
+        super().__init__()
+        self._rendered_rows = []
+        self._token_counts = []
+        # The rendered rows joined, or None until the next render(): joining once per render instead of
+        # concatenating per row keeps a long scene linear in its length
+        self._text = None
+        self._dirty = False
+        self.extend(rows)
+
+    def append(self, row):
+        super().append(row)
+        if not self._dirty:
+            self._add_rendered(row)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __iadd__(self, rows):
+        self.extend(rows)
+        return self
+
+    def render(self):
+        """
+        Returns the rendered history, in the same format as general_utils.history_to_str().
+        """
+        if self._dirty:
+            self._rebuild()
+        if self._text is None:
+            self._text = "".join(self._rendered_rows)
+        return self._text
+
+    @property
+    def rendered_rows(self):
+        if self._dirty:
+            self._rebuild()
+        return self._rendered_rows
+
+    @property
+    def token_counts(self):
+        if self._dirty:
+            self._rebuild()
+        return self._token_counts
+
+    def total_tokens(self):
+        return sum(self.token_counts)
+
+    def copy(self):
+        history = SceneHistory()
+        list.extend(history, self)
+        history._rendered_rows = list(self.rendered_rows)
+        history._token_counts = list(self.token_counts)
+        history._text = self._text
+        return history
+
+    def _add_rendered(self, row):
+        row_text = general_utils.format_history_row(row)
+        self._rendered_rows.append(row_text)
+        self._token_counts.append(general_utils.count_tokens(row_text))
+        self._text = None
+
+    def _rebuild(self):
+        self._rendered_rows = []
+        self._token_counts = []
+        self._text = None
+        self._dirty = False
+        for row in self:
+            self._add_rendered(row)
+
+    def _invalidate(self):
+        self._dirty = True
+
+
+def _invalidating(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._invalidate()
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ["__setitem__", "__delitem__", "insert", "pop", "remove", "clear", "sort", "reverse", "__imul__"]:
+    setattr(SceneHistory, _name, _invalidating(_name))